@@ -1,11 +1,119 @@
+from django import forms
 from django.contrib import admin
-from .models import RoadSegment, SpeedReading
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from .models import COORDINATE_FIELDS, Region, RoadSegment, SpeedReading, coordinate_key
+from .purging import delete_segment
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that uses Postgres' row estimate for unfiltered tables, instead of an
+    exact COUNT(*) that scans the whole table.
+    """
+
+    # Below this many rows an exact count is cheap, so use it
+    exact_count_threshold = 100_000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= self.exact_count_threshold:
+                return row[0]
+        return super().count
+
+
+class RoadSegmentIdFilter(admin.SimpleListFilter):
+    """Filters by road segment id typed in a text box, instead of listing every segment."""
+
+    title = "road segment id"
+    parameter_name = "road_segment"
+    template = "admin/monitoring/input_filter.html"
+
+    def lookups(self, request, model_admin):
+        # Must not be empty for the filter to be shown; the template renders an input
+        return [("", "")]
+
+    def choices(self, changelist):
+        all_choice = next(super().choices(changelist))
+        # Keep the other active filters when submitting the input
+        all_choice["query_parts"] = [
+            (key, value)
+            for key, values in changelist.get_filters_params().items()
+            if key != self.parameter_name
+            for value in (values if isinstance(values, list) else [values])
+        ]
+        yield all_choice
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value and value.isdigit():
+            return queryset.filter(road_segment_id=value)
+        return queryset
+
+
+@admin.register(Region)
+class RegionAdmin(admin.ModelAdmin):
+    list_display = ["slug", "name", "created_at"]
+    search_fields = ["slug", "name"]
+    readonly_fields = ["created_at"]
+
+
+class RoadSegmentAdminForm(forms.ModelForm):
+    """
+    Checks the (region, coordinate_key) constraint, which the form skips since the key
+    isn't one of its fields.
+    """
+
+    class Meta:
+        model = RoadSegment
+        fields = "__all__"
+
+    def clean(self):
+        cleaned_data = super().clean()
+        # Read-only when editing, so not one of the form's fields then
+        if "region" in self.fields:
+            region = cleaned_data.get("region")
+        else:
+            region = self.instance.region
+        if region is None or any(
+            cleaned_data.get(field) is None for field in COORDINATE_FIELDS
+        ):
+            # Already reported as a field error
+            return cleaned_data
+        duplicate = (
+            RoadSegment.objects.filter(
+                region=region,
+                coordinate_key=coordinate_key(
+                    *(cleaned_data[field] for field in COORDINATE_FIELDS)
+                ),
+            )
+            .exclude(pk=self.instance.pk)
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if duplicate is not None:
+            raise forms.ValidationError(
+                f"Road segment {duplicate} already has these coordinates"
+            )
+        return cleaned_data
 
 
 @admin.register(RoadSegment)
 class RoadSegmentAdmin(admin.ModelAdmin):
+    form = RoadSegmentAdminForm
     list_display = [
         "id",
+        "region",
         "start_latitude",
         "start_longitude",
         "end_latitude",
@@ -13,13 +121,39 @@ class RoadSegmentAdmin(admin.ModelAdmin):
         "length",
         "created_at",
     ]
-    list_filter = ["created_at"]
-    search_fields = ["id"]
+    list_filter = ["region", "created_at"]
+    search_fields = ["=id"]
     readonly_fields = ["created_at", "updated_at"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
-    def get_queryset(self, request):
-        qs = super().get_queryset(request)
-        return qs.prefetch_related("speedreadings")
+    def get_readonly_fields(self, request, obj=None):
+        # Readings, change log entries and caches carry the segment's region, so a
+        # segment can't be moved to another one
+        if obj is not None:
+            return [*self.readonly_fields, "region"]
+        return self.readonly_fields
+
+    def get_deleted_objects(self, objs, request):
+        # The default lists every reading that would be deleted, loading them all
+        segments = list(objs)
+        model_count = {
+            RoadSegment._meta.verbose_name_plural: len(segments),
+            SpeedReading._meta.verbose_name_plural: SpeedReading.objects.filter(
+                road_segment__in=segments
+            ).count(),
+        }
+        perms_needed = set()
+        if not self.has_delete_permission(request):
+            perms_needed.add(RoadSegment._meta.verbose_name)
+        return [str(segment) for segment in segments], model_count, perms_needed, []
+
+    def delete_model(self, request, obj):
+        delete_segment(obj)
+
+    def delete_queryset(self, request, queryset):
+        for segment in queryset:
+            delete_segment(segment)
 
 
 @admin.register(SpeedReading)
@@ -32,12 +166,20 @@ class SpeedReadingAdmin(admin.ModelAdmin):
         "timestamp",
         "created_at",
     ]
-    list_filter = ["timestamp", "created_at", "road_segment"]
-    search_fields = ["road_segment__id", "average_speed"]
-    date_hierarchy = "timestamp"
+    # No date_hierarchy or per-segment choices: both scan the whole table
+    list_filter = ["timestamp", RoadSegmentIdFilter]
+    search_fields = ["=road_segment__id"]
+    raw_id_fields = ["road_segment"]
     readonly_fields = ["created_at", "traffic_intensity"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        qs = super().get_queryset(request)
+        return qs.with_traffic_intensity()
 
     def traffic_intensity(self, obj):
-        return obj.traffic_intensity
+        return obj.intensity
 
     traffic_intensity.short_description = "Traffic Intensity"
+    traffic_intensity.admin_order_field = "intensity"
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class MonitoringConfig(AppConfig):
     name = "monitoring"
+
+    def ready(self):
+        # Connect signal receivers (change feed, anomaly detection)
+        from . import signals  # noqa: F401
@@ -0,0 +1,255 @@
+import os
+import shutil
+import struct
+from datetime import timedelta
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from .models import EPOCH, ChangeLogEntry, SpeedReading
+from .purging import delete_readings
+
+# File layout, per segment per month (<archive dir>/<segment id>/<YYYY-MM>.col):
+#   header: magic, version, reading count, first timestamp (epoch milliseconds)
+#   column 1: uint32 milliseconds since the previous reading (0 for the first)
+#   column 2: int16 average speed in centi-km/h
+# Fixed-width narrow columns keep readings at 6 bytes each and the files
+# memory-mappable. A range query only opens the months it covers, but rebuilds
+# each month's timestamps with a cumulative sum over its whole delta column (at
+# most a month of readings); only the speeds are read just for the range.
+MAGIC = b"TRSA"
+VERSION = 1
+HEADER = struct.Struct("<4sHxxIq")
+DELTA_DTYPE = np.dtype("<u4")
+SPEED_DTYPE = np.dtype("<i2")
+# Largest speed the int16 centi-km/h column holds
+MAX_SPEED = Decimal("327.67")
+
+
+def archive_dir():
+    return settings.MONITORING_ARCHIVE_DIR
+
+
+def month_path(segment_id, year, month):
+    return os.path.join(archive_dir(), str(segment_id), f"{year:04d}-{month:02d}.col")
+
+
+def to_epoch_ms(timestamp):
+    return (timestamp - EPOCH) // timedelta(milliseconds=1)
+
+
+def from_epoch_ms(epoch_ms):
+    return EPOCH + timedelta(milliseconds=int(epoch_ms))
+
+
+def read_file(path):
+    """Memory-map an archive file. Returns (epoch ms int64 array, centi-km/h array)."""
+    with open(path, "rb") as f:
+        magic, version, count, first = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"Not a reading archive: {path}")
+    if count == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=SPEED_DTYPE)
+
+    deltas = np.memmap(
+        path, dtype=DELTA_DTYPE, mode="r", offset=HEADER.size, shape=(count,)
+    )
+    speeds = np.memmap(
+        path,
+        dtype=SPEED_DTYPE,
+        mode="r",
+        offset=HEADER.size + count * DELTA_DTYPE.itemsize,
+        shape=(count,),
+    )
+    return first + np.cumsum(deltas, dtype=np.int64), speeds
+
+
+def write_file(path, epoch_ms, speeds):
+    """Atomically (re)write an archive file from sorted, de-duplicated columns."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    first = int(epoch_ms[0]) if len(epoch_ms) else 0
+    deltas = np.diff(epoch_ms, prepend=first).astype(DELTA_DTYPE)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(epoch_ms), first))
+        f.write(deltas.tobytes())
+        f.write(np.asarray(speeds, dtype=SPEED_DTYPE).tobytes())
+    os.replace(tmp_path, path)
+
+
+def append_month(segment_id, year, month, epoch_ms, speeds):
+    """Merge readings into a segment's month file. Returns bytes on disk."""
+    path = month_path(segment_id, year, month)
+    epoch_ms = np.asarray(epoch_ms, dtype=np.int64)
+    speeds = np.asarray(speeds, dtype=SPEED_DTYPE)
+
+    if os.path.exists(path):
+        old_epoch_ms, old_speeds = read_file(path)
+        # New values win for the same timestamp
+        epoch_ms = np.concatenate([epoch_ms, old_epoch_ms])
+        speeds = np.concatenate([speeds, old_speeds])
+
+    epoch_ms, first_index = np.unique(epoch_ms, return_index=True)
+    write_file(path, epoch_ms, speeds[first_index])
+    return os.path.getsize(path)
+
+
+def merge_archives(target_id, source_id):
+    """
+    Move a segment's archived readings into another segment's month files, e.g.
+    when merging duplicate segments. The target's readings win for the same
+    timestamp. Returns the number of month files merged.
+    """
+    source_dir = os.path.join(archive_dir(), str(source_id))
+    if not os.path.isdir(source_dir):
+        return 0
+
+    merged = 0
+    for name in sorted(os.listdir(source_dir)):
+        if not name.endswith(".col"):
+            continue
+        year, month = map(int, name.removesuffix(".col").split("-"))
+        source_path = os.path.join(source_dir, name)
+        target_path = month_path(target_id, year, month)
+
+        epoch_ms, speeds = read_file(source_path)
+        if os.path.exists(target_path):
+            target_epoch_ms, target_speeds = read_file(target_path)
+            epoch_ms = np.concatenate([target_epoch_ms, epoch_ms])
+            speeds = np.concatenate([target_speeds, speeds])
+            epoch_ms, first_index = np.unique(epoch_ms, return_index=True)
+            speeds = speeds[first_index]
+        write_file(target_path, epoch_ms, speeds)
+        os.remove(source_path)
+        merged += 1
+
+    if not os.listdir(source_dir):
+        os.rmdir(source_dir)
+    return merged
+
+
+def delete_archive(segment_id):
+    """Delete a segment's archived readings, i.e. its directory of month files."""
+    shutil.rmtree(os.path.join(archive_dir(), str(segment_id)), ignore_errors=True)
+
+
+def months_between(start, end):
+    year, month = start.year, start.month
+    while (year, month) <= (end.year, end.month):
+        yield year, month
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+
+def read_range(segment_id, start, end):
+    """
+    Archived readings of a segment with start <= timestamp < end.
+    Returns (epoch ms int64 array, centi-km/h int16 array), sorted by time.
+    """
+    start, end = start.astimezone(EPOCH.tzinfo), end.astimezone(EPOCH.tzinfo)
+    start_ms, end_ms = to_epoch_ms(start), to_epoch_ms(end)
+    epoch_parts, speed_parts = [], []
+
+    for year, month in months_between(start, end):
+        path = month_path(segment_id, year, month)
+        if not os.path.exists(path):
+            continue
+        epoch_ms, speeds = read_file(path)
+        lo, hi = np.searchsorted(epoch_ms, [start_ms, end_ms])
+        epoch_parts.append(epoch_ms[lo:hi])
+        speed_parts.append(np.array(speeds[lo:hi]))
+
+    if not epoch_parts:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=SPEED_DTYPE)
+    return np.concatenate(epoch_parts), np.concatenate(speed_parts)
+
+
+def reading_history(segment_id, start, end):
+    """
+    All readings of a segment with start <= timestamp < end, from the hot table and
+    the archive. Returns (epoch ms, centi-km/h, archived flag) arrays sorted by time.
+    """
+    hot = list(
+        SpeedReading.objects.filter(
+            road_segment_id=segment_id, timestamp__gte=start, timestamp__lt=end
+        ).values_list("timestamp", "average_speed")
+    )
+    hot_epoch_ms = np.array([to_epoch_ms(t) for t, _ in hot], dtype=np.int64)
+    # Wider than the archive column: the table allows speeds above 327.67 km/h
+    hot_speeds = np.array([int(s * 100) for _, s in hot], dtype=np.int32)
+    archived_epoch_ms, archived_speeds = read_range(segment_id, start, end)
+
+    epoch_ms = np.concatenate([hot_epoch_ms, archived_epoch_ms])
+    speeds = np.concatenate([hot_speeds, archived_speeds])
+    archived = np.concatenate(
+        [np.zeros(len(hot), dtype=bool), np.ones(len(archived_epoch_ms), dtype=bool)]
+    )
+
+    # A reading in both (archived, but not yet deleted from the table) counts once
+    epoch_ms, first_index = np.unique(epoch_ms, return_index=True)
+    return epoch_ms, speeds[first_index], archived[first_index]
+
+
+def archive_readings(
+    cutoff, segment_id=None, batch_size=10000, progress=None, region_id=None
+):
+    """
+    Move readings older than `cutoff` (of one region, by default all) into the
+    archive, segment by segment. `progress(done, total)` is called after each batch.
+
+    Returns (readings archived, {(segment, year, month): file size}).
+    """
+    # Readings whose speed doesn't fit the archive's smallint column stay in the table
+    readings = SpeedReading.objects.filter(
+        timestamp__lt=cutoff,
+        average_speed__lte=MAX_SPEED,
+    )
+    if segment_id is not None:
+        readings = readings.filter(road_segment_id=segment_id)
+    if region_id is not None:
+        readings = readings.filter(region_id=region_id)
+
+    total = readings.count() if progress else None
+    segment_ids = list(
+        readings.order_by("road_segment_id")
+        .values_list("road_segment_id", flat=True)
+        .distinct()
+    )
+
+    archived = 0
+    files = {}
+    for segment_id in segment_ids:
+        segment_readings = readings.filter(road_segment_id=segment_id)
+        while True:
+            batch = list(
+                segment_readings.order_by("timestamp").values_list(
+                    "id", "timestamp", "average_speed"
+                )[:batch_size]
+            )
+            if not batch:
+                break
+            _archive_batch(segment_id, batch, files)
+            archived += len(batch)
+            if progress:
+                progress(archived, total)
+
+    return archived, files
+
+
+def _archive_batch(segment_id, batch, files):
+    # Group the batch by UTC month, then write before deleting anything
+    months = {}
+    for _, timestamp, speed in batch:
+        epoch_ms, speeds = months.setdefault(
+            (timestamp.year, timestamp.month), ([], [])
+        )
+        epoch_ms.append(to_epoch_ms(timestamp))
+        speeds.append(int(speed * 100))
+    for (year, month), (epoch_ms, speeds) in months.items():
+        files[(segment_id, year, month)] = append_month(
+            segment_id, year, month, epoch_ms, speeds
+        )
+
+    # Not tombstones: change feed consumers shouldn't drop readings still archived
+    delete_readings([row[0] for row in batch], action=ChangeLogEntry.ACTION_ARCHIVE)
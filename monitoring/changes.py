@@ -0,0 +1,82 @@
+import base64
+import binascii
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import ChangeLogEntry, RoadSegment, SpeedReading
+
+TOKEN_VERSION = "v1"
+
+ENTITY_MODELS = {
+    ChangeLogEntry.ENTITY_ROAD_SEGMENT: RoadSegment,
+    ChangeLogEntry.ENTITY_SPEED_READING: SpeedReading,
+}
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+def encode_token(seq):
+    """Encode a change sequence number as an opaque, URL-safe token."""
+    raw = f"{TOKEN_VERSION}:{seq}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    """Decode a token produced by encode_token. An empty token means "from the start"."""
+    if not token:
+        return 0
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        version, seq = base64.urlsafe_b64decode(padded).decode().split(":", 1)
+        seq = int(seq)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidToken("Malformed change token")
+    if version != TOKEN_VERSION or seq < 0:
+        raise InvalidToken("Unsupported change token")
+    return seq
+
+
+def settled_changes(region_id, since=0):
+    """
+    Change log entries of a region after sequence number `since`, for consumers
+    that remember the last one they applied.
+
+    Sequence numbers are allocated before commit, so a slower transaction can
+    commit a lower number after a consumer has already moved past it. Only
+    entries older than MONITORING_CHANGE_FEED_SETTLE_SECONDS are returned, by
+    when every earlier transaction has settled.
+    """
+    queryset = ChangeLogEntry.objects.filter(region_id=region_id, id__gt=since)
+    settle_seconds = settings.MONITORING_CHANGE_FEED_SETTLE_SECONDS
+    if settle_seconds:
+        horizon = timezone.now() - timedelta(seconds=settle_seconds)
+        queryset = queryset.filter(created_at__lte=horizon)
+    return queryset
+
+
+def record_changes(entity, object_ids, action, region_id):
+    """Append one change log entry per object id of a region, in a single INSERT."""
+    ChangeLogEntry.objects.bulk_create(
+        [
+            ChangeLogEntry(
+                entity=entity, object_id=object_id, action=action, region_id=region_id
+            )
+            for object_id in object_ids
+        ]
+    )
+
+
+def record_object_changes(entity, objects, action):
+    """record_changes for saved model instances, which may be of several regions."""
+    ChangeLogEntry.objects.bulk_create(
+        [
+            ChangeLogEntry(
+                entity=entity, object_id=obj.pk, action=action, region_id=obj.region_id
+            )
+            for obj in objects
+        ]
+    )
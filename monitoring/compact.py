@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.apps.registry import Apps
+from django.db import DEFAULT_DB_ALIAS, connections, models
+
+from .models import EPOCH, intensity_for_speed
+
+
+class CompactSpeedReading(models.Model):
+    """
+    Compact storage layout for speed readings, measured against SpeedReading by
+    `manage.py storage_report` and `bench_renderers --compact`. It is not part of
+    the schema: its table only exists inside compact_reading_table().
+
+    Speed is stored as a smallint in centi-km/h (max 327.67 km/h), `created_at` is
+    optional, and the natural key (road_segment, timestamp) is the primary key, so
+    there is no surrogate id column or separate foreign key index.
+    """
+
+    pk = models.CompositePrimaryKey("road_segment", "timestamp")
+
+    # Road segment id, the same column type as SpeedReading's foreign key
+    road_segment = models.BigIntegerField()
+
+    # Average speed in hundredths of km/h
+    speed_centi = models.SmallIntegerField()
+
+    timestamp = models.DateTimeField()
+
+    # Optional, to measure the layout with and without it
+    created_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        # Registered apart from the project's models, so migrations never see it
+        apps = Apps(installed_apps=())
+        app_label = "monitoring"
+        db_table = "monitoring_bench_compactspeedreading"
+
+    def __str__(self):
+        return (
+            f"Reading {self.natural_key}: {self.average_speed} km/h at {self.timestamp}"
+        )
+
+    @property
+    def natural_key(self):
+        """Stable string id: "<road_segment>-<timestamp in epoch microseconds>"."""
+        epoch = (self.timestamp - EPOCH) // timedelta(microseconds=1)
+        return f"{self.road_segment}-{epoch}"
+
+    @property
+    def average_speed(self):
+        return Decimal(self.speed_centi).scaleb(-2)
+
+    @average_speed.setter
+    def average_speed(self, value):
+        self.speed_centi = int(Decimal(value).scaleb(2).to_integral_value())
+
+    @property
+    def traffic_intensity(self):
+        return intensity_for_speed(self.average_speed)
+
+
+@contextmanager
+def compact_reading_table(using=DEFAULT_DB_ALIAS):
+    """
+    Create the CompactSpeedReading table for the duration of the block, dropping
+    it afterwards. Like migrations, it can't be used inside a transaction on SQLite.
+    """
+    connection = connections[using]
+    with connection.schema_editor() as editor:
+        editor.create_model(CompactSpeedReading)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            editor.delete_model(CompactSpeedReading)
@@ -0,0 +1,54 @@
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# Replica alias chosen for the current request, or None to use the primary
+_read_replica = ContextVar("read_replica", default=None)
+
+
+def choose_replica():
+    replicas = settings.MONITORING_READ_REPLICAS
+    return random.choice(replicas) if replicas else None
+
+
+def use_replica(alias):
+    """Send this context's reads to `alias` (None for the primary). Returns a reset token."""
+    return _read_replica.set(alias)
+
+
+def reset_replica(token):
+    _read_replica.reset(token)
+
+
+def current_replica():
+    """Replica alias this context reads from, or None for the primary."""
+    return _read_replica.get()
+
+
+class ReadReplicaRouter:
+    """
+    Sends reads of traffic data to the replica chosen by ReadReplicaMiddleware for
+    the current request, and everything else (writes, reads outside such requests,
+    sessions and users, migrations) to the primary database.
+    """
+
+    # Sessions and auth must stay on the primary: a lagging replica would make a
+    # fresh login look like an unknown session
+    replicated_apps = {"monitoring"}
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in self.replicated_apps:
+            return _read_replica.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema through replication
+        return db not in settings.MONITORING_READ_REPLICAS
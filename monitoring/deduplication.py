@@ -0,0 +1,127 @@
+from django.db import transaction
+
+from .archive import merge_archives
+from .changes import record_changes
+from .forecasting import merge_profiles
+from .models import (
+    COORDINATE_FIELDS,
+    ChangeLogEntry,
+    RoadSegment,
+    SpeedReading,
+    coordinate_key,
+)
+
+
+def find_duplicate_segments():
+    """
+    Group segments by region and coordinate key (segments of different regions are
+    never duplicates). Returns {(region id, key): (canonical id, [duplicate ids])}
+    for every group whose segments need merging or keying: the canonical segment
+    is the one holding the key, otherwise the oldest (lowest id).
+    """
+    groups = {}
+    for segment_id, region_id, stored_key, *coordinates in (
+        RoadSegment.objects.order_by("id")
+        .values_list("id", "region_id", "coordinate_key", *COORDINATE_FIELDS)
+        .iterator(chunk_size=10000)
+    ):
+        key = coordinate_key(*coordinates)
+        ids, holder = groups.get((region_id, key), ([], None))
+        ids.append(segment_id)
+        groups[region_id, key] = (ids, segment_id if stored_key == key else holder)
+
+    duplicates = {}
+    for group, (ids, holder) in groups.items():
+        if len(ids) > 1 or holder is None:
+            canonical = ids[0] if holder is None else holder
+            duplicates[group] = (canonical, [i for i in ids if i != canonical])
+    return duplicates
+
+
+def _move_readings(canonical_id, duplicate_id, region_id):
+    """
+    Reassign a duplicate's readings to the canonical segment, dropping those at a
+    timestamp the canonical segment already has a reading for. Returns the counts
+    of readings moved and dropped.
+    """
+    canonical_timestamps = SpeedReading.objects.filter(
+        road_segment_id=canonical_id
+    ).values("timestamp")
+    # Deleted with their anomalies; the signals record the tombstones
+    _, deleted = SpeedReading.objects.filter(
+        road_segment_id=duplicate_id, timestamp__in=canonical_timestamps
+    ).delete()
+
+    moving = SpeedReading.objects.filter(road_segment_id=duplicate_id)
+    moved_ids = list(moving.values_list("id", flat=True))
+    moving.update(road_segment_id=canonical_id)
+    record_changes(
+        ChangeLogEntry.ENTITY_SPEED_READING,
+        moved_ids,
+        ChangeLogEntry.ACTION_UPSERT,
+        region_id,
+    )
+    return len(moved_ids), deleted.get(SpeedReading._meta.label, 0)
+
+
+def merge_segments(region_id, key, canonical_id, duplicate_ids):
+    """
+    Merge duplicate segments of a region into the canonical one: their readings, speed profiles
+    and archived readings move to it, then they are deleted and the canonical
+    segment takes the coordinate key. Returns the counts of readings moved and
+    dropped (conflicting with a reading of the canonical segment).
+    """
+    moved = dropped = 0
+    for duplicate_id in duplicate_ids:
+        # Files first: they can't roll back, and rerunning picks up where it stopped
+        merge_archives(canonical_id, duplicate_id)
+
+    with transaction.atomic():
+        for duplicate_id in duplicate_ids:
+            readings_moved, readings_dropped = _move_readings(
+                canonical_id, duplicate_id, region_id
+            )
+            moved += readings_moved
+            dropped += readings_dropped
+            merge_profiles(canonical_id, duplicate_id)
+
+        for segment in RoadSegment.objects.filter(id__in=duplicate_ids):
+            segment.delete()
+        RoadSegment.objects.filter(id=canonical_id).update(coordinate_key=key)
+        if duplicate_ids:
+            record_changes(
+                ChangeLogEntry.ENTITY_ROAD_SEGMENT,
+                [canonical_id],
+                ChangeLogEntry.ACTION_UPSERT,
+                region_id,
+            )
+    return moved, dropped
+
+
+def merge_duplicate_segments(progress=None):
+    """
+    Merge every group of segments sharing a coordinate key (see merge_segments), one
+    transaction per group. `progress(done, total)` is called after each group.
+
+    Returns counts of groups merged, segments merged away, and readings moved and
+    dropped.
+    """
+    duplicates = find_duplicate_segments()
+    counts = {
+        "groups": 0,
+        "segments_merged": 0,
+        "readings_moved": 0,
+        "readings_dropped": 0,
+    }
+    for done, ((region_id, key), (canonical_id, duplicate_ids)) in enumerate(
+        duplicates.items(), start=1
+    ):
+        moved, dropped = merge_segments(region_id, key, canonical_id, duplicate_ids)
+        if duplicate_ids:
+            counts["groups"] += 1
+        counts["segments_merged"] += len(duplicate_ids)
+        counts["readings_moved"] += moved
+        counts["readings_dropped"] += dropped
+        if progress:
+            progress(done, len(duplicates))
+    return counts
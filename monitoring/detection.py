@@ -0,0 +1,346 @@
+import threading
+import time
+from collections import namedtuple
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Job, SegmentSpeedProfile, SpeedAnomaly, SpeedReading
+
+HOURS_PER_WEEK = 7 * 24
+
+# Array type of each packed SegmentSpeedProfile statistic
+PROFILE_DTYPES = {"counts": np.uint32, "means": np.float32, "stds": np.float32}
+
+# Speed histogram used for rolling percentiles: 10 km/h bins, last bin is open-ended
+HISTOGRAM_BIN_WIDTH = 10.0
+HISTOGRAM_BINS = 12
+
+# Floor for the deviation scale, so a segment with very steady speeds
+# doesn't flag every small wobble
+MIN_SCALE = 1.0
+
+Detection = namedtuple("Detection", ["is_anomaly", "expected_speed", "score"])
+
+
+def unpack_profiles(rows):
+    """Stack (counts, means, stds) packed rows into three (profiles x 168) arrays."""
+    return tuple(
+        np.frombuffer(b"".join(row[i] for row in rows), dtype=dtype).reshape(
+            -1, HOURS_PER_WEEK
+        )
+        for i, dtype in enumerate(PROFILE_DTYPES.values())
+    )
+
+
+def hour_of_week(timestamp):
+    """Return 0..167, Monday 00h being 0, in the project's time zone."""
+    local = timezone.localtime(timestamp) if timezone.is_aware(timestamp) else timestamp
+    return local.weekday() * 24 + local.hour
+
+
+class SpeedAnomalyDetector:
+    """
+    Streaming per-segment speed statistics with O(1) work per reading.
+
+    State lives in preallocated NumPy arrays indexed by a per-segment slot:
+    - an EWMA of speed for each hour of the week (float16)
+    - how many readings each hour-of-week bucket has seen (saturating uint8)
+    - an EWMA of absolute deviation from the bucket mean, per segment
+    - an exponentially decayed speed histogram, for rolling percentiles
+
+    That is under 600 bytes per segment, roughly 55 MB for 100k segments.
+    """
+
+    def __init__(self, alpha=0.1, threshold=3.0, min_samples=4, capacity=1024):
+        self.alpha = alpha
+        self.threshold = threshold
+        self.min_samples = min_samples
+
+        self._slots = {}
+        self._lock = threading.Lock()
+        self._allocate(capacity)
+
+    def _allocate(self, capacity):
+        self.mean = np.full((capacity, HOURS_PER_WEEK), np.nan, dtype=np.float16)
+        self.bucket_count = np.zeros((capacity, HOURS_PER_WEEK), dtype=np.uint8)
+        self.scale = np.zeros(capacity, dtype=np.float32)
+        self.histogram = np.zeros((capacity, HISTOGRAM_BINS), dtype=np.float32)
+
+    def _grow(self):
+        old = (self.mean, self.bucket_count, self.scale, self.histogram)
+        self._allocate(len(self.scale) * 2)
+        for new_array, old_array in zip(
+            (self.mean, self.bucket_count, self.scale, self.histogram), old
+        ):
+            new_array[: len(old_array)] = old_array
+
+    def _slot(self, segment_id):
+        slot = self._slots.get(segment_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self.scale):
+                self._grow()
+            self._slots[segment_id] = slot
+        return slot
+
+    @property
+    def nbytes(self):
+        return (
+            self.mean.nbytes
+            + self.bucket_count.nbytes
+            + self.scale.nbytes
+            + self.histogram.nbytes
+        )
+
+    def observe(self, segment_id, speed, timestamp):
+        """
+        Score a reading against the segment's usual speed for that hour of the
+        week, then fold it into the statistics.
+        """
+        speed = float(speed)
+        bucket = hour_of_week(timestamp)
+
+        with self._lock:
+            slot = self._slot(segment_id)
+            expected = float(self.mean[slot, bucket])
+            seen = int(self.bucket_count[slot, bucket])
+
+            if seen == 0:
+                detection = Detection(False, None, 0.0)
+                self.mean[slot, bucket] = speed
+            else:
+                deviation = abs(speed - expected)
+                score = deviation / max(float(self.scale[slot]), MIN_SCALE)
+                is_anomaly = seen >= self.min_samples and score > self.threshold
+                detection = Detection(is_anomaly, expected, score)
+
+                self.mean[slot, bucket] = expected + self.alpha * (speed - expected)
+                self.scale[slot] += self.alpha * (deviation - self.scale[slot])
+
+            if seen < 255:
+                self.bucket_count[slot, bucket] = seen + 1
+
+            histogram = self.histogram[slot]
+            histogram *= 1 - self.alpha
+            bin_index = min(int(speed // HISTOGRAM_BIN_WIDTH), HISTOGRAM_BINS - 1)
+            histogram[bin_index] += 1
+
+        return detection
+
+    def seed(self, segment_ids, counts, means, stds):
+        """
+        Start segments from fitted speed profiles ((segments x 168) counts, means
+        and stds, as unpack_profiles returns them) instead of from nothing.
+        """
+        counts = counts.astype(np.float64)
+        has_readings = counts > 0
+        total = counts.sum(axis=1)
+        # Mean absolute deviation of a normal distribution, averaged over buckets
+        scale = np.divide(
+            (counts * stds).sum(axis=1) * np.sqrt(2 / np.pi),
+            total,
+            out=np.zeros_like(total),
+            where=total > 0,
+        )
+        bins = np.minimum(means // HISTOGRAM_BIN_WIDTH, HISTOGRAM_BINS - 1)
+        bins = np.where(has_readings, bins, 0).astype(np.int64)
+
+        with self._lock:
+            for i, segment_id in enumerate(segment_ids):
+                slot = self._slot(segment_id)
+                self.mean[slot] = np.where(has_readings[i], means[i], np.nan)
+                self.bucket_count[slot] = np.minimum(counts[i], 255)
+                self.scale[slot] = scale[i]
+                histogram = np.bincount(
+                    bins[i], weights=counts[i], minlength=HISTOGRAM_BINS
+                )
+                # Scaled to the mass a decayed histogram settles at
+                if total[i]:
+                    histogram *= 1 / (self.alpha * total[i])
+                self.histogram[slot] = histogram
+
+    def percentile(self, segment_id, q):
+        """Rolling speed percentile (0-100) for a segment, or None if unseen."""
+        slot = self._slots.get(segment_id)
+        if slot is None:
+            return None
+
+        histogram = self.histogram[slot]
+        cumulative = np.cumsum(histogram)
+        target = cumulative[-1] * q / 100
+        bin_index = min(int(np.searchsorted(cumulative, target)), HISTOGRAM_BINS - 1)
+
+        # Interpolate linearly inside the bin
+        below = cumulative[bin_index - 1] if bin_index > 0 else 0.0
+        fraction = (
+            (target - below) / histogram[bin_index] if histogram[bin_index] else 0
+        )
+        return (bin_index + fraction) * HISTOGRAM_BIN_WIDTH
+
+
+_detector = None
+_detector_version = None
+_detector_checked_at = None
+_detector_lock = threading.Lock()
+
+
+def _recompute_version():
+    """When the last anomaly recompute job finished, in any process."""
+    return Job.objects.filter(
+        kind=Job.KIND_RECOMPUTE_ANOMALIES, status=Job.STATUS_SUCCEEDED
+    ).aggregate(Max("finished_at"))["finished_at__max"]
+
+
+def get_detector():
+    """
+    Return the process-wide detector, created from settings and seeded from the
+    speed profiles (see warm_up) on first use. Each process has its own, seeded
+    again after an anomaly recompute job finishes (checked at most every
+    MONITORING_ANOMALY_REFRESH_SECONDS).
+    """
+    global _detector, _detector_version, _detector_checked_at
+    refresh_seconds = settings.MONITORING_ANOMALY_REFRESH_SECONDS
+    if (
+        _detector is not None
+        and time.monotonic() - _detector_checked_at < refresh_seconds
+    ):
+        return _detector
+    with _detector_lock:
+        now = time.monotonic()
+        if _detector is None or now - _detector_checked_at >= refresh_seconds:
+            version = _recompute_version()
+            if _detector is None or version != _detector_version:
+                detector = SpeedAnomalyDetector(
+                    alpha=settings.MONITORING_ANOMALY_ALPHA,
+                    threshold=settings.MONITORING_ANOMALY_THRESHOLD,
+                    min_samples=settings.MONITORING_ANOMALY_MIN_SAMPLES,
+                )
+                warm_up(detector)
+                _detector, _detector_version = detector, version
+            _detector_checked_at = now
+        return _detector
+
+
+def warm_up(detector, batch_size=10000):
+    """
+    Seed a detector with every segment's fitted speed profile (see
+    fit_speed_profiles), so it can flag anomalies right after a restart. Readings
+    aren't replayed, which would make the first request of each process pay for
+    them: those not yet in a profile are only seen once the next fit has run.
+    """
+    profiles = SegmentSpeedProfile.objects.order_by("road_segment_id").values_list(
+        "road_segment_id", "counts", "means", "stds"
+    )
+    batch = []
+    for row in profiles.iterator(chunk_size=batch_size):
+        batch.append(row)
+        if len(batch) == batch_size:
+            _seed(detector, batch)
+            batch = []
+    _seed(detector, batch)
+
+
+def _seed(detector, rows):
+    if rows:
+        detector.seed(
+            [row[0] for row in rows], *unpack_profiles([row[1:] for row in rows])
+        )
+
+
+def reset_detector():
+    global _detector
+    with _detector_lock:
+        _detector = None
+
+
+def detect_anomalies(readings, detector=None):
+    """Feed newly stored readings to the detector and record the ones it flags."""
+    detector = detector or get_detector()
+    anomalies = []
+    for reading in readings:
+        detection = detector.observe(
+            reading.road_segment_id, reading.average_speed, reading.timestamp
+        )
+        if detection.is_anomaly:
+            anomalies.append(
+                SpeedAnomaly(
+                    speed_reading=reading,
+                    expected_speed=Decimal(f"{detection.expected_speed:.2f}"),
+                    score=detection.score,
+                )
+            )
+    # A reading already flagged (by a concurrent writer of the same reading) keeps
+    # its anomaly
+    return SpeedAnomaly.objects.bulk_create(anomalies, ignore_conflicts=True)
+
+
+def recompute_anomalies(
+    start=None, end=None, batch_size=5000, progress=None, region_id=None, **options
+):
+    """
+    Replace the anomalies of readings in [start, end) (of one region, by default
+    all) by replaying stored readings, oldest first, through a fresh detector.
+    Detector settings (alpha, threshold, min_samples) default to the configured ones
+    and can be overridden.
+
+    Readings before `start` are replayed too, to build up each segment's statistics,
+    but only readings in range can be flagged. Each batch replaces its readings'
+    anomalies in its own transaction, so an interrupted recompute keeps the batches
+    already replaced, and the previous anomalies of the rest. This process's
+    detector is warmed up again afterwards; other processes' once the job finishes
+    (see get_detector). `progress(done, total)` is called after each batch.
+
+    Returns the counts of readings replayed and anomalies recorded.
+    """
+    detector = SpeedAnomalyDetector(
+        alpha=options.get("alpha", settings.MONITORING_ANOMALY_ALPHA),
+        threshold=options.get("threshold", settings.MONITORING_ANOMALY_THRESHOLD),
+        min_samples=options.get("min_samples", settings.MONITORING_ANOMALY_MIN_SAMPLES),
+    )
+    readings = SpeedReading.objects.order_by("timestamp", "id")
+    if region_id is not None:
+        readings = readings.filter(region_id=region_id)
+    if end is not None:
+        readings = readings.filter(timestamp__lt=end)
+
+    total = readings.count() if progress else None
+    replayed = 0
+    anomalies = 0
+    batch = []
+    for reading in readings.only(
+        "id", "road_segment_id", "average_speed", "timestamp"
+    ).iterator(chunk_size=batch_size):
+        batch.append(reading)
+        if len(batch) == batch_size:
+            anomalies += _replay(detector, batch, start)
+            replayed += len(batch)
+            batch = []
+            if progress:
+                progress(replayed, total)
+    anomalies += _replay(detector, batch, start)
+    replayed += len(batch)
+
+    reset_detector()
+    if progress:
+        progress(replayed, total)
+    return {"readings_replayed": replayed, "anomalies": anomalies}
+
+
+def _replay(detector, readings, start):
+    history = [r for r in readings if start and r.timestamp < start]
+    for reading in history:
+        detector.observe(
+            reading.road_segment_id, reading.average_speed, reading.timestamp
+        )
+    in_range = readings[len(history) :]
+    with transaction.atomic():
+        SpeedAnomaly.objects.filter(
+            speed_reading_id__in=[reading.id for reading in in_range]
+        ).delete()
+        flagged = detect_anomalies(in_range, detector)
+    return len(flagged)
@@ -0,0 +1,476 @@
+import threading
+import time
+from collections import namedtuple
+from datetime import UTC, datetime, timedelta
+from functools import reduce
+from operator import or_
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+
+from .detection import HOURS_PER_WEEK, hour_of_week, unpack_profiles
+from .models import (
+    Region,
+    RoadSegment,
+    SegmentSpeedProfile,
+    SpeedReading,
+    intensity_for_speed,
+)
+
+# Time zone offsets are multiples of 15 minutes, so the local hour is the same
+# for every instant in a 15-minute UTC interval
+OFFSET_GRANULARITY_SECONDS = 900
+
+
+def hours_of_week(epoch_seconds):
+    """hour_of_week of an array of epoch seconds, localizing each 15 minutes once."""
+    quarters, inverse = np.unique(
+        epoch_seconds // OFFSET_GRANULARITY_SECONDS, return_inverse=True
+    )
+    buckets = np.fromiter(
+        (
+            hour_of_week(
+                datetime.fromtimestamp(int(q) * OFFSET_GRANULARITY_SECONDS, UTC)
+            )
+            for q in quarters
+        ),
+        dtype=np.int64,
+        count=len(quarters),
+    )
+    return buckets[inverse]
+
+
+def merge_moments(counts, means, stds, new_counts, new_sums, new_sumsqs):
+    """
+    Fold new readings, given as per-bucket counts, sums and sums of squares, into
+    per-bucket counts, means and (population) standard deviations, with Chan et
+    al.'s parallel update. Returns the merged counts, means and stds.
+    """
+    counts = counts.astype(np.float64)
+    means = means.astype(np.float64)
+    m2 = stds.astype(np.float64) ** 2 * counts
+
+    new_means = np.divide(
+        new_sums, new_counts, out=np.zeros_like(new_sums), where=new_counts > 0
+    )
+    new_m2 = np.maximum(new_sumsqs - new_counts * new_means**2, 0)
+
+    total = counts + new_counts
+    new_weight = np.divide(new_counts, total, out=np.zeros_like(total), where=total > 0)
+    delta = new_means - means
+    merged_means = means + delta * new_weight
+    merged_m2 = m2 + new_m2 + delta**2 * counts * new_weight
+    merged_stds = np.sqrt(
+        np.divide(merged_m2, total, out=np.zeros_like(total), where=total > 0)
+    )
+    return total, merged_means, merged_stds
+
+
+def _fold_batch(reading_ids, segment_ids, epoch_seconds, speeds):
+    """Fold a batch of readings into their segments' profiles. Returns profiles written."""
+    with transaction.atomic():
+        segments = np.unique(segment_ids)
+        existing = {
+            row[0]: row[1:]
+            for row in SegmentSpeedProfile.objects.select_for_update()
+            .filter(road_segment_id__in=segments.tolist())
+            .values_list(
+                "road_segment_id", "counts", "means", "stds", "last_reading_id"
+            )
+        }
+
+        # Skip readings a profile already has, so a fit resumed after an interruption
+        # (or racing another fit) never counts a reading twice
+        last_folded = np.array(
+            [existing[s][3] if s in existing else 0 for s in segments.tolist()],
+            dtype=np.int64,
+        )
+        slots = np.searchsorted(segments, segment_ids)
+        new = reading_ids > last_folded[slots]
+        if not new.any():
+            return 0
+        segments, new_counts, new_sums, new_sumsqs = _batch_sums(
+            segment_ids[new], epoch_seconds[new], speeds[new]
+        )
+
+        empty = bytes(HOURS_PER_WEEK * 4)
+        counts, means, stds = unpack_profiles(
+            [existing.get(s, (empty, empty, empty)) for s in segments.tolist()]
+        )
+        counts, means, stds = merge_moments(
+            counts, means, stds, new_counts, new_sums, new_sumsqs
+        )
+
+        profiles = _profile_rows(
+            segments.tolist(), counts, means, stds, int(reading_ids[-1])
+        )
+        SegmentSpeedProfile.objects.bulk_create(
+            profiles,
+            update_conflicts=True,
+            unique_fields=["road_segment"],
+            update_fields=["counts", "means", "stds", "last_reading_id", "fitted_at"],
+        )
+    return len(profiles)
+
+
+def _batch_sums(segment_ids, epoch_seconds, speeds):
+    """
+    Reading counts, speed sums and sums of squares of a batch, per segment and hour
+    of the week. Returns the sorted segments and three (segments, 168) arrays.
+    """
+    segments, slots = np.unique(segment_ids, return_inverse=True)
+    keys = slots * HOURS_PER_WEEK + hours_of_week(epoch_seconds)
+    size = len(segments) * HOURS_PER_WEEK
+    shape = (len(segments), HOURS_PER_WEEK)
+    counts = np.bincount(keys, minlength=size).reshape(shape)
+    sums = np.bincount(keys, weights=speeds, minlength=size).reshape(shape)
+    sumsqs = np.bincount(keys, weights=speeds**2, minlength=size).reshape(shape)
+    return segments, counts, sums, sumsqs
+
+
+def _profile_rows(segment_ids, counts, means, stds, last_reading_id):
+    return [
+        SegmentSpeedProfile(
+            road_segment_id=segment_id,
+            counts=counts[i].astype(np.uint32).tobytes(),
+            means=means[i].astype(np.float32).tobytes(),
+            stds=stds[i].astype(np.float32).tobytes(),
+            last_reading_id=last_reading_id,
+        )
+        for i, segment_id in enumerate(segment_ids)
+    ]
+
+
+def _add_batch(totals, segment_ids, epoch_seconds, speeds):
+    """Add a batch to a rebuild's running {segment: [counts, sums, sumsqs]}."""
+    segments, counts, sums, sumsqs = _batch_sums(segment_ids, epoch_seconds, speeds)
+    for i, segment_id in enumerate(segments.tolist()):
+        if segment_id in totals:
+            for total, new in zip(totals[segment_id], (counts, sums, sumsqs)):
+                total += new[i]
+        else:
+            totals[segment_id] = [
+                counts[i].astype(np.float64),
+                sums[i].copy(),
+                sumsqs[i].copy(),
+            ]
+
+
+def _replace_profiles(profiles, totals, last_reading_id, batch_size=1000):
+    """
+    Replace `profiles` with ones fitted from a rebuild's totals, in one transaction so
+    forecasts never see a partial rebuild. Returns profiles written.
+    """
+    written = 0
+    segment_ids = sorted(totals)
+    zeros = np.zeros((1, HOURS_PER_WEEK))
+    with transaction.atomic():
+        profiles.delete()
+        for start in range(0, len(segment_ids), batch_size):
+            # Segments deleted during the rebuild no longer get a profile
+            chunk = list(
+                RoadSegment.objects.filter(
+                    id__in=segment_ids[start : start + batch_size]
+                )
+                .order_by("id")
+                .values_list("id", flat=True)
+            )
+            if not chunk:
+                continue
+            new_counts, new_sums, new_sumsqs = (
+                np.array([totals[segment_id][i] for segment_id in chunk])
+                for i in range(3)
+            )
+            counts, means, stds = merge_moments(
+                zeros, zeros, zeros, new_counts, new_sums, new_sumsqs
+            )
+            SegmentSpeedProfile.objects.bulk_create(
+                _profile_rows(chunk, counts, means, stds, last_reading_id)
+            )
+            written += len(chunk)
+    return written
+
+
+def merge_profiles(target_id, source_id):
+    """
+    Fold a segment's speed profile into another segment's, e.g. when merging
+    duplicate segments. The source profile is left for the caller to delete.
+    """
+    with transaction.atomic():
+        rows = {
+            row[0]: row[1:]
+            for row in SegmentSpeedProfile.objects.select_for_update()
+            .filter(road_segment_id__in=[target_id, source_id])
+            .values_list(
+                "road_segment_id", "counts", "means", "stds", "last_reading_id"
+            )
+        }
+        if source_id not in rows:
+            return
+
+        empty = bytes(HOURS_PER_WEEK * 4)
+        target = rows.get(target_id, (empty, empty, empty, 0))
+        source = rows[source_id]
+        counts, means, stds = unpack_profiles([target, source])
+        # The source's moments as sums and sums of squares, as merge_moments takes
+        new_counts = counts[1].astype(np.float64)
+        new_means = means[1].astype(np.float64)
+        new_stds = stds[1].astype(np.float64)
+        counts, means, stds = merge_moments(
+            counts[0],
+            means[0],
+            stds[0],
+            new_counts,
+            new_means * new_counts,
+            (new_stds**2 + new_means**2) * new_counts,
+        )
+        SegmentSpeedProfile.objects.update_or_create(
+            road_segment_id=target_id,
+            defaults={
+                "counts": counts.astype(np.uint32).tobytes(),
+                "means": means.astype(np.float32).tobytes(),
+                "stds": stds.astype(np.float32).tobytes(),
+                "last_reading_id": max(target[3], source[3]),
+            },
+        )
+
+
+def fit_speed_profiles(full=False, batch_size=50000, progress=None, region_id=None):
+    """
+    Fold readings added since the last fit into the segments' hour-of-week speed
+    profiles (of one region, by default all), `batch_size` readings at a time in id
+    order. With `full`, profiles are rebuilt from every reading in the database.
+
+    Updated and deleted readings are only reflected by a full fit, which leaves out
+    archived readings. A full fit adds up readings in memory (about 4 KB per
+    segment) and replaces the profiles at the end, in one transaction.
+    `progress(done, total)` is called after each batch; an exception it raises (e.g.
+    a cancelled job) stops the fit, keeping the batches already folded (or, for a
+    full fit, the previous profiles).
+
+    Returns the counts of readings folded and profile updates written.
+    """
+    profiles = SegmentSpeedProfile.objects.all()
+    region_ids = Region.objects.values_list("id", flat=True)
+    if region_id is not None:
+        profiles = profiles.filter(road_segment__region_id=region_id)
+        region_ids = region_ids.filter(id=region_id)
+
+    # Regions can be fitted separately, so each has its own watermark
+    watermarks = {}
+    if not full:
+        watermarks = dict(
+            profiles.values_list("road_segment__region_id").annotate(
+                Max("last_reading_id")
+            )
+        )
+    watermarks.update((region, 0) for region in region_ids if region not in watermarks)
+    watermark = min(watermarks.values(), default=0)
+    readings = SpeedReading.objects.filter(
+        reduce(
+            or_,
+            (Q(region_id=region, id__gt=w) for region, w in watermarks.items()),
+            Q(pk__in=[]),
+        )
+    )
+
+    # Readings from transactions still open could get committed with lower ids than
+    # readings already visible; only fold settled readings, as the change feed does
+    settled = timezone.now() - timedelta(
+        seconds=settings.MONITORING_PROFILE_SETTLE_SECONDS
+    )
+    first_unsettled = (
+        readings.filter(created_at__gt=settled)
+        .order_by("id")
+        .values_list("id", flat=True)
+        .first()
+    )
+    if first_unsettled is not None:
+        readings = readings.filter(id__lt=first_unsettled)
+
+    total = readings.count() if progress else None
+    folded = profiles_updated = 0
+    last_id = watermark
+    totals = {}
+    while True:
+        batch = list(
+            readings.filter(id__gt=last_id)
+            .order_by("id")
+            .values_list("id", "road_segment_id", "timestamp", "average_speed")[
+                :batch_size
+            ]
+        )
+        if not batch:
+            break
+        last_id = batch[-1][0]
+
+        reading_ids, segment_ids, timestamps, speeds = zip(*batch)
+        segment_ids = np.array(segment_ids, dtype=np.int64)
+        epoch_seconds = np.fromiter(
+            (t.timestamp() for t in timestamps), np.int64, len(batch)
+        )
+        speeds = np.array(speeds, dtype=np.float64)
+        if full:
+            _add_batch(totals, segment_ids, epoch_seconds, speeds)
+        else:
+            profiles_updated += _fold_batch(
+                np.array(reading_ids, dtype=np.int64),
+                segment_ids,
+                epoch_seconds,
+                speeds,
+            )
+        folded += len(batch)
+        if progress:
+            progress(folded, total)
+
+    if full:
+        profiles_updated = _replace_profiles(profiles, totals, last_id)
+    if progress:
+        progress(total, total)
+    return {"readings_folded": folded, "profiles_updated": profiles_updated}
+
+
+# Profile arrays of a region's segments, row `slots[segment_id]` for each segment
+ProfileTable = namedtuple(
+    "ProfileTable", ["segment_ids", "slots", "counts", "means", "stds"]
+)
+
+
+class SpeedProfiles:
+    """
+    In-memory copy of the speed profiles of a region's segments, for forecasts
+    without a query per segment. Reloaded when profiles are refitted, checked at
+    most every `refresh_seconds`.
+
+    A reload builds a new ProfileTable and replaces the old one in one assignment,
+    so forecasts, which read it without the lock, never mix two versions.
+    """
+
+    def __init__(self, region_id, refresh_seconds=30.0):
+        self.region_id = region_id
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._table = None
+        self._version = None
+        self._checked_at = None
+
+    def _load(self, version):
+        rows = list(
+            self._profiles()
+            .order_by("road_segment_id")
+            .values_list("road_segment_id", "counts", "means", "stds")
+        )
+        segment_ids = np.array([row[0] for row in rows], dtype=np.int64)
+        self._table = ProfileTable(
+            segment_ids,
+            {segment_id: i for i, segment_id in enumerate(segment_ids.tolist())},
+            *unpack_profiles([row[1:] for row in rows]),
+        )
+        self._version = version
+
+    def _profiles(self):
+        return SegmentSpeedProfile.objects.filter(
+            road_segment__region_id=self.region_id
+        )
+
+    def refresh(self):
+        """Reload the profiles if they changed; returns the current ProfileTable."""
+        with self._lock:
+            now = time.monotonic()
+            if (
+                self._checked_at is not None
+                and now - self._checked_at < self.refresh_seconds
+            ):
+                return self._table
+            version = tuple(
+                self._profiles().aggregate(Count("pk"), Max("fitted_at")).values()
+            )
+            if version != self._version:
+                self._load(version)
+            self._checked_at = now
+            return self._table
+
+    @staticmethod
+    def _expected(count, mean, std):
+        if not count:
+            return None, None, None
+        return f"{mean:.2f}", f"{std:.2f}", intensity_for_speed(mean)
+
+    def forecast(self, segment_id, start, hours=1):
+        """
+        Expected speed for each of the `hours` hours from `start`, from the segment's
+        profile. Hours without readings in the profile have no expected speed.
+        """
+        table = self.refresh()
+        slot = table.slots.get(segment_id)
+        steps = []
+        for step in range(hours):
+            step_start = start + timedelta(hours=step)
+            bucket = hour_of_week(step_start)
+            if slot is None:
+                count, mean, std = 0, None, None
+            else:
+                count = int(table.counts[slot, bucket])
+                mean = float(table.means[slot, bucket])
+                std = float(table.stds[slot, bucket])
+            expected_speed, speed_stddev, intensity = self._expected(count, mean, std)
+            steps.append(
+                {
+                    "start": step_start,
+                    "hour_of_week": bucket,
+                    "expected_speed": expected_speed,
+                    "speed_stddev": speed_stddev,
+                    "samples": count,
+                    "traffic_intensity": intensity,
+                }
+            )
+        return steps
+
+    def forecast_all(self, start):
+        """Expected speed of every profiled segment for the hour of the week of `start`."""
+        table = self.refresh()
+        bucket = hour_of_week(start)
+        results = []
+        for segment_id, count, mean, std in zip(
+            table.segment_ids.tolist(),
+            table.counts[:, bucket].tolist(),
+            table.means[:, bucket].tolist(),
+            table.stds[:, bucket].tolist(),
+        ):
+            expected_speed, speed_stddev, intensity = self._expected(count, mean, std)
+            results.append(
+                {
+                    "road_segment": segment_id,
+                    "expected_speed": expected_speed,
+                    "speed_stddev": speed_stddev,
+                    "samples": count,
+                    "traffic_intensity": intensity,
+                }
+            )
+        return bucket, results
+
+
+_profiles = {}
+_profiles_lock = threading.Lock()
+
+
+def get_profiles(region_id):
+    """Return the process-wide profile cache of a region, created from settings on first use."""
+    profiles = _profiles.get(region_id)
+    if profiles is None:
+        with _profiles_lock:
+            profiles = _profiles.get(region_id)
+            if profiles is None:
+                profiles = _profiles[region_id] = SpeedProfiles(
+                    region_id,
+                    refresh_seconds=settings.MONITORING_FORECAST_REFRESH_SECONDS,
+                )
+    return profiles
+
+
+def reset_profiles():
+    with _profiles_lock:
+        _profiles.clear()
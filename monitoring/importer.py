@@ -0,0 +1,373 @@
+import csv
+import time
+from contextlib import ExitStack
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+import numpy as np
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.backends.utils import format_number
+
+from .changes import record_changes, record_object_changes
+from .detection import detect_anomalies
+from .models import (
+    COORDINATE_FIELDS,
+    ChangeLogEntry,
+    RoadSegment,
+    SpeedReading,
+    coordinate_key,
+    default_region,
+)
+from .validation import (
+    READING_RULES,
+    SEGMENT_RULES,
+    MaxWholeDigits,
+    parse_numbers,
+    validate_columns,
+)
+
+# Rows read, validated and written per batch
+DEFAULT_BATCH_SIZE = 1000
+
+# Model field -> CSV column
+CSV_COLUMNS = {
+    "start_longitude": "Long_start",
+    "start_latitude": "Lat_start",
+    "end_longitude": "Long_end",
+    "end_latitude": "Lat_end",
+    "length": "Length",
+    "average_speed": "Speed",
+}
+MODEL_FIELDS = {
+    **{field: RoadSegment for field in COORDINATE_FIELDS},
+    "length": RoadSegment,
+    "average_speed": SpeedReading,
+}
+
+# The API's rules, plus fitting the model's decimal fields
+IMPORT_RULES = {
+    field: [
+        *SEGMENT_RULES.get(field, []),
+        *READING_RULES.get(field, []),
+        MaxWholeDigits(model._meta.get_field(field)),
+    ]
+    for field, model in MODEL_FIELDS.items()
+}
+IMPORT_RULES["timestamp"] = READING_RULES["timestamp"]
+
+
+def count_rows(csv_file):
+    """Number of data rows in a CSV file (excluding the header)."""
+    with open(csv_file, "r", encoding="utf-8") as f:
+        return max(sum(1 for _ in f) - 1, 0)
+
+
+def clean_decimal(model, name, value):
+    """
+    Parse a value for a model DecimalField, rounded to the field's decimal places as
+    the database would store it, so it compares equal to stored values.
+    Raises ValidationError if it isn't a number or doesn't fit the field.
+    """
+    field = model._meta.get_field(name)
+    value = field.to_python(value)
+    try:
+        return Decimal(format_number(value, field.max_digits, field.decimal_places))
+    except InvalidOperation:
+        raise ValidationError(f"{name} {value} is out of range")
+
+
+def upsert_readings(readings, update=True):
+    """
+    Write (road_segment_id, timestamp, average_speed) readings in one statement.
+
+    New readings are inserted. Existing readings (same segment and timestamp) with a
+    different speed are updated with `update`, and left alone without it. When a
+    reading appears more than once, the last one wins.
+
+    Written readings go to the change log, and inserted ones through anomaly
+    detection once committed, since bulk writes don't send model signals.
+
+    Returns the counts of readings inserted, updated and unchanged (including
+    changed readings skipped without `update`).
+    """
+    latest = {}
+    for segment_id, timestamp, speed in readings:
+        latest[(segment_id, timestamp)] = speed
+
+    existing = {}
+    if latest:
+        for segment_id, timestamp, speed in SpeedReading.objects.filter(
+            road_segment_id__in={segment_id for segment_id, _ in latest},
+            timestamp__in={timestamp for _, timestamp in latest},
+        ).values_list("road_segment_id", "timestamp", "average_speed"):
+            existing[(segment_id, timestamp)] = speed
+
+    inserts, updates = [], []
+    for (segment_id, timestamp), speed in latest.items():
+        reading = SpeedReading(
+            road_segment_id=segment_id, timestamp=timestamp, average_speed=speed
+        )
+        if (segment_id, timestamp) not in existing:
+            inserts.append(reading)
+        elif update and existing[(segment_id, timestamp)] != speed:
+            updates.append(reading)
+
+    written = inserts + updates
+    if written:
+        with transaction.atomic():
+            if update:
+                # Upserts, so a reading inserted concurrently since the lookup is
+                # updated instead of failing the whole batch
+                SpeedReading.objects.bulk_create(
+                    written,
+                    update_conflicts=True,
+                    unique_fields=["road_segment", "timestamp"],
+                    update_fields=["average_speed"],
+                )
+            else:
+                inserts = written = _insert_new(inserts)
+            # Last, so the entries commit right after they're numbered: a transaction
+            # still open past the settle horizon would be missed by the change feed
+            record_object_changes(
+                ChangeLogEntry.ENTITY_SPEED_READING,
+                written,
+                ChangeLogEntry.ACTION_UPSERT,
+            )
+        # Detection may be slow (e.g. warming the detector up), keep it out of the
+        # transaction
+        transaction.on_commit(lambda: detect_anomalies(inserts))
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "unchanged": len(latest) - len(written),
+    }
+
+
+def _insert_new(readings):
+    """
+    Insert readings, keeping any reading inserted concurrently since the lookup
+    (same segment and timestamp) instead of overwriting its speed. Returns the
+    readings written, with their ids: those whose stored speed is theirs.
+    """
+    SpeedReading.objects.bulk_create(readings, ignore_conflicts=True)
+    # Ids aren't set on conflict-ignoring inserts
+    stored = {}
+    for reading_id, segment_id, timestamp, speed in SpeedReading.objects.filter(
+        road_segment_id__in={reading.road_segment_id for reading in readings},
+        timestamp__in={reading.timestamp for reading in readings},
+    ).values_list("id", "road_segment_id", "timestamp", "average_speed"):
+        stored[(segment_id, timestamp)] = (reading_id, speed)
+
+    written = []
+    for reading in readings:
+        reading_id, speed = stored[(reading.road_segment_id, reading.timestamp)]
+        if speed == reading.average_speed:
+            reading.pk = reading_id
+            written.append(reading)
+    return written
+
+
+def resolve_segments(rows, region_id):
+    """
+    Map each row's coordinates to a road segment of the region by coordinate key,
+    creating missing segments in bulk (with the row's length). Returns
+    ({coordinates: segment id}, segments created).
+    """
+    keys = {}
+    wanted = {}
+    for coordinates, length in rows:
+        if coordinates not in keys:
+            keys[coordinates] = key = coordinate_key(*coordinates)
+            wanted.setdefault(key, (coordinates, length))
+
+    segment_ids = dict(
+        RoadSegment.objects.filter(
+            region_id=region_id, coordinate_key__in=list(wanted)
+        ).values_list("coordinate_key", "id")
+    )
+    missing = [
+        RoadSegment(
+            **dict(zip(COORDINATE_FIELDS, coordinates)),
+            length=length,
+            coordinate_key=key,
+            region_id=region_id,
+        )
+        for key, (coordinates, length) in wanted.items()
+        if key not in segment_ids
+    ]
+    created = {}
+    if missing:
+        with transaction.atomic():
+            # Segments a concurrent import created in the meantime are kept (and
+            # read back by key like ours)
+            RoadSegment.objects.bulk_create(missing, ignore_conflicts=True)
+            created = dict(
+                RoadSegment.objects.filter(
+                    region_id=region_id,
+                    coordinate_key__in=[segment.coordinate_key for segment in missing],
+                ).values_list("coordinate_key", "id")
+            )
+            record_changes(
+                ChangeLogEntry.ENTITY_ROAD_SEGMENT,
+                list(created.values()),
+                ChangeLogEntry.ACTION_UPSERT,
+                region_id,
+            )
+        segment_ids.update(created)
+    return (
+        {coordinates: segment_ids[key] for coordinates, key in keys.items()},
+        len(created),
+    )
+
+
+def validate_rows(rows, timestamps):
+    """
+    Validate a batch of CSV rows with the API's rules, a column at a time. Returns
+    the accepted rows as (coordinates, length, timestamp, speed) and the rejected
+    rows as {index in batch: [reasons]}.
+    """
+    columns = {
+        field: parse_numbers([row[column] for row in rows])
+        for field, column in CSV_COLUMNS.items()
+    }
+    columns["timestamp"] = np.array([t.timestamp() for t in timestamps])
+    rejected = validate_columns(columns, IMPORT_RULES)
+
+    accepted = []
+    for index, (row, timestamp) in enumerate(zip(rows, timestamps)):
+        if index in rejected:
+            continue
+        # Exact decimals as the database rounds them, so coordinates compare
+        # equal to stored segments
+        try:
+            values = {
+                field: clean_decimal(MODEL_FIELDS[field], field, row[column])
+                for field, column in CSV_COLUMNS.items()
+            }
+        except ValidationError as e:
+            rejected[index] = e.messages
+            continue
+        coordinates = tuple(values[field] for field in COORDINATE_FIELDS)
+        accepted.append(
+            (coordinates, values["length"], timestamp, values["average_speed"])
+        )
+    return accepted, rejected
+
+
+def import_csv(
+    csv_file,
+    start_date,
+    hours_apart=1,
+    upsert=False,
+    batch_size=DEFAULT_BATCH_SIZE,
+    quarantine=None,
+    progress=None,
+    region_id=None,
+):
+    """
+    Import road segments and speed readings from a traffic speed CSV file into a
+    region (default: MONITORING_DEFAULT_REGION).
+
+    Readings are timestamped from `start_date`, `hours_apart` hours apart, in row
+    order, and written in batches of `batch_size` rows. A reading that already
+    exists (same segment and timestamp) keeps its speed, unless `upsert` is set,
+    so re-importing a corrected file updates the changed speeds in place.
+
+    Rows are validated with the API's rules (see validate_rows). Rejected rows are
+    written to the `quarantine` CSV file, if given, with their row number and
+    reasons. `progress(done, total)` is called after each batch; an exception it
+    raises (e.g. a cancelled job) stops the import.
+
+    Returns the counts of segments created/existing, readings created/updated/
+    unchanged, rows rejected (`errors`) and rejections per reason, the quarantine
+    file (if any rows were rejected) and the time spent validating.
+    """
+    if region_id is None:
+        region_id = default_region()
+    total = count_rows(csv_file) if progress else None
+    counts = {
+        "segments_created": 0,
+        "segments_existing": 0,
+        "readings_created": 0,
+        "readings_updated": 0,
+        "readings_unchanged": 0,
+        "errors": 0,
+        "rejections": {},
+        "quarantine_file": None,
+        "validation_seconds": 0.0,
+    }
+
+    def write_batch(batch):
+        segment_ids, created = resolve_segments(
+            ((coordinates, length) for coordinates, length, _, _ in batch),
+            region_id,
+        )
+        counts["segments_created"] += created
+        counts["segments_existing"] += len(batch) - created
+
+        result = upsert_readings(
+            [
+                (segment_ids[coordinates], timestamp, speed)
+                for coordinates, _, timestamp, speed in batch
+            ],
+            update=upsert,
+        )
+        counts["readings_created"] += result["inserted"]
+        counts["readings_updated"] += result["updated"]
+        counts["readings_unchanged"] += result["unchanged"]
+
+    with open(csv_file, "r", encoding="utf-8") as f, ExitStack() as stack:
+        reader = csv.DictReader(f)
+        missing = set(CSV_COLUMNS.values()) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"Missing CSV columns: {', '.join(sorted(missing))}")
+        quarantine_writer = None
+        done = 0
+
+        # Every row gets a timestamp slot, so row N always maps to the same
+        # timestamp when a corrected file is imported again
+        while rows := list(islice(reader, batch_size)):
+            timestamps = [
+                start_date + timedelta(hours=hours_apart * (done + i))
+                for i in range(len(rows))
+            ]
+            started = time.perf_counter()
+            accepted, rejected = validate_rows(rows, timestamps)
+            counts["validation_seconds"] += time.perf_counter() - started
+
+            for index, reasons in sorted(rejected.items()):
+                counts["errors"] += 1
+                for reason in reasons:
+                    counts["rejections"][reason] = (
+                        counts["rejections"].get(reason, 0) + 1
+                    )
+                if quarantine:
+                    if quarantine_writer is None:
+                        quarantine_writer = csv.DictWriter(
+                            stack.enter_context(
+                                open(quarantine, "w", newline="", encoding="utf-8")
+                            ),
+                            fieldnames=["row", *reader.fieldnames, "reasons"],
+                            extrasaction="ignore",
+                        )
+                        quarantine_writer.writeheader()
+                        counts["quarantine_file"] = quarantine
+                    # 1-indexed, data starts at 2 (header is 1)
+                    quarantine_writer.writerow(
+                        {
+                            **rows[index],
+                            "row": done + index + 2,
+                            "reasons": "; ".join(reasons),
+                        }
+                    )
+
+            if accepted:
+                write_batch(accepted)
+            done += len(rows)
+            if progress:
+                progress(done, total)
+
+    return counts
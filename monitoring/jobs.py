@@ -0,0 +1,232 @@
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .archive import archive_readings
+from .detection import recompute_anomalies
+from .forecasting import fit_speed_profiles
+from .importer import import_csv
+from .models import Job
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobProgress:
+    """
+    Progress callback handed to job handlers as `progress(done, total)`.
+
+    Saves progress (and the worker heartbeat) at most every `interval` seconds,
+    and raises JobCancelled when cancellation has been requested, which stops the
+    handler at its next progress report.
+    """
+
+    def __init__(self, job, interval=1.0):
+        self.job = job
+        self.interval = interval
+        self._saved_at = time.monotonic()
+
+    def __call__(self, done, total=None):
+        now = time.monotonic()
+        finished = total is not None and done >= total
+        if now - self._saved_at < self.interval and not finished:
+            return
+        self._saved_at = now
+
+        Job.objects.filter(id=self.job.id).update(
+            progress_done=done, progress_total=total, heartbeat_at=timezone.now()
+        )
+        self.job.progress_done, self.job.progress_total = done, total
+        if (
+            not finished
+            and Job.objects.filter(id=self.job.id, cancel_requested=True).exists()
+        ):
+            raise JobCancelled()
+
+
+def run_import(params, progress, region_id):
+    start_date = timezone.make_aware(
+        datetime.strptime(params["start_date"], "%Y-%m-%d")
+    )
+    os.makedirs(settings.MONITORING_QUARANTINE_DIR, exist_ok=True)
+    name = os.path.splitext(os.path.basename(params["path"]))[0]
+    quarantine = os.path.join(
+        settings.MONITORING_QUARANTINE_DIR, f"{name}.rejected.csv"
+    )
+
+    try:
+        return import_csv(
+            params["path"],
+            start_date,
+            params["hours_apart"],
+            upsert=params.get("upsert", False),
+            quarantine=quarantine,
+            progress=progress,
+            region_id=region_id,
+        )
+    finally:
+        # The upload is only needed while the import runs
+        if os.path.exists(params["path"]):
+            os.remove(params["path"])
+
+
+def run_archive(params, progress, region_id):
+    cutoff = timezone.now() - timedelta(days=params["older_than"])
+    archived, files = archive_readings(
+        cutoff,
+        segment_id=params.get("segment"),
+        batch_size=params["batch_size"],
+        progress=progress,
+        region_id=region_id,
+    )
+    return {
+        "readings_archived": archived,
+        "files_written": len(files),
+        "archive_bytes": sum(files.values()),
+    }
+
+
+def run_recompute_anomalies(params, progress, region_id):
+    options = {
+        name: params[name]
+        for name in ("alpha", "threshold", "min_samples")
+        if params.get(name) is not None
+    }
+    return recompute_anomalies(
+        start=parse_datetime(params["start"]) if params.get("start") else None,
+        end=parse_datetime(params["end"]) if params.get("end") else None,
+        progress=progress,
+        region_id=region_id,
+        **options,
+    )
+
+
+def run_fit_speed_profiles(params, progress, region_id):
+    return fit_speed_profiles(
+        full=params["full"],
+        batch_size=params["batch_size"],
+        progress=progress,
+        region_id=region_id,
+    )
+
+
+# Job kind -> handler(params, progress, region id) returning a JSON-serializable
+# result. Jobs only touch the data of the region they were created in
+JOB_HANDLERS = {
+    Job.KIND_IMPORT: run_import,
+    Job.KIND_ARCHIVE: run_archive,
+    Job.KIND_RECOMPUTE_ANOMALIES: run_recompute_anomalies,
+    Job.KIND_FIT_SPEED_PROFILES: run_fit_speed_profiles,
+}
+
+
+def save_upload(uploaded_file):
+    """Store an uploaded file for a job to read later. Returns its path."""
+    upload_dir = settings.MONITORING_JOB_UPLOAD_DIR
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.csv")
+    with open(path, "wb") as f:
+        for chunk in uploaded_file.chunks():
+            f.write(chunk)
+    return path
+
+
+def claim_job(worker):
+    """
+    Atomically take the oldest queued job, or a running job whose worker stopped
+    sending heartbeats. Returns the job, or None if there is nothing to do.
+
+    Claiming is a conditional UPDATE, so concurrent workers never run the same
+    job, on any database backend.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.MONITORING_JOB_STALE_SECONDS)
+    candidates = (
+        Job.objects.filter(
+            Q(status=Job.STATUS_QUEUED)
+            | Q(status=Job.STATUS_RUNNING, heartbeat_at__lt=stale)
+        )
+        .order_by("id")
+        .values_list("id", "status", "heartbeat_at")[:10]
+    )
+    for job_id, status, heartbeat_at in candidates:
+        claimed = Job.objects.filter(
+            id=job_id, status=status, heartbeat_at=heartbeat_at
+        ).update(
+            status=Job.STATUS_RUNNING,
+            worker=worker,
+            started_at=now,
+            heartbeat_at=now,
+            progress_done=0,
+        )
+        if claimed:
+            return Job.objects.get(id=job_id)
+    return None
+
+
+def run_job(job):
+    """Run a claimed job to completion, recording its outcome."""
+    progress = JobProgress(job, interval=settings.MONITORING_JOB_PROGRESS_SECONDS)
+    outcome = {"result": None, "error": ""}
+    try:
+        outcome["result"] = JOB_HANDLERS[job.kind](job.params, progress, job.region_id)
+        outcome["status"] = Job.STATUS_SUCCEEDED
+    except JobCancelled:
+        outcome["status"] = Job.STATUS_CANCELLED
+    except Exception as e:
+        outcome["status"] = Job.STATUS_FAILED
+        outcome["error"] = f"{type(e).__name__}: {e}"
+
+    Job.objects.filter(id=job.id).update(
+        progress_done=job.progress_done,
+        progress_total=job.progress_total,
+        finished_at=timezone.now(),
+        **outcome,
+    )
+    job.refresh_from_db()
+    return job
+
+
+def cancel_job(job):
+    """
+    Cancel a job. Queued jobs are cancelled right away; running jobs stop at their
+    next progress report. Returns False if the job had already finished.
+    """
+    if Job.objects.filter(id=job.id, status=Job.STATUS_QUEUED).update(
+        status=Job.STATUS_CANCELLED, finished_at=timezone.now()
+    ):
+        return True
+    return bool(
+        Job.objects.filter(id=job.id, status=Job.STATUS_RUNNING).update(
+            cancel_requested=True
+        )
+    )
+
+
+def run_worker(name=None, poll_interval=1.0, burst=False, stop=None):
+    """
+    Claim and run jobs until `stop` (a threading/multiprocessing Event) is set, or,
+    with `burst`, until the queue is empty. Returns the number of jobs run.
+    """
+    name = name or f"{socket.gethostname()}:{os.getpid()}"
+    processed = 0
+    while stop is None or not stop.is_set():
+        close_old_connections()
+        job = claim_job(name)
+        if job is None:
+            if burst:
+                break
+            time.sleep(poll_interval)
+            continue
+        run_job(job)
+        processed += 1
+    return processed
@@ -0,0 +1,57 @@
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from monitoring.archive import archive_readings
+
+
+class Command(BaseCommand):
+    help = (
+        "Move speed readings older than a cutoff from the database into per-segment, "
+        "per-month columnar archive files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            required=True,
+            help="Archive readings older than this many days",
+        )
+        parser.add_argument(
+            "--segment",
+            type=int,
+            default=None,
+            help="Only archive readings of this road segment",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10000,
+            help="Readings fetched and deleted per query. Default: 10000",
+        )
+
+    def handle(self, *args, **options):
+        if options["older_than"] < 0:
+            raise CommandError("--older-than must not be negative")
+
+        cutoff = timezone.now() - timedelta(days=options["older_than"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Archiving readings before {cutoff:%Y-%m-%d %H:%M}")
+        )
+
+        started = time.perf_counter()
+        archived, files = archive_readings(
+            cutoff, segment_id=options["segment"], batch_size=options["batch_size"]
+        )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"\nArchive completed!\n"
+                f"Readings archived: {archived}\n"
+                f"Files written: {len(files)}\n"
+                f"Archive size: {sum(files.values()) / 1024:.1f} KiB\n"
+                f"Time: {elapsed:.1f}s"
+            )
+        )
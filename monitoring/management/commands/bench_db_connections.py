@@ -0,0 +1,163 @@
+import statistics
+import threading
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client, override_settings
+from monitoring.models import RoadSegment
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark per-request latency with a new database connection per request "
+        "versus persistent (or pooled) connections, under concurrent load"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            type=str,
+            default=None,
+            help="API path to GET. Default: the first road segment's detail",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Requests per client thread. Default: 200",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=8,
+            help="Concurrent client threads. Default: 8",
+        )
+        parser.add_argument(
+            "--connect-latency-ms",
+            type=float,
+            default=0,
+            help=(
+                "Extra delay added to every new connection, to stand in for the "
+                "network/TLS/auth handshake of a remote Postgres. Default: 0"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        # One client sends every request, far more than the rate limits allow a
+        # client; unthrottled, so the benchmark measures connections and not 429s
+        rest_framework = {**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            self.benchmark(options)
+
+    def benchmark(self, options):
+        path = options["path"] or self.default_path()
+        connect_latency = options["connect_latency_ms"] / 1000
+
+        base_settings = connections[DEFAULT_DB_ALIAS].settings_dict
+        plain_options = {
+            k: v for k, v in base_settings.get("OPTIONS", {}).items() if k != "pool"
+        }
+        modes = {
+            "new connection per request": {
+                **base_settings,
+                "CONN_MAX_AGE": 0,
+                "OPTIONS": plain_options,
+            },
+            "persistent connections": {
+                **base_settings,
+                "CONN_MAX_AGE": None,
+                "OPTIONS": plain_options,
+            },
+        }
+        if "pool" in base_settings.get("OPTIONS", {}):
+            modes["connection pool"] = base_settings
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"GET {path}: {options['concurrency']} threads x "
+                f"{options['requests']} requests, "
+                f"{options['connect_latency_ms']:g} ms extra connect latency"
+            )
+        )
+
+        for name, settings_dict in modes.items():
+            latencies, connects, elapsed = self.run_mode(
+                path,
+                settings_dict,
+                options["requests"],
+                options["concurrency"],
+                connect_latency,
+            )
+            latencies.sort()
+            self.stdout.write(
+                f"\n{name}\n"
+                f"  throughput: {len(latencies) / elapsed:.0f} req/s\n"
+                f"  latency p50: {statistics.median(latencies) * 1000:.2f} ms\n"
+                f"  latency p95: "
+                f"{latencies[int(len(latencies) * 0.95)] * 1000:.2f} ms\n"
+                f"  connections opened: {connects}"
+            )
+
+    def default_path(self):
+        segment = RoadSegment.objects.order_by("id").first()
+        if segment is None:
+            raise CommandError("No road segments found, import data or pass --path")
+        connections.close_all()
+        return f"/api/road-segments/{segment.id}/"
+
+    def run_mode(self, path, settings_dict, requests, concurrency, connect_latency):
+        latencies = []
+        # Database connections seen so far. A pool sends connection_created on every
+        # checkout, so only count (and delay) the first use of each real connection
+        opened = set()
+        errors = []
+        lock = threading.Lock()
+
+        def on_connect(sender, connection, **kwargs):
+            if connection.alias != DEFAULT_DB_ALIAS:
+                return
+            with lock:
+                if connection.connection in opened:
+                    return
+                opened.add(connection.connection)
+            time.sleep(connect_latency)
+
+        def worker():
+            # Connections are per thread; configure this thread's before first use
+            connections[DEFAULT_DB_ALIAS].settings_dict = dict(settings_dict)
+            client = Client(SERVER_NAME="localhost")
+            timings = []
+            try:
+                for _ in range(requests):
+                    start = time.perf_counter()
+                    # The test client skips the request_started/request_finished
+                    # connection handling of the real handlers, so do it here
+                    close_old_connections()
+                    response = client.get(path)
+                    close_old_connections()
+                    timings.append(time.perf_counter() - start)
+                    if response.status_code != 200:
+                        errors.append(f"GET {path}: {response.status_code}")
+                        return
+            finally:
+                connections.close_all()
+            with lock:
+                latencies.extend(timings)
+
+        connection_created.connect(on_connect, weak=False)
+        try:
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+        finally:
+            connection_created.disconnect(on_connect)
+
+        if errors:
+            raise CommandError(errors[0])
+        return latencies, len(opened), elapsed
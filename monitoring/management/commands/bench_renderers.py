@@ -0,0 +1,134 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from monitoring.archive import MAX_SPEED
+from monitoring.compact import CompactSpeedReading, compact_reading_table
+from monitoring.middleware import brotli_compress
+from monitoring.models import SpeedReading
+from monitoring.renderers import ColumnarJSONRenderer, MessagePackRenderer
+from monitoring.serializers import (
+    CompactSpeedReadingSerializer,
+    SpeedReadingSerializer,
+)
+
+RENDERERS = {
+    "json": JSONRenderer,
+    "columnar json": ColumnarJSONRenderer,
+    "msgpack": MessagePackRenderer,
+}
+
+ENCODINGS = {
+    "gzip": compress_string,
+    "br": brotli_compress,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark payload size and rendering time of the /api/speed-readings/ list "
+        "in each response format, uncompressed and with gzip and brotli"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=10000,
+            help="Readings in the rendered list. Default: 10000",
+        )
+        parser.add_argument(
+            "--compact",
+            action="store_true",
+            help=(
+                "Render the readings stored in the compact layout (in a table "
+                "created for the run) instead of speed readings"
+            ),
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Timed runs per format and encoding (median reported). Default: 5",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1")
+
+        # The list as SpeedReadingViewSet serializes it
+        if options["compact"]:
+            serializer_class = CompactSpeedReadingSerializer
+            with compact_reading_table():
+                readings = self.compact_readings(options["limit"])
+        else:
+            serializer_class = SpeedReadingSerializer
+            readings = list(
+                SpeedReading.objects.select_related("road_segment").order_by("pk")[
+                    : options["limit"]
+                ]
+            )
+        if not readings:
+            raise CommandError("No speed readings found, import data first")
+
+        start = time.perf_counter()
+        data = serializer_class(readings, many=True).data
+        serialize_ms = (time.perf_counter() - start) * 1000
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{len(readings)} readings, serialized in {serialize_ms:.1f} ms "
+                f"(median of {options['repeat']} runs below)"
+            )
+        )
+        self.stdout.write(
+            f"\n{'format':<15}{'encoding':<10}{'bytes':>12}{'vs json':>9}"
+            f"{'render ms':>11}{'compress ms':>13}"
+        )
+
+        json_size = None
+        for name, renderer_class in RENDERERS.items():
+            renderer = renderer_class()
+            content, render_ms = self.timed(
+                lambda: renderer.render(data), options["repeat"]
+            )
+            json_size = json_size or len(content)
+            self.write_row(name, "identity", len(content), json_size, render_ms)
+
+            for encoding, compress in ENCODINGS.items():
+                compressed, compress_ms = self.timed(
+                    lambda: compress(content), options["repeat"]
+                )
+                self.write_row(
+                    name, encoding, len(compressed), json_size, render_ms, compress_ms
+                )
+
+    def compact_readings(self, limit):
+        """Store the first `limit` readings in the compact layout and read them back."""
+        rows = []
+        readings = SpeedReading.objects.filter(average_speed__lte=MAX_SPEED)
+        for reading in readings.order_by("pk")[:limit]:
+            row = CompactSpeedReading(
+                road_segment=reading.road_segment_id,
+                timestamp=reading.timestamp,
+                created_at=reading.created_at,
+            )
+            row.average_speed = reading.average_speed
+            rows.append(row)
+        CompactSpeedReading.objects.bulk_create(rows)
+        return list(CompactSpeedReading.objects.order_by("road_segment", "timestamp"))
+
+    def timed(self, fn, repeat):
+        """Return fn's result and its median run time in milliseconds."""
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = fn()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, statistics.median(timings)
+
+    def write_row(self, name, encoding, size, json_size, render_ms, compress_ms=0):
+        self.stdout.write(
+            f"{name:<15}{encoding:<10}{size:>12,}{size / json_size:>8.0%} "
+            f"{render_ms:>10.1f}{compress_ms:>13.1f}"
+        )
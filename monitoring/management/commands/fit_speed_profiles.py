@@ -0,0 +1,45 @@
+import time
+from django.core.management.base import BaseCommand, CommandError
+from monitoring.forecasting import fit_speed_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        "Fold speed readings added since the last run into each road segment's "
+        "hour-of-week speed profile, used for forecasts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help=(
+                "Rebuild profiles from every reading in the database, to reflect "
+                "updated and deleted readings"
+            ),
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50000,
+            help="Readings fetched and folded per query. Default: 50000",
+        )
+
+    def handle(self, *args, **options):
+        if options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        started = time.perf_counter()
+        result = fit_speed_profiles(
+            full=options["full"], batch_size=options["batch_size"]
+        )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Speed profiles fitted!\n"
+                f"Readings folded: {result['readings_folded']}\n"
+                f"Profile updates: {result['profiles_updated']}\n"
+                f"Time: {elapsed:.1f}s"
+            )
+        )
@@ -1,9 +1,10 @@
-import csv
-from datetime import datetime, timedelta
-from decimal import Decimal
-from django.core.management.base import BaseCommand
+import os
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from monitoring.models import RoadSegment, SpeedReading
+from monitoring.importer import DEFAULT_BATCH_SIZE, import_csv
+from monitoring.models import Region, default_region
 
 
 class Command(BaseCommand):
@@ -23,6 +24,36 @@ class Command(BaseCommand):
             default=1,
             help="Hours between readings. Default: 1",
         )
+        parser.add_argument(
+            "--upsert",
+            action="store_true",
+            help="Update the speed of readings that already exist, instead of "
+            "keeping it (to re-import a corrected file)",
+        )
+        parser.add_argument(
+            "--quarantine",
+            type=str,
+            default=None,
+            help="CSV file to write rejected rows to, with the reasons. "
+            "Default: <csv_file>.rejected.csv",
+        )
+        parser.add_argument(
+            "--region",
+            type=str,
+            default=None,
+            help="Region (slug) to import into. Default: MONITORING_DEFAULT_REGION",
+        )
+        parser.add_argument(
+            "--create-region",
+            action="store_true",
+            help="Create the --region region if it doesn't exist, instead of failing",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help=f"Rows written per batch. Default: {DEFAULT_BATCH_SIZE}",
+        )
 
     def handle(self, *args, **options):
         csv_file = options["csv_file"]
@@ -32,79 +63,64 @@ class Command(BaseCommand):
         start_date = datetime.strptime(start_date_str, "%Y-%m-%d")
         start_date = timezone.make_aware(start_date)
 
-        current_timestamp = start_date
-
-        segments_created = 0
-        segments_existing = 0
-        readings_created = 0
-        errors = 0
-
         self.stdout.write(self.style.SUCCESS(f"Starting import from {csv_file}"))
 
-        try:
-            with open(csv_file, "r", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-
-                for row_num, row in enumerate(
-                    reader, start=2
-                ):  # 1-indexed, start at 2 (header is 1)
-                    try:
-                        # Extract data from CSV row
-                        start_long = Decimal(row["Long_start"])
-                        start_lat = Decimal(row["Lat_start"])
-                        end_long = Decimal(row["Long_end"])
-                        end_lat = Decimal(row["Lat_end"])
-                        length = Decimal(row["Length"])
-                        speed = Decimal(row["Speed"])
-
-                        # Get or create RoadSegment
-                        # Using get_or_create with coordinates to handle duplicates
-                        segment, segment_created = RoadSegment.objects.get_or_create(
-                            start_longitude=start_long,
-                            start_latitude=start_lat,
-                            end_longitude=end_long,
-                            end_latitude=end_lat,
-                            defaults={
-                                "length": length,
-                            },
-                        )
-
-                        if segment_created:
-                            segments_created += 1
-                        else:
-                            segments_existing += 1
-
-                        # Create SpeedReading
-                        # Check if reading already exists for this segment and timestamp
-                        reading, reading_created = SpeedReading.objects.get_or_create(
-                            road_segment=segment,
-                            timestamp=current_timestamp,
-                            defaults={
-                                "average_speed": speed,
-                            },
-                        )
-
-                        if reading_created:
-                            readings_created += 1
+        quarantine = options["quarantine"] or (
+            f"{os.path.splitext(csv_file)[0]}.rejected.csv"
+        )
 
-                        current_timestamp += timedelta(hours=hours_apart)
+        slug = options["region"]
+        if slug is None:
+            region_id = default_region()
+        elif options["create_region"]:
+            region_id = Region.objects.get_or_create(
+                slug=slug, defaults={"name": slug.title()}
+            )[0].pk
+        else:
+            try:
+                region_id = Region.objects.get(slug=slug).pk
+            except Region.DoesNotExist:
+                raise CommandError(
+                    f"Unknown region: {slug} (use --create-region to create it)"
+                )
 
-                    except Exception as e:
-                        errors += 1
-                        self.stdout.write(
-                            self.style.WARNING(f"Error on row {row_num}: {str(e)}")
-                        )
-                        continue
+        try:
+            started = time.perf_counter()
+            counts = import_csv(
+                csv_file,
+                start_date,
+                hours_apart,
+                upsert=options["upsert"],
+                batch_size=options["batch_size"],
+                quarantine=quarantine,
+                region_id=region_id,
+            )
+            elapsed = time.perf_counter() - started
 
             self.stdout.write(
                 self.style.SUCCESS(
                     f"\nImport completed!\n"
-                    f"Segments created: {segments_created}\n"
-                    f"Segments existing: {segments_existing}\n"
-                    f"Readings created: {readings_created}\n"
-                    f"Errors: {errors}"
+                    f"Segments created: {counts['segments_created']}\n"
+                    f"Segments existing: {counts['segments_existing']}\n"
+                    f"Readings created: {counts['readings_created']}\n"
+                    f"Readings updated: {counts['readings_updated']}\n"
+                    f"Readings unchanged: {counts['readings_unchanged']}\n"
+                    f"Errors: {counts['errors']}\n"
+                    f"Time: {elapsed:.1f}s "
+                    f"(validation {counts['validation_seconds']:.2f}s)"
                 )
             )
+            if counts["errors"]:
+                self.stdout.write(self.style.WARNING("\nRejected rows by reason:"))
+                for reason, count in sorted(
+                    counts["rejections"].items(), key=lambda item: -item[1]
+                ):
+                    self.stdout.write(f"  {count:>8}  {reason}")
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"Rejected rows written to {counts['quarantine_file']}"
+                    )
+                )
 
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f"File not found: {csv_file}"))
@@ -0,0 +1,120 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: set Django up and load the URLconf (which imports the
+# views), as a worker does before serving its first request
+STARTUP_SCRIPT = """
+import json, os, resource, sys, time
+started = time.perf_counter()
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+from django.urls import get_resolver
+get_resolver().url_patterns
+elapsed = time.perf_counter() - started
+try:
+    # Peak RSS of this process; ru_maxrss would include the parent's, as it
+    # survives exec on Linux
+    with open("/proc/self/status") as f:
+        rss_kib = next(int(l.split()[1]) for l in f if l.startswith("VmHWM:"))
+except OSError:
+    # ru_maxrss is in bytes on macOS
+    rss_kib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024
+print(json.dumps({"seconds": elapsed, "rss_kib": rss_kib}))
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( +)(\S+)")
+
+CONFIGURATIONS = {
+    "full": {},
+    "api-only": {"MONITORING_ENABLE_ADMIN": "0", "MONITORING_ENABLE_DOCS": "0"},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker cold start: time to set up Django and load the URLconf, peak "
+        "RSS, and the slowest imports (python -X importtime), for the full and the "
+        "API-only serving configurations"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="Fresh interpreters started per configuration. Default: 5",
+        )
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=10,
+            help="Slowest top-level imports to list. Default: 10",
+        )
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1:
+            raise CommandError("--repeat must be at least 1")
+
+        for name, overrides in CONFIGURATIONS.items():
+            env = self.environment(overrides)
+            runs = [self.run(env) for _ in range(options["repeat"])]
+            imports = self.slowest_imports(env, options["top"])
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"\n{name} "
+                    f"({', '.join(f'{k}={v}' for k, v in overrides.items()) or 'as configured'})"
+                )
+            )
+            self.stdout.write(
+                f"  startup: {statistics.median(r['seconds'] for r in runs) * 1000:.0f} ms "
+                f"(median of {len(runs)}, min "
+                f"{min(r['seconds'] for r in runs) * 1000:.0f} ms)\n"
+                f"  peak RSS: {statistics.median(r['rss_kib'] for r in runs) / 1024:.1f} MiB\n"
+                f"  slowest imports (cumulative):"
+            )
+            for module, microseconds in imports:
+                self.stdout.write(f"    {microseconds / 1000:7.1f} ms  {module}")
+
+    def environment(self, overrides):
+        env = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE,
+            "PYTHONPATH": os.pathsep.join(
+                [str(settings.BASE_DIR), *filter(None, [os.environ.get("PYTHONPATH")])]
+            ),
+        }
+        env.update(overrides)
+        return env
+
+    def run(self, env):
+        return json.loads(self.run_script(env).stdout)
+
+    def run_script(self, env, *flags):
+        result = subprocess.run(
+            [sys.executable, *flags, "-c", STARTUP_SCRIPT],
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Startup failed:\n{result.stderr}")
+        return result
+
+    def slowest_imports(self, env, top):
+        """Imports made directly by the startup script, slowest first (cumulative)."""
+        stderr = self.run_script(env, "-X", "importtime").stderr
+        imports = []
+        for line in stderr.splitlines():
+            match = IMPORTTIME_LINE.match(line)
+            # One space of indentation marks a top-level import
+            if match and len(match.group(3)) == 1:
+                imports.append((match.group(4), int(match.group(2))))
+        imports.sort(key=lambda item: item[1], reverse=True)
+        return imports[:top]
@@ -0,0 +1,51 @@
+import time
+from django.core.management.base import BaseCommand
+from monitoring.deduplication import find_duplicate_segments, merge_duplicate_segments
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge road segments whose coordinates match to the coordinate key's "
+        "precision: readings, speed profiles and archives move to the oldest segment "
+        "and the others are deleted"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Only report the duplicate groups found",
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options["dry_run"]:
+            duplicates = find_duplicate_segments()
+            groups = [ids for _, ids in duplicates.values() if ids]
+            for canonical_id, duplicate_ids in duplicates.values():
+                if duplicate_ids:
+                    self.stdout.write(
+                        f"Segment {canonical_id}: "
+                        f"{', '.join(map(str, duplicate_ids))}"
+                    )
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{len(groups)} duplicate groups, "
+                    f"{sum(map(len, groups))} segments to merge"
+                )
+            )
+            return
+
+        result = merge_duplicate_segments()
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Duplicate segments merged!\n"
+                f"Groups: {result['groups']}\n"
+                f"Segments merged: {result['segments_merged']}\n"
+                f"Readings moved: {result['readings_moved']}\n"
+                f"Readings dropped (same timestamp): {result['readings_dropped']}\n"
+                f"Time: {elapsed:.1f}s"
+            )
+        )
@@ -0,0 +1,106 @@
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from monitoring.models import Region
+from monitoring.purging import purge_readings
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete speed readings of a road segment and/or a time range from the "
+        "database, in bounded batches"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--segment",
+            type=int,
+            default=None,
+            help="Only delete readings of this road segment",
+        )
+        parser.add_argument(
+            "--region",
+            default=None,
+            help="Only delete readings of this region (slug)",
+        )
+        parser.add_argument(
+            "--start",
+            default=None,
+            help="Only delete readings at or after this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--end",
+            default=None,
+            help="Only delete readings before this date (YYYY-MM-DD)",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Delete every reading (required when no filter is given)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="Readings deleted per statement. Default: MONITORING_DELETE_BATCH_SIZE",
+        )
+
+    def handle(self, *args, **options):
+        start = self.parse_date(options["start"], "--start")
+        end = self.parse_date(options["end"], "--end")
+        region_id = None
+        if options["region"] is not None:
+            region = Region.objects.filter(slug=options["region"]).first()
+            if region is None:
+                raise CommandError(f"Unknown region: {options['region']}")
+            region_id = region.pk
+        if (
+            options["segment"] is None
+            and region_id is None
+            and start is None
+            and end is None
+        ):
+            if not options["all"]:
+                raise CommandError(
+                    "Pass --segment, --region, --start and/or --end, or --all to "
+                    "delete every reading"
+                )
+        if options["batch_size"] is not None and options["batch_size"] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        started = time.perf_counter()
+
+        def progress(done, total):
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f"  {done}/{total} readings deleted "
+                f"({done / elapsed if elapsed else 0:,.0f} rows/s)"
+            )
+
+        deleted = purge_readings(
+            segment_id=options["segment"],
+            start=start,
+            end=end,
+            batch_size=options["batch_size"],
+            progress=progress if options["verbosity"] > 1 else None,
+            region_id=region_id,
+        )
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Purge completed!\n"
+                f"Readings deleted: {deleted}\n"
+                f"Time: {elapsed:.1f}s\n"
+                f"Rate: {deleted / elapsed if elapsed else 0:,.0f} rows/s"
+            )
+        )
+
+    def parse_date(self, value, option):
+        if value is None:
+            return None
+        try:
+            return timezone.make_aware(datetime.strptime(value, "%Y-%m-%d"))
+        except ValueError:
+            raise CommandError(f"{option} must be a date (YYYY-MM-DD)")
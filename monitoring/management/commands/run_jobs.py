@@ -0,0 +1,69 @@
+import multiprocessing
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from monitoring.jobs import run_worker
+
+
+def worker_process(poll_interval, burst, stop):
+    # Finish the running job on Ctrl+C / SIGTERM, then exit
+    signal.signal(signal.SIGINT, lambda *args: stop.set())
+    signal.signal(signal.SIGTERM, lambda *args: stop.set())
+    run_worker(poll_interval=poll_interval, burst=burst, stop=stop)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background job workers (imports, archiving, anomaly recomputes) "
+        "taking jobs from the database queue"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Worker processes running jobs in parallel. Default: 1",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=None,
+            help="Seconds between queue polls when idle. "
+            "Default: MONITORING_JOB_POLL_SECONDS",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Exit once the queue is empty instead of waiting for new jobs",
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1:
+            raise CommandError("--workers must be at least 1")
+        poll_interval = options["poll_interval"] or settings.MONITORING_JOB_POLL_SECONDS
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Starting {options['workers']} job worker(s)")
+        )
+
+        # Workers are forked; they must not share the parent's connections
+        connections.close_all()
+        context = multiprocessing.get_context("fork")
+        stop = context.Event()
+        processes = [
+            context.Process(
+                target=worker_process, args=(poll_interval, options["burst"], stop)
+            )
+            for _ in range(options["workers"])
+        ]
+        for process in processes:
+            process.start()
+
+        signal.signal(signal.SIGINT, lambda *args: stop.set())
+        signal.signal(signal.SIGTERM, lambda *args: stop.set())
+        for process in processes:
+            process.join()
+
+        self.stdout.write(self.style.SUCCESS("Job workers stopped"))
@@ -0,0 +1,139 @@
+import random
+from datetime import timedelta
+from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+from monitoring.compact import CompactSpeedReading, compact_reading_table
+from monitoring.models import RoadSegment, SpeedReading
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure bytes per row and index size of the standard and compact speed "
+        "reading layouts, by inserting synthetic readings in a rolled-back transaction "
+        "(the compact layout's table is created for the run and dropped afterwards)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            default=100_000,
+            help="Synthetic readings to insert per layout. Default: 100000",
+        )
+        parser.add_argument(
+            "--segments",
+            type=int,
+            default=100,
+            help="Synthetic road segments to spread readings over. Default: 100",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Rows per INSERT. Default: 5000",
+        )
+
+    def handle(self, *args, **options):
+        connection = connections[DEFAULT_DB_ALIAS]
+        if connection.vendor not in ("postgresql", "sqlite"):
+            raise CommandError("Size measurement supports PostgreSQL and SQLite only")
+
+        rows = options["rows"]
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Inserting {rows} synthetic readings per layout ({connection.vendor})"
+            )
+        )
+
+        with compact_reading_table(), transaction.atomic():
+            segments = RoadSegment.objects.bulk_create(
+                [
+                    RoadSegment(
+                        start_longitude=Decimal("0"),
+                        start_latitude=Decimal(i) / 1000,
+                        end_longitude=Decimal("0.01"),
+                        end_latitude=Decimal(i) / 1000,
+                        length=Decimal("1000.00"),
+                    )
+                    for i in range(options["segments"])
+                ]
+            )
+
+            results = {}
+            for name, model, make_row in [
+                ("standard", SpeedReading, self.standard_row),
+                ("compact", CompactSpeedReading, self.compact_row),
+            ]:
+                before = self.measure(connection, model._meta.db_table)
+                self.insert(model, make_row, segments, rows, options["batch_size"])
+                after = self.measure(connection, model._meta.db_table)
+                results[name] = (after[0] - before[0], after[1] - before[1])
+
+            # Leave the database as it was
+            transaction.set_rollback(True)
+
+        for name, (table_bytes, index_bytes) in results.items():
+            self.stdout.write(
+                f"\n{name}\n"
+                f"  table: {table_bytes / 1024 / 1024:.2f} MiB "
+                f"({table_bytes / rows:.1f} bytes/row)\n"
+                f"  indexes: {index_bytes / 1024 / 1024:.2f} MiB "
+                f"({index_bytes / rows:.1f} bytes/row)\n"
+                f"  total: {(table_bytes + index_bytes) / rows:.1f} bytes/row"
+            )
+
+        standard, compact = sum(results["standard"]), sum(results["compact"])
+        if standard:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"\nCompact layout saves {100 * (1 - compact / standard):.1f}% "
+                    f"of table and index space"
+                )
+            )
+
+    def insert(self, model, make_row, segments, rows, batch_size):
+        start = timezone.now() - timedelta(days=365)
+        random.seed(0)
+        batch = []
+        for i in range(rows):
+            segment = segments[i % len(segments)]
+            timestamp = start + timedelta(minutes=5 * (i // len(segments)))
+            speed = Decimal(random.randint(500, 12000)) / 100
+            batch.append(make_row(segment, speed, timestamp))
+            if len(batch) == batch_size:
+                model.objects.bulk_create(batch)
+                batch = []
+        model.objects.bulk_create(batch)
+
+    def standard_row(self, segment, speed, timestamp):
+        return SpeedReading(
+            road_segment=segment, average_speed=speed, timestamp=timestamp
+        )
+
+    def compact_row(self, segment, speed, timestamp):
+        reading = CompactSpeedReading(road_segment=segment.pk, timestamp=timestamp)
+        reading.average_speed = speed
+        return reading
+
+    def measure(self, connection, table):
+        """Return (table bytes, index bytes) for a table."""
+        with connection.cursor() as cursor:
+            if connection.vendor == "postgresql":
+                cursor.execute(
+                    "SELECT pg_relation_size(%s), pg_indexes_size(%s)", [table, table]
+                )
+                return cursor.fetchone()
+
+            cursor.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s",
+                [table],
+            )
+            indexes = {name for (name,) in cursor.fetchall()}
+            cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+            sizes = dict(cursor.fetchall())
+            return (
+                sizes.get(table, 0),
+                sum(sizes.get(name, 0) for name in indexes),
+            )
@@ -0,0 +1,102 @@
+import brotli
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+
+from .db_router import choose_replica, reset_replica, use_replica
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+def brotli_compress(content):
+    return brotli.compress(content, quality=settings.MONITORING_BROTLI_QUALITY)
+
+
+class ReadReplicaMiddleware:
+    """
+    Serves safe-method API requests from a read replica.
+
+    After a client writes, it gets a short-lived cookie that pins its reads to the
+    primary, so it reads its own writes even if the replicas are lagging.
+    """
+
+    pin_cookie_name = "db_primary_pin"
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        replica = None
+        if (
+            request.method in SAFE_METHODS
+            and request.path.startswith(tuple(settings.MONITORING_REPLICA_PATHS))
+            and self.pin_cookie_name not in request.COOKIES
+        ):
+            replica = choose_replica()
+
+        token = use_replica(replica)
+        try:
+            response = self.get_response(request)
+        finally:
+            reset_replica(token)
+
+        if request.method not in SAFE_METHODS and settings.MONITORING_READ_REPLICAS:
+            response.set_cookie(
+                self.pin_cookie_name,
+                "1",
+                max_age=settings.MONITORING_READ_YOUR_WRITES_SECONDS,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compresses responses of at least MONITORING_COMPRESS_MIN_BYTES with brotli when
+    the client accepts it, otherwise with gzip (as GZipMiddleware). Streaming
+    responses are only gzipped.
+
+    HTML pages and responses that include the CSRF token are only gzipped too:
+    GZipMiddleware pads them with random bytes against BREACH, which brotli doesn't.
+    """
+
+    def may_contain_secrets(self, request, response):
+        return response.get("Content-Type", "").startswith("text/html") or bool(
+            request.META.get("CSRF_COOKIE_NEEDS_UPDATE")
+        )
+
+    def process_response(self, request, response):
+        if (
+            not response.streaming
+            and len(response.content) < settings.MONITORING_COMPRESS_MIN_BYTES
+        ):
+            return response
+
+        if (
+            response.streaming
+            or response.has_header("Content-Encoding")
+            or self.may_contain_secrets(request, response)
+            or not re_accepts_brotli.search(
+                request.META.get("HTTP_ACCEPT_ENCODING", "")
+            )
+        ):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+        compressed_content = brotli_compress(response.content)
+        if len(compressed_content) >= len(response.content):
+            return response
+        response.content = compressed_content
+        response.headers["Content-Length"] = str(len(response.content))
+
+        # Compressed content has a different representation, so a strong ETag
+        # becomes weak, as with gzip
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = "br"
+        return response
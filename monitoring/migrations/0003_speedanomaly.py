@@ -0,0 +1,39 @@
+# Generated by Django 6.0.1 on 2026-10-19 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monitoring", "0002_changelogentry"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpeedAnomaly",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("expected_speed", models.DecimalField(decimal_places=2, max_digits=5)),
+                ("score", models.FloatField()),
+                ("detected_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "speed_reading",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="anomaly",
+                        to="monitoring.speedreading",
+                    ),
+                ),
+            ],
+        ),
+    ]
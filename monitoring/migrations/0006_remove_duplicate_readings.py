@@ -0,0 +1,42 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:11
+
+from django.db import migrations
+from django.db.models import Count, Max
+
+
+def remove_duplicate_readings(apps, schema_editor):
+    """Keep only the most recent reading per (road_segment, timestamp)."""
+    SpeedReading = apps.get_model("monitoring", "SpeedReading")
+    ChangeLogEntry = apps.get_model("monitoring", "ChangeLogEntry")
+
+    duplicates = (
+        SpeedReading.objects.values("road_segment", "timestamp")
+        .annotate(keep=Max("id"), readings=Count("id"))
+        .filter(readings__gt=1)
+    )
+    for duplicate in duplicates.iterator():
+        stale = SpeedReading.objects.filter(
+            road_segment=duplicate["road_segment"], timestamp=duplicate["timestamp"]
+        ).exclude(id=duplicate["keep"])
+        stale_ids = list(stale.values_list("id", flat=True))
+        stale.delete()
+        # Historical models send no signals, so record the tombstones here
+        ChangeLogEntry.objects.bulk_create(
+            [
+                ChangeLogEntry(
+                    entity="speed_reading", object_id=reading_id, action="delete"
+                )
+                for reading_id in stale_ids
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monitoring", "0005_job"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_readings, migrations.RunPython.noop),
+    ]
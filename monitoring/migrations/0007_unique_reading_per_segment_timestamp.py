@@ -0,0 +1,20 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monitoring", "0006_remove_duplicate_readings"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="speedreading",
+            constraint=models.UniqueConstraint(
+                fields=("road_segment", "timestamp"),
+                name="unique_reading_per_segment_timestamp",
+            ),
+        ),
+    ]
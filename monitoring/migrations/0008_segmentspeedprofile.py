@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monitoring", "0007_unique_reading_per_segment_timestamp"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SegmentSpeedProfile",
+            fields=[
+                (
+                    "road_segment",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="speed_profile",
+                        serialize=False,
+                        to="monitoring.roadsegment",
+                    ),
+                ),
+                ("counts", models.BinaryField()),
+                ("means", models.BinaryField()),
+                ("stds", models.BinaryField()),
+                ("last_reading_id", models.BigIntegerField(default=0)),
+                ("fitted_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="kind",
+            field=models.CharField(
+                choices=[
+                    ("import", "Import traffic data"),
+                    ("archive", "Archive old readings"),
+                    ("recompute_anomalies", "Recompute anomalies"),
+                    ("fit_speed_profiles", "Fit speed profiles"),
+                ],
+                max_length=30,
+            ),
+        ),
+    ]
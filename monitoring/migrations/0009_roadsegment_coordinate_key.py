@@ -0,0 +1,65 @@
+# Generated by Django 6.0.1 on 2026-10-19 11:36
+
+import hashlib
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from django.db import migrations, models
+
+COORDINATE_FIELDS = [
+    "start_longitude",
+    "start_latitude",
+    "end_longitude",
+    "end_latitude",
+]
+
+
+def coordinate_key(*coordinates):
+    """monitoring.models.coordinate_key as of this migration."""
+    parts = []
+    for value in coordinates:
+        value = Decimal(value).quantize(Decimal("0.000001"), rounding=ROUND_HALF_EVEN)
+        parts.append(str(abs(value) if value.is_zero() else value))
+    digest = hashlib.blake2b(",".join(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def populate_coordinate_keys(apps, schema_editor):
+    """
+    Key every segment. Of segments sharing a key, only the oldest gets it; the rest
+    keep a null key until `manage.py merge_duplicate_segments` merges them.
+    """
+    RoadSegment = apps.get_model("monitoring", "RoadSegment")
+    seen = set()
+    batch = []
+    for segment in RoadSegment.objects.order_by("id").only("id", *COORDINATE_FIELDS):
+        key = coordinate_key(*(getattr(segment, f) for f in COORDINATE_FIELDS))
+        if key in seen:
+            continue
+        seen.add(key)
+        segment.coordinate_key = key
+        batch.append(segment)
+        if len(batch) == 1000:
+            RoadSegment.objects.bulk_update(batch, ["coordinate_key"])
+            batch = []
+    RoadSegment.objects.bulk_update(batch, ["coordinate_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monitoring", "0008_segmentspeedprofile"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="roadsegment",
+            name="coordinate_key",
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(populate_coordinate_keys, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="roadsegment",
+            name="coordinate_key",
+            field=models.BigIntegerField(editable=False, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,130 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:05
+
+import django.db.models.deletion
+import monitoring.models
+from django.conf import settings
+from django.db import migrations, models
+
+REGION_MODELS = ["RoadSegment", "SpeedReading", "ChangeLogEntry", "Job"]
+
+
+def assign_default_region(apps, schema_editor):
+    """Existing rows all belong to the default region, created here."""
+    Region = apps.get_model("monitoring", "Region")
+    region, _ = Region.objects.get_or_create(
+        slug=settings.MONITORING_DEFAULT_REGION,
+        defaults={"name": settings.MONITORING_DEFAULT_REGION.title()},
+    )
+    for name in REGION_MODELS:
+        apps.get_model("monitoring", name).objects.update(region=region)
+
+
+def region_field(**kwargs):
+    return models.ForeignKey(
+        on_delete=django.db.models.deletion.PROTECT, to="monitoring.region", **kwargs
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monitoring", "0009_roadsegment_coordinate_key"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Region",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("slug", models.SlugField(unique=True)),
+                ("name", models.CharField(max_length=100)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                "ordering": ["slug"],
+            },
+        ),
+        # Nullable first, filled in, then made required
+        migrations.AddField(
+            model_name="roadsegment",
+            name="region",
+            field=region_field(db_index=False, null=True, related_name="road_segments"),
+        ),
+        migrations.AddField(
+            model_name="speedreading",
+            name="region",
+            field=region_field(
+                db_index=False, editable=False, null=True, related_name="+"
+            ),
+        ),
+        migrations.AddField(
+            model_name="changelogentry",
+            name="region",
+            field=region_field(db_index=False, null=True, related_name="+"),
+        ),
+        migrations.AddField(
+            model_name="job",
+            name="region",
+            field=region_field(null=True, related_name="jobs"),
+        ),
+        migrations.RunPython(assign_default_region, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="roadsegment",
+            name="region",
+            field=region_field(
+                db_index=False,
+                default=monitoring.models.default_region,
+                related_name="road_segments",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="speedreading",
+            name="region",
+            field=region_field(db_index=False, editable=False, related_name="+"),
+        ),
+        migrations.AlterField(
+            model_name="changelogentry",
+            name="region",
+            field=region_field(db_index=False, related_name="+"),
+        ),
+        migrations.AlterField(
+            model_name="job",
+            name="region",
+            field=region_field(
+                default=monitoring.models.default_region, related_name="jobs"
+            ),
+        ),
+        # Coordinate keys are now unique per region
+        migrations.AlterField(
+            model_name="roadsegment",
+            name="coordinate_key",
+            field=models.BigIntegerField(editable=False, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name="roadsegment",
+            constraint=models.UniqueConstraint(
+                fields=("region", "coordinate_key"),
+                name="unique_segment_per_region_coordinates",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="speedreading",
+            index=models.Index(
+                fields=["region", "timestamp"], name="monitoring__region__879147_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="changelogentry",
+            index=models.Index(
+                fields=["region", "id"], name="monitoring__region__bc0873_idx"
+            ),
+        ),
+    ]
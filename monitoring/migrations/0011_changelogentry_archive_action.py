@@ -0,0 +1,25 @@
+# Generated by Django 6.0.1 on 2026-10-19 12:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("monitoring", "0010_region"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="changelogentry",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("upsert", "Upsert"),
+                    ("delete", "Delete"),
+                    ("archive", "Archive"),
+                ],
+                max_length=10,
+            ),
+        ),
+    ]
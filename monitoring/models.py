@@ -1,9 +1,130 @@
-from django.db import models
+import hashlib
+from datetime import UTC, datetime
+from decimal import ROUND_HALF_EVEN, Decimal
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+
+EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+# Traffic intensity thresholds (km/h), applied to a reading's average speed
+HIGH_INTENSITY_MAX_SPEED = 20
+MEDIUM_INTENSITY_MAX_SPEED = 50
+
+
+COORDINATE_FIELDS = [
+    "start_longitude",
+    "start_latitude",
+    "end_longitude",
+    "end_latitude",
+]
+
+# Coordinates are rounded to this many decimal places (about 11 cm) for the
+# coordinate key, so segments differing only by rounding noise share a key
+COORDINATE_KEY_DECIMAL_PLACES = 6
+COORDINATE_KEY_QUANTUM = Decimal(1).scaleb(-COORDINATE_KEY_DECIMAL_PLACES)
+
+
+def coordinate_key(start_longitude, start_latitude, end_longitude, end_latitude):
+    """
+    Signed 64-bit hash of a segment's coordinates, rounded to
+    COORDINATE_KEY_DECIMAL_PLACES. Direction matters: reversed segments differ.
+    """
+    parts = []
+    for value in (start_longitude, start_latitude, end_longitude, end_latitude):
+        value = Decimal(value).quantize(
+            COORDINATE_KEY_QUANTUM, rounding=ROUND_HALF_EVEN
+        )
+        # -0.000000 and 0.000000 are the same coordinate
+        parts.append(str(abs(value) if value.is_zero() else value))
+    digest = hashlib.blake2b(",".join(parts).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def intensity_for_speed(speed):
+    speed = float(speed)
+    if speed <= HIGH_INTENSITY_MAX_SPEED:
+        return "elevada"
+    elif speed <= MEDIUM_INTENSITY_MAX_SPEED:
+        return "média"
+    else:
+        return "baixa"
+
+
+class Region(models.Model):
+    """
+    A city served by this deployment. Segments, readings, change log entries and
+    jobs belong to one region, and the API only sees the request's region.
+    """
+
+    slug = models.SlugField(max_length=50, unique=True)
+    name = models.CharField(max_length=100)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["slug"]
+
+    def __str__(self):
+        return self.name
+
+
+# Default region ids by slug, looked up once per process
+_default_region_ids = {}
+
+
+def default_region():
+    """
+    Id of the MONITORING_DEFAULT_REGION region. The migrations create it, otherwise
+    it's created on first use.
+    """
+    slug = settings.MONITORING_DEFAULT_REGION
+    region_id = _default_region_ids.get(slug)
+    if region_id is None:
+        region, created = Region.objects.get_or_create(
+            slug=slug, defaults={"name": slug.title()}
+        )
+        region_id = region.pk
+        if created:
+            # Not cached until committed, the region is gone if it rolls back
+            transaction.on_commit(
+                lambda: _default_region_ids.setdefault(slug, region_id),
+                using=region._state.db,
+            )
+        else:
+            _default_region_ids[slug] = region_id
+    return region_id
+
+
+def reset_default_region():
+    _default_region_ids.clear()
+
+
+class RoadSegmentQuerySet(models.QuerySet):
+    def with_latest_reading(self):
+        """Annotate each segment with the speed and timestamp of its latest reading."""
+        latest_reading = SpeedReading.objects.filter(
+            road_segment=models.OuterRef("pk")
+        ).order_by("-timestamp")[:1]
+        return self.annotate(
+            latest_speed=models.Subquery(latest_reading.values("average_speed")),
+            latest_timestamp=models.Subquery(latest_reading.values("timestamp")),
+        )
 
 
 class RoadSegment(models.Model):
     """Represents a road segment with geographic coordinates."""
 
+    # Covered by the (region, coordinate_key) unique index, which leads on region
+    region = models.ForeignKey(
+        Region,
+        on_delete=models.PROTECT,
+        related_name="road_segments",
+        default=default_region,
+        db_index=False,
+    )
+
     start_longitude = models.DecimalField(max_digits=10, decimal_places=7)
     start_latitude = models.DecimalField(max_digits=10, decimal_places=7)
 
@@ -13,18 +134,79 @@ class RoadSegment(models.Model):
     # Length in meters
     length = models.DecimalField(max_digits=10, decimal_places=2)
 
+    # See coordinate_key(), kept up to date on save. Looks segments up by coordinates
+    # and keeps near-duplicates out (unique per region). Only null for duplicates
+    # found when the column was added, until `manage.py merge_duplicate_segments`
+    # merges them.
+    coordinate_key = models.BigIntegerField(null=True, editable=False)
+
     # Timestamps
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = RoadSegmentQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["region", "coordinate_key"],
+                name="unique_segment_per_region_coordinates",
+            )
+        ]
+
     def __str__(self):
         return f"Segment {self.id}: ({self.start_latitude}, {self.start_longitude}) to ({self.end_latitude}, {self.end_longitude})"
 
+    def save(self, *args, **kwargs):
+        self.coordinate_key = coordinate_key(
+            *(getattr(self, field) for field in COORDINATE_FIELDS)
+        )
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and set(update_fields) & set(COORDINATE_FIELDS):
+            kwargs["update_fields"] = {*update_fields, "coordinate_key"}
+        super().save(*args, **kwargs)
+
     @property
     def total_readings(self):
         return self.speedreadings.count()
 
 
+class SpeedReadingQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # Readings take their segment's region
+        objs = list(objs)
+        segment_ids = {
+            reading.road_segment_id for reading in objs if reading.region_id is None
+        }
+        if segment_ids:
+            regions = dict(
+                RoadSegment.objects.filter(id__in=segment_ids).values_list(
+                    "id", "region_id"
+                )
+            )
+            for reading in objs:
+                if reading.region_id is None:
+                    reading.region_id = regions.get(reading.road_segment_id)
+        return super().bulk_create(objs, *args, **kwargs)
+
+    def with_traffic_intensity(self):
+        """Annotate each reading with its traffic intensity, computed in SQL as `intensity`."""
+        return self.annotate(
+            intensity=models.Case(
+                models.When(
+                    average_speed__lte=HIGH_INTENSITY_MAX_SPEED,
+                    then=models.Value("elevada"),
+                ),
+                models.When(
+                    average_speed__lte=MEDIUM_INTENSITY_MAX_SPEED,
+                    then=models.Value("média"),
+                ),
+                default=models.Value("baixa"),
+                output_field=models.CharField(),
+            )
+        )
+
+
 class SpeedReading(models.Model):
     """Represents a speed reading for a road segment with traffic intensity calculation."""
 
@@ -32,22 +214,211 @@ class SpeedReading(models.Model):
         RoadSegment, on_delete=models.CASCADE, related_name="speedreadings"
     )
 
+    # The segment's region, copied on save and bulk_create so readings can be
+    # scoped by region without a join. Covered by the (region, timestamp) index.
+    region = models.ForeignKey(
+        Region,
+        on_delete=models.PROTECT,
+        related_name="+",
+        editable=False,
+        db_index=False,
+    )
+
     average_speed = models.DecimalField(max_digits=5, decimal_places=2)
 
     timestamp = models.DateTimeField()
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = SpeedReadingQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            # One reading per segment and time; also the conflict target of upserts
+            models.UniqueConstraint(
+                fields=["road_segment", "timestamp"],
+                name="unique_reading_per_segment_timestamp",
+            )
+        ]
+        indexes = [models.Index(fields=["region", "timestamp"])]
+
+    def save(self, *args, **kwargs):
+        if self.region_id is None:
+            self.region_id = self.road_segment.region_id
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Reading {self.id}: {self.average_speed} km/h at {self.timestamp}"
 
     @property
     def traffic_intensity(self):
-        # Consider a better design for this, to allow for easy setting of thresholds
-        speed = float(self.average_speed)
-        if speed <= 20:
-            return "elevada"
-        elif speed <= 50:
-            return "média"
-        else:
-            return "baixa"
+        return intensity_for_speed(self.average_speed)
+
+
+class ChangeLogEntry(models.Model):
+    """Append-only change sequence for segments and readings, used by the change feed."""
+
+    ENTITY_ROAD_SEGMENT = "road_segment"
+    ENTITY_SPEED_READING = "speed_reading"
+    ENTITY_CHOICES = [
+        (ENTITY_ROAD_SEGMENT, "Road segment"),
+        (ENTITY_SPEED_READING, "Speed reading"),
+    ]
+
+    ACTION_UPSERT = "upsert"
+    ACTION_DELETE = "delete"
+    # Moved out of the database into the archive, where it is still readable
+    ACTION_ARCHIVE = "archive"
+    ACTION_CHOICES = [
+        (ACTION_UPSERT, "Upsert"),
+        (ACTION_DELETE, "Delete"),
+        (ACTION_ARCHIVE, "Archive"),
+    ]
+
+    # The auto-incrementing primary key is the change sequence number
+    entity = models.CharField(max_length=20, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+
+    # Covered by the (region, id) index the feed is read with
+    region = models.ForeignKey(
+        Region, on_delete=models.PROTECT, related_name="+", db_index=False
+    )
+
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ["id"]
+        indexes = [models.Index(fields=["region", "id"])]
+
+    def __str__(self):
+        return f"Change {self.id}: {self.action} {self.entity} {self.object_id}"
+
+
+class SpeedAnomaly(models.Model):
+    """A reading flagged as deviating from its segment's usual speed for that hour of the week."""
+
+    speed_reading = models.OneToOneField(
+        SpeedReading, on_delete=models.CASCADE, related_name="anomaly"
+    )
+
+    # Segment's usual speed for the reading's hour of the week when it arrived
+    expected_speed = models.DecimalField(max_digits=5, decimal_places=2)
+
+    # Deviation from expected speed, in units of the segment's typical deviation
+    score = models.FloatField()
+
+    detected_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Anomaly on reading {self.speed_reading_id}: score {self.score:.1f}"
+
+
+class SegmentSpeedProfile(models.Model):
+    """
+    A segment's speed statistics for each hour of the week (Monday 00h first), fitted
+    from its readings by `manage.py fit_speed_profiles` and used for forecasts.
+
+    Each statistic is a packed array of 168 values: reading counts (uint32), mean
+    speeds and standard deviations (float32), about 2 KB per segment.
+    """
+
+    road_segment = models.OneToOneField(
+        RoadSegment,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="speed_profile",
+    )
+
+    counts = models.BinaryField()
+    means = models.BinaryField()
+    stds = models.BinaryField()
+
+    # Readings with ids up to this one are folded into the profile
+    last_reading_id = models.BigIntegerField(default=0)
+    fitted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Speed profile of segment {self.road_segment_id}"
+
+
+class Job(models.Model):
+    """
+    A background job (import, archive, anomaly recompute, speed profile fit) run by
+    `manage.py run_jobs`.
+    """
+
+    KIND_IMPORT = "import"
+    KIND_ARCHIVE = "archive"
+    KIND_RECOMPUTE_ANOMALIES = "recompute_anomalies"
+    KIND_FIT_SPEED_PROFILES = "fit_speed_profiles"
+    KIND_CHOICES = [
+        (KIND_IMPORT, "Import traffic data"),
+        (KIND_ARCHIVE, "Archive old readings"),
+        (KIND_RECOMPUTE_ANOMALIES, "Recompute anomalies"),
+        (KIND_FIT_SPEED_PROFILES, "Fit speed profiles"),
+    ]
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_SUCCEEDED = "succeeded"
+    STATUS_FAILED = "failed"
+    STATUS_CANCELLED = "cancelled"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "Queued"),
+        (STATUS_RUNNING, "Running"),
+        (STATUS_SUCCEEDED, "Succeeded"),
+        (STATUS_FAILED, "Failed"),
+        (STATUS_CANCELLED, "Cancelled"),
+    ]
+    FINISHED_STATUSES = [STATUS_SUCCEEDED, STATUS_FAILED, STATUS_CANCELLED]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES)
+    params = models.JSONField(default=dict, blank=True)
+    # Every kind only reads and writes this region's data
+    region = models.ForeignKey(
+        Region, on_delete=models.PROTECT, related_name="jobs", default=default_region
+    )
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=STATUS_QUEUED
+    )
+    cancel_requested = models.BooleanField(default=False)
+
+    # Items (rows, readings) processed so far, out of progress_total if known
+    progress_done = models.BigIntegerField(default=0)
+    progress_total = models.BigIntegerField(null=True, blank=True)
+
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
+    )
+    worker = models.CharField(max_length=100, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Updated by the worker while running; a stale heartbeat means the worker died
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-id"]
+        indexes = [models.Index(fields=["status", "id"])]
+
+    def __str__(self):
+        return f"Job {self.id}: {self.kind} ({self.status})"
+
+    @property
+    def elapsed_seconds(self):
+        if self.started_at is None:
+            return None
+        end = self.finished_at or timezone.now()
+        return (end - self.started_at).total_seconds()
+
+    @property
+    def items_per_second(self):
+        elapsed = self.elapsed_seconds
+        if not elapsed:
+            return None
+        return self.progress_done / elapsed
@@ -0,0 +1,101 @@
+from django.conf import settings
+from django.db import connections, router, transaction
+
+from .changes import record_object_changes
+from .models import ChangeLogEntry, SpeedAnomaly, SpeedReading
+
+
+def delete_readings(reading_ids, action=ChangeLogEntry.ACTION_DELETE):
+    """
+    Delete speed readings and their anomalies by id, in one DELETE each, recording
+    their change feed entries (tombstones, or `action`) in one INSERT.
+    QuerySet.delete() would instead load every reading to send its post_delete
+    signal. Returns readings deleted.
+    """
+    with transaction.atomic():
+        SpeedAnomaly.objects.filter(speed_reading_id__in=reading_ids).delete()
+        # Each tombstone goes to its reading's region feed
+        tombstones = list(
+            SpeedReading.objects.filter(id__in=reading_ids).only("id", "region")
+        )
+        deleted = _delete_by_id(SpeedReading, [reading.id for reading in tombstones])
+        record_object_changes(ChangeLogEntry.ENTITY_SPEED_READING, tombstones, action)
+    return deleted
+
+
+def _delete_by_id(model, ids):
+    """DELETE rows by id without loading them or sending signals. Returns rows deleted."""
+    if not ids:
+        return 0
+    connection = connections[router.db_for_write(model)]
+    table = connection.ops.quote_name(model._meta.db_table)
+    pk = connection.ops.quote_name(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # One array parameter instead of one per id
+            cursor.execute(f"DELETE FROM {table} WHERE {pk} = ANY(%s)", [ids])
+        else:
+            placeholders = ", ".join(["%s"] * len(ids))
+            cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({placeholders})", ids)
+        return cursor.rowcount
+
+
+def purge_readings(
+    segment_id=None,
+    start=None,
+    end=None,
+    batch_size=None,
+    progress=None,
+    region_id=None,
+):
+    """
+    Delete the speed readings of a segment, a region and/or with
+    start <= timestamp < end, `batch_size` at a time (default
+    MONITORING_DELETE_BATCH_SIZE). Each batch is its own short transaction, so
+    memory use and lock times don't grow with the number of readings; an
+    interrupted purge keeps the batches already deleted. Archived readings are
+    not touched.
+
+    `progress(done, total)` is called after each batch. Returns the number of
+    readings deleted.
+    """
+    batch_size = batch_size or settings.MONITORING_DELETE_BATCH_SIZE
+    filters = {}
+    if segment_id is not None:
+        filters["road_segment_id"] = segment_id
+    if start is not None:
+        filters["timestamp__gte"] = start
+    if end is not None:
+        filters["timestamp__lt"] = end
+    readings = SpeedReading.objects.filter(**filters)
+    if region_id is not None:
+        readings = readings.filter(region_id=region_id)
+
+    total = readings.count() if progress else None
+    deleted = 0
+
+    last_id = 0
+    while batch := list(
+        readings.filter(id__gt=last_id)
+        .order_by("id")
+        .values_list("id", flat=True)[:batch_size]
+    ):
+        last_id = batch[-1]
+        deleted += delete_readings(batch)
+        if progress:
+            progress(deleted, total)
+
+    return deleted
+
+
+def delete_segment(segment):
+    """
+    Delete a road segment, purging its readings in batches first, so the cascade
+    doesn't collect them all in memory. The segment itself and its tombstone are
+    deleted and recorded in one transaction, and its archived readings once that
+    commits. Returns the number of readings deleted.
+    """
+    deleted = purge_readings(segment_id=segment.pk)
+    with transaction.atomic():
+        segment.delete()
+    return deleted
@@ -0,0 +1,48 @@
+import msgpack
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def to_columns(data):
+    """
+    Transpose a list of objects into one list per field. Paginated data (a dict with
+    "results") has its results transposed; anything else is returned as is.
+    """
+    if isinstance(data, dict) and isinstance(data.get("results"), list):
+        return {**data, "results": to_columns(data["results"])}
+    if not isinstance(data, list) or not all(isinstance(row, dict) for row in data):
+        return data
+    fields = list(data[0]) if data else []
+    return {field: [row.get(field) for row in data] for field in fields}
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    JSON with lists of objects rendered as one array per field, e.g.
+    {"id": [1, 2], "average_speed": ["45.20", "61.00"]}, so field names aren't
+    repeated for every object. Other responses render as plain JSON.
+    """
+
+    media_type = "application/vnd.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(to_columns(data), accepted_media_type, renderer_context)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    MessagePack. Values without a MessagePack type (dates, decimals, UUIDs...) are
+    encoded as the JSON renderer encodes them.
+    """
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+    encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=self.encoder.default)
@@ -0,0 +1,243 @@
+import heapq
+import threading
+import time
+from array import array
+
+import numpy as np
+from django.conf import settings
+
+from .changes import settled_changes
+from .models import ChangeLogEntry, RoadSegment, SpeedReading
+
+EARTH_RADIUS_METERS = 6_371_000
+
+
+def travel_time(length, speed):
+    """Seconds to cover `length` meters at `speed` km/h."""
+    return float(length) / (max(float(speed), 1.0) / 3.6)
+
+
+class RoadGraph:
+    """
+    Directed road graph of a region, whose nodes are segment endpoints shared by
+    coordinates.
+
+    Adjacency is kept in compressed sparse row form (typed arrays): the edges
+    leaving node `n` are `offsets[n]:offsets[n + 1]`. Each edge is one segment,
+    weighted by its travel time at the latest reading's speed.
+
+    Speed changes are applied in place, by segment id, from the settled entries
+    of the change log (see settled_changes), so one committed late is not
+    skipped. Anything that changes the topology (segments added, moved or deleted)
+    triggers a rebuild on the next query.
+    """
+
+    def __init__(self, region_id, default_speed=50.0, refresh_seconds=1.0):
+        self.region_id = region_id
+        self.default_speed = default_speed
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _load(self):
+        # Later entries are applied again on the next refresh, which is harmless
+        last_seq = (
+            settled_changes(self.region_id).order_by("-id").values_list("id", flat=True)
+        )
+        self.last_seq = last_seq.first() or 0
+
+        rows = (
+            RoadSegment.objects.filter(region_id=self.region_id)
+            .with_latest_reading()
+            .values_list(
+                "id",
+                "start_longitude",
+                "start_latitude",
+                "end_longitude",
+                "end_latitude",
+                "length",
+                "latest_speed",
+            )
+        )
+
+        nodes = {}
+        edges = []
+        for segment_id, start_lon, start_lat, end_lon, end_lat, length, speed in rows:
+            source = nodes.setdefault((start_lon, start_lat), len(nodes))
+            target = nodes.setdefault((end_lon, end_lat), len(nodes))
+            edges.append((source, target, segment_id, length, speed))
+        edges.sort()
+
+        coordinates = np.array(list(nodes), dtype=np.float64).reshape(-1, 2)
+        self.node_longitude = coordinates[:, 0].copy()
+        self.node_latitude = coordinates[:, 1].copy()
+
+        self.offsets = array("l", [0] * (len(nodes) + 1))
+        self.sources = array("l")
+        self.targets = array("l")
+        self.edge_segment = array("q")
+        self.edge_length = array("d")
+        self.edge_time = array("d")
+        self.segment_edge = {}
+
+        for index, (source, target, segment_id, length, speed) in enumerate(edges):
+            self.offsets[source + 1] += 1
+            self.sources.append(source)
+            self.targets.append(target)
+            self.edge_segment.append(segment_id)
+            self.edge_length.append(float(length))
+            self.edge_time.append(
+                travel_time(length, self.default_speed if speed is None else speed)
+            )
+            self.segment_edge[segment_id] = index
+        for node in range(len(nodes)):
+            self.offsets[node + 1] += self.offsets[node]
+
+        self._loaded = True
+        self._refreshed_at = time.monotonic()
+
+    def _apply_changes(self):
+        entries = list(
+            settled_changes(self.region_id, self.last_seq)
+            .order_by("id")
+            .values_list("id", "entity", "object_id", "action")
+        )
+        if not entries:
+            return
+
+        readings = set()
+        for seq, entity, object_id, action in entries:
+            if action == ChangeLogEntry.ACTION_ARCHIVE:
+                continue
+            if (
+                entity == ChangeLogEntry.ENTITY_ROAD_SEGMENT
+                or action == ChangeLogEntry.ACTION_DELETE
+            ):
+                self._load()
+                return
+            readings.add(object_id)
+
+        latest = {}
+        for segment_id, speed, timestamp in (
+            SpeedReading.objects.filter(id__in=readings)
+            .order_by("timestamp")
+            .values_list("road_segment_id", "average_speed", "timestamp")
+        ):
+            latest[segment_id] = (speed, timestamp)
+
+        # Only move a segment's speed if the changed reading is now its latest
+        current = dict(
+            RoadSegment.objects.filter(id__in=latest)
+            .with_latest_reading()
+            .values_list("id", "latest_timestamp")
+        )
+        for segment_id, (speed, timestamp) in latest.items():
+            edge = self.segment_edge.get(segment_id)
+            if edge is not None and current.get(segment_id) == timestamp:
+                self.edge_time[edge] = travel_time(self.edge_length[edge], speed)
+
+        self.last_seq = entries[-1][0]
+
+    def refresh(self):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            elif time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+                self._apply_changes()
+                self._refreshed_at = time.monotonic()
+
+    def nearest_node(self, latitude, longitude):
+        """Index of the graph node closest to a point (equirectangular distance)."""
+        scale = np.cos(np.radians(latitude))
+        distance = ((self.node_longitude - longitude) * scale) ** 2 + (
+            self.node_latitude - latitude
+        ) ** 2
+        node = int(np.argmin(distance))
+        return (
+            node,
+            float(np.sqrt(distance[node])) * np.radians(1) * EARTH_RADIUS_METERS,
+        )
+
+    def shortest_path(self, source, target):
+        """Dijkstra over the CSR arrays. Returns (seconds, [edge indexes]) or None."""
+        offsets, targets, edge_time = self.offsets, self.targets, self.edge_time
+        best = {source: 0.0}
+        via_edge = {}
+        heap = [(0.0, source)]
+
+        while heap:
+            cost, node = heapq.heappop(heap)
+            if node == target:
+                break
+            if cost > best[node]:
+                continue
+            for edge in range(offsets[node], offsets[node + 1]):
+                neighbour = targets[edge]
+                new_cost = cost + edge_time[edge]
+                if new_cost < best.get(neighbour, float("inf")):
+                    best[neighbour] = new_cost
+                    via_edge[neighbour] = edge
+                    heapq.heappush(heap, (new_cost, neighbour))
+        else:
+            return None
+
+        edges = []
+        node = target
+        while node != source:
+            edge = via_edge[node]
+            edges.append(edge)
+            node = self.sources[edge]
+        edges.reverse()
+        return best[target], edges
+
+    def route(self, start_latitude, start_longitude, end_latitude, end_longitude):
+        """Fastest route between the graph nodes nearest to two points, or None."""
+        self.refresh()
+        with self._lock:
+            if not len(self.targets):
+                return None
+            source, start_distance = self.nearest_node(start_latitude, start_longitude)
+            target, end_distance = self.nearest_node(end_latitude, end_longitude)
+            path = self.shortest_path(source, target)
+            if path is None:
+                return None
+
+            seconds, edges = path
+            return {
+                "start": self._node(source, start_distance),
+                "end": self._node(target, end_distance),
+                "segments": [self.edge_segment[edge] for edge in edges],
+                "total_length": round(sum(self.edge_length[e] for e in edges), 2),
+                "travel_time": round(seconds, 1),
+            }
+
+    def _node(self, node, distance):
+        return {
+            "latitude": float(self.node_latitude[node]),
+            "longitude": float(self.node_longitude[node]),
+            "distance": round(distance, 1),
+        }
+
+
+_graphs = {}
+_graph_lock = threading.Lock()
+
+
+def get_graph(region_id):
+    """Return the process-wide road graph of a region, created from settings on first use."""
+    graph = _graphs.get(region_id)
+    if graph is None:
+        with _graph_lock:
+            graph = _graphs.get(region_id)
+            if graph is None:
+                graph = _graphs[region_id] = RoadGraph(
+                    region_id,
+                    default_speed=settings.MONITORING_ROUTING_DEFAULT_SPEED,
+                    refresh_seconds=settings.MONITORING_ROUTING_REFRESH_SECONDS,
+                )
+    return graph
+
+
+def reset_graph():
+    with _graph_lock:
+        _graphs.clear()
@@ -0,0 +1,26 @@
+"""
+drf-spectacular's schema annotations, or no-op stand-ins when the docs are off
+(MONITORING_ENABLE_DOCS), so API-only workers never import it.
+"""
+
+from django.conf import settings
+
+if settings.MONITORING_ENABLE_DOCS:
+    from drf_spectacular.types import OpenApiTypes
+    from drf_spectacular.utils import OpenApiParameter, extend_schema
+else:
+
+    class OpenApiTypes:
+        STR = INT = OBJECT = None
+
+    class OpenApiParameter:
+        HEADER = QUERY = None
+
+        def __init__(self, *args, **kwargs):
+            pass
+
+    def extend_schema(*args, **kwargs):
+        return lambda view: view
+
+
+__all__ = ["OpenApiParameter", "OpenApiTypes", "extend_schema"]
@@ -1,6 +1,27 @@
+from datetime import UTC, datetime, timedelta
+
+from django.conf import settings
 from rest_framework import serializers
-from .models import RoadSegment, SpeedReading
+from .compact import CompactSpeedReading
+from .models import (
+    COORDINATE_FIELDS,
+    Job,
+    RoadSegment,
+    SpeedAnomaly,
+    SpeedReading,
+    coordinate_key,
+)
 from django.utils import timezone
+from .tenancy import request_region
+from .validation import READING_RULES, SEGMENT_RULES
+
+
+def apply_rules(rules, value):
+    """Validate a field value against rules shared with the importer."""
+    for rule in rules:
+        if not rule.accepts(value):
+            raise serializers.ValidationError(rule.message)
+    return value
 
 
 class RoadSegmentSerializer(serializers.ModelSerializer):
@@ -24,32 +45,69 @@ class RoadSegmentSerializer(serializers.ModelSerializer):
         read_only_fields = ["id", "created_at", "updated_at"]
 
     def validate_length(self, value):
-        if value <= 0:
-            raise serializers.ValidationError("Length must be positive")
-        return value
+        return apply_rules(SEGMENT_RULES["length"], value)
 
     def validate_start_latitude(self, value):
-        if not -90 <= value <= 90:
-            raise serializers.ValidationError("Latitude must be between -90 and 90")
-        return value
+        return apply_rules(SEGMENT_RULES["start_latitude"], value)
 
     def validate_end_latitude(self, value):
-        if not -90 <= value <= 90:
-            raise serializers.ValidationError("Latitude must be between -90 and 90")
-        return value
+        return apply_rules(SEGMENT_RULES["end_latitude"], value)
 
     def validate_start_longitude(self, value):
-        if not -180 <= value <= 180:
-            raise serializers.ValidationError("Longitude must be between -180 and 180")
-        return value
+        return apply_rules(SEGMENT_RULES["start_longitude"], value)
 
     def validate_end_longitude(self, value):
-        if not -180 <= value <= 180:
-            raise serializers.ValidationError("Longitude must be between -180 and 180")
-        return value
+        return apply_rules(SEGMENT_RULES["end_longitude"], value)
+
+    def validate(self, attrs):
+        coordinates = [
+            attrs[field] if field in attrs else getattr(self.instance, field)
+            for field in COORDINATE_FIELDS
+        ]
+        if self.instance is not None:
+            region_id = self.instance.region_id
+        else:
+            region_id = request_region(self.context["request"])
+        duplicate = (
+            RoadSegment.objects.filter(
+                region_id=region_id, coordinate_key=coordinate_key(*coordinates)
+            )
+            .exclude(pk=getattr(self.instance, "pk", None))
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if duplicate is not None:
+            raise serializers.ValidationError(
+                f"Road segment {duplicate} already has these coordinates"
+            )
+        return attrs
+
+
+class RegionSegmentField(serializers.PrimaryKeyRelatedField):
+    """A road segment of the request's region, looked up when validating."""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get("request")
+        if request is not None:
+            queryset = queryset.filter(region_id=request_region(request))
+        return queryset
 
 
-class SpeedReadingSerializer(serializers.ModelSerializer):
+class SpeedReadingValidationMixin:
+    """Validation shared by the speed reading serializers."""
+
+    # Readings can only be written for segments of the request's region
+    serializer_related_field = RegionSegmentField
+
+    def validate_average_speed(self, value):
+        return apply_rules(READING_RULES["average_speed"], value)
+
+    def validate_timestamp(self, value):
+        return apply_rules(READING_RULES["timestamp"], value)
+
+
+class SpeedReadingSerializer(SpeedReadingValidationMixin, serializers.ModelSerializer):
     """Serializer for SpeedReading model with traffic intensity calculation."""
 
     traffic_intensity = serializers.CharField(read_only=True)
@@ -66,12 +124,270 @@ class SpeedReadingSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id", "created_at", "traffic_intensity"]
 
-    def validate_average_speed(self, value):
-        if value <= 0:
-            raise serializers.ValidationError("Average speed must be positive")
-        return value
 
-    def validate_timestamp(self, value):
-        if value > timezone.now():
-            raise serializers.ValidationError("Timestamp cannot be in the future")
+class CompactSpeedReadingSerializer(serializers.ModelSerializer):
+    """
+    Read-only serializer for the compact reading layout, with the same fields as
+    SpeedReadingSerializer, for `manage.py bench_renderers --compact`. `id` is the
+    reading's natural key.
+    """
+
+    id = serializers.CharField(source="natural_key", read_only=True)
+    average_speed = serializers.DecimalField(
+        max_digits=5, decimal_places=2, read_only=True
+    )
+    traffic_intensity = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = CompactSpeedReading
+        fields = [
+            "id",
+            "road_segment",
+            "average_speed",
+            "timestamp",
+            "created_at",
+            "traffic_intensity",
+        ]
+        read_only_fields = fields
+
+
+class SpeedReadingBatchItemSerializer(
+    SpeedReadingValidationMixin, serializers.Serializer
+):
+    """One reading of a batch; segments are checked for the whole batch at once."""
+
+    road_segment = serializers.IntegerField()
+    average_speed = serializers.DecimalField(max_digits=5, decimal_places=2)
+    timestamp = serializers.DateTimeField()
+
+
+class SpeedReadingBatchSerializer(serializers.Serializer):
+    """A batch of readings written in one upsert by /speed-readings/batch/."""
+
+    readings = SpeedReadingBatchItemSerializer(many=True, allow_empty=False)
+    upsert = serializers.BooleanField(
+        default=True,
+        help_text="Update the speed of existing readings (same segment and "
+        "timestamp); otherwise they are left unchanged",
+    )
+
+    def validate_readings(self, value):
+        max_readings = settings.MONITORING_BATCH_MAX_READINGS
+        if len(value) > max_readings:
+            raise serializers.ValidationError(
+                f"At most {max_readings} readings per batch"
+            )
+        segment_ids = {reading["road_segment"] for reading in value}
+        missing = segment_ids - set(
+            RoadSegment.objects.filter(
+                region_id=request_region(self.context["request"]), id__in=segment_ids
+            ).values_list("id", flat=True)
+        )
+        if missing:
+            raise serializers.ValidationError(
+                f"Unknown road segments: {', '.join(map(str, sorted(missing)))}"
+            )
         return value
+
+
+class SpeedAnomalySerializer(serializers.ModelSerializer):
+    """Read-only serializer for readings flagged by the anomaly detector."""
+
+    road_segment = serializers.IntegerField(
+        source="speed_reading.road_segment_id", read_only=True
+    )
+    average_speed = serializers.DecimalField(
+        source="speed_reading.average_speed",
+        max_digits=5,
+        decimal_places=2,
+        read_only=True,
+    )
+    timestamp = serializers.DateTimeField(
+        source="speed_reading.timestamp", read_only=True
+    )
+
+    class Meta:
+        model = SpeedAnomaly
+        fields = [
+            "id",
+            "speed_reading",
+            "road_segment",
+            "average_speed",
+            "timestamp",
+            "expected_speed",
+            "score",
+            "detected_at",
+        ]
+        read_only_fields = fields
+
+
+class RouteQuerySerializer(serializers.Serializer):
+    """Validates the start and end points of a route query."""
+
+    start_latitude = serializers.FloatField(min_value=-90, max_value=90)
+    start_longitude = serializers.FloatField(min_value=-180, max_value=180)
+    end_latitude = serializers.FloatField(min_value=-90, max_value=90)
+    end_longitude = serializers.FloatField(min_value=-180, max_value=180)
+
+
+class ReadingRangeSerializer(serializers.Serializer):
+    """Validates the time range of a segment history or aggregate query."""
+
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    # Range used when `start` is not given
+    DEFAULT_RANGE = timedelta(days=7)
+
+    def validate(self, attrs):
+        attrs.setdefault("end", timezone.now())
+        if "start" not in attrs:
+            try:
+                attrs["start"] = attrs["end"] - self.DEFAULT_RANGE
+            except OverflowError:
+                # `end` is less than DEFAULT_RANGE after the earliest datetime
+                attrs["start"] = datetime.min.replace(tzinfo=UTC)
+        if attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError("start must be before end")
+        return attrs
+
+
+class HistoryRangeSerializer(ReadingRangeSerializer):
+    """ReadingRangeSerializer, at most MONITORING_HISTORY_MAX_DAYS long."""
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        max_days = settings.MONITORING_HISTORY_MAX_DAYS
+        if attrs["end"] - attrs["start"] > timedelta(days=max_days):
+            raise serializers.ValidationError(
+                f"The range can be at most {max_days} days, "
+                f"request several ranges for longer"
+            )
+        return attrs
+
+
+class ForecastQuerySerializer(serializers.Serializer):
+    """Validates the start of a forecast, by default the current hour."""
+
+    start = serializers.DateTimeField(required=False)
+
+    def validate(self, attrs):
+        attrs.setdefault(
+            "start",
+            timezone.localtime().replace(minute=0, second=0, microsecond=0),
+        )
+        return attrs
+
+
+class SegmentForecastQuerySerializer(ForecastQuerySerializer):
+    hours = serializers.IntegerField(default=1, min_value=1, max_value=168)
+
+    def validate(self, attrs):
+        attrs = super().validate(attrs)
+        try:
+            # Start of the last forecast hour
+            attrs["start"] + timedelta(hours=attrs["hours"] - 1)
+        except OverflowError:
+            raise serializers.ValidationError(
+                "The forecast hours must end before the latest supported datetime"
+            )
+        return attrs
+
+
+class ImportJobParamsSerializer(serializers.Serializer):
+    """Parameters of an import job; the CSV file is uploaded with the job."""
+
+    start_date = serializers.DateField(default="2023-01-01")
+    hours_apart = serializers.IntegerField(default=1, min_value=1)
+    upsert = serializers.BooleanField(default=False)
+
+
+class ArchiveJobParamsSerializer(serializers.Serializer):
+    older_than = serializers.IntegerField(min_value=0)
+    segment = serializers.IntegerField(required=False)
+    batch_size = serializers.IntegerField(default=10000, min_value=1)
+
+
+class RecomputeAnomaliesJobParamsSerializer(serializers.Serializer):
+    """Time range to recompute, and optional overrides of the detector settings."""
+
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    alpha = serializers.FloatField(required=False, min_value=0.001, max_value=1)
+    threshold = serializers.FloatField(required=False, min_value=0)
+    min_samples = serializers.IntegerField(required=False, min_value=1)
+
+    def validate(self, attrs):
+        if "start" in attrs and "end" in attrs and attrs["start"] >= attrs["end"]:
+            raise serializers.ValidationError("start must be before end")
+        return attrs
+
+
+class FitSpeedProfilesJobParamsSerializer(serializers.Serializer):
+    full = serializers.BooleanField(default=False)
+    batch_size = serializers.IntegerField(default=50000, min_value=1)
+
+
+JOB_PARAMS_SERIALIZERS = {
+    Job.KIND_IMPORT: ImportJobParamsSerializer,
+    Job.KIND_ARCHIVE: ArchiveJobParamsSerializer,
+    Job.KIND_RECOMPUTE_ANOMALIES: RecomputeAnomaliesJobParamsSerializer,
+    Job.KIND_FIT_SPEED_PROFILES: FitSpeedProfilesJobParamsSerializer,
+}
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for background jobs, validating params against the job kind."""
+
+    file = serializers.FileField(
+        write_only=True, required=False, help_text="CSV file, for import jobs"
+    )
+    elapsed_seconds = serializers.FloatField(read_only=True)
+    items_per_second = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Job
+        fields = [
+            "id",
+            "kind",
+            "params",
+            "file",
+            "status",
+            "cancel_requested",
+            "progress_done",
+            "progress_total",
+            "elapsed_seconds",
+            "items_per_second",
+            "result",
+            "error",
+            "worker",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = [
+            "id",
+            "status",
+            "cancel_requested",
+            "progress_done",
+            "progress_total",
+            "result",
+            "error",
+            "worker",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+
+    def validate(self, attrs):
+        params = JOB_PARAMS_SERIALIZERS[attrs["kind"]](data=attrs.get("params", {}))
+        if not params.is_valid():
+            raise serializers.ValidationError({"params": params.errors})
+        # Stored as JSON, so keep the serialized form (dates as strings)
+        attrs["params"] = dict(params.data)
+
+        if attrs["kind"] == Job.KIND_IMPORT and "file" not in attrs:
+            raise serializers.ValidationError({"file": "Import jobs need a CSV file"})
+        if attrs["kind"] != Job.KIND_IMPORT and "file" in attrs:
+            raise serializers.ValidationError({"file": "Only import jobs take a file"})
+        return attrs
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .archive import delete_archive
+from .changes import record_object_changes
+from .detection import detect_anomalies
+from .models import (
+    ChangeLogEntry,
+    Region,
+    RoadSegment,
+    SpeedReading,
+    reset_default_region,
+)
+
+
+@receiver(post_delete, sender=Region)
+def region_deleted(sender, instance, **kwargs):
+    # It may have been the cached default region
+    reset_default_region()
+
+
+@receiver(post_save, sender=RoadSegment)
+def road_segment_saved(sender, instance, **kwargs):
+    record_object_changes(
+        ChangeLogEntry.ENTITY_ROAD_SEGMENT, [instance], ChangeLogEntry.ACTION_UPSERT
+    )
+
+
+@receiver(post_delete, sender=RoadSegment)
+def road_segment_deleted(sender, instance, using, **kwargs):
+    record_object_changes(
+        ChangeLogEntry.ENTITY_ROAD_SEGMENT, [instance], ChangeLogEntry.ACTION_DELETE
+    )
+    # Files can't be rolled back, so they are deleted once the segment is
+    segment_id = instance.pk
+    transaction.on_commit(lambda: delete_archive(segment_id), using=using)
+
+
+@receiver(post_save, sender=SpeedReading)
+def speed_reading_saved(sender, instance, created, **kwargs):
+    record_object_changes(
+        ChangeLogEntry.ENTITY_SPEED_READING,
+        [instance],
+        ChangeLogEntry.ACTION_UPSERT,
+    )
+    if created:
+        detect_anomalies([instance])
+
+
+@receiver(post_delete, sender=SpeedReading)
+def speed_reading_deleted(sender, instance, **kwargs):
+    record_object_changes(
+        ChangeLogEntry.ENTITY_SPEED_READING,
+        [instance],
+        ChangeLogEntry.ACTION_DELETE,
+    )
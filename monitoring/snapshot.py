@@ -0,0 +1,231 @@
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+
+from .changes import settled_changes
+from .models import (
+    HIGH_INTENSITY_MAX_SPEED,
+    MEDIUM_INTENSITY_MAX_SPEED,
+    ChangeLogEntry,
+    RoadSegment,
+    SpeedReading,
+)
+
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+
+class NetworkSnapshot:
+    """
+    Columnar in-memory cache of the length and latest reading of every segment of
+    a region.
+
+    Arrays are indexed by a per-segment slot. Deleted segments keep their slot
+    with a zero length, so they drop out of every length-weighted figure without
+    moving the other slots.
+
+    The cache is loaded once and then refreshed incrementally from the change
+    log, so writes made by other processes (workers, the importer) are picked
+    up too. Only settled entries (see settled_changes) are applied, so one
+    committed late is not skipped. The summary for the default percentiles is
+    memoized until the next change is applied.
+    """
+
+    def __init__(self, region_id, refresh_seconds=1.0):
+        self.region_id = region_id
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def _allocate(self, capacity):
+        self.length = np.zeros(capacity, dtype=np.float64)
+        self.speed = np.full(capacity, np.nan, dtype=np.float64)
+        self.timestamp = np.full(capacity, np.iinfo(np.int64).min, dtype=np.int64)
+
+    def _slot(self, segment_id):
+        slot = self._slots.get(segment_id)
+        if slot is None:
+            slot = len(self._slots)
+            if slot == len(self.length):
+                old = (self.length, self.speed, self.timestamp)
+                self._allocate(len(self.length) * 2)
+                for new_array, old_array in zip(
+                    (self.length, self.speed, self.timestamp), old
+                ):
+                    new_array[: len(old_array)] = old_array
+            self._slots[segment_id] = slot
+        return slot
+
+    def _load(self):
+        """Rebuild the arrays with a single query over segments and their latest reading."""
+        # Later entries are applied again on the next refresh, which is harmless
+        last_seq = (
+            settled_changes(self.region_id).order_by("-id").values_list("id", flat=True)
+        )
+        self.last_seq = last_seq.first() or 0
+
+        rows = (
+            RoadSegment.objects.filter(region_id=self.region_id)
+            .with_latest_reading()
+            .values_list("id", "length", "latest_speed", "latest_timestamp")
+        )
+
+        self._slots = {}
+        self._allocate(1024)
+        for segment_id, length, speed, timestamp in rows.iterator():
+            slot = self._slot(segment_id)
+            self.length[slot] = length
+            if speed is not None:
+                self._set_reading(slot, speed, timestamp)
+
+        self._summary = None
+        self._loaded = True
+        self._refreshed_at = time.monotonic()
+
+    def _set_reading(self, slot, speed, timestamp):
+        epoch = int(timestamp.timestamp() * 1_000_000)
+        if epoch >= self.timestamp[slot]:
+            self.speed[slot] = speed
+            self.timestamp[slot] = epoch
+
+    def _apply_changes(self):
+        entries = list(
+            settled_changes(self.region_id, self.last_seq)
+            .order_by("id")
+            .values_list("id", "entity", "object_id", "action")
+        )
+        if not entries:
+            return
+
+        readings, segments, deleted_segments = set(), set(), set()
+        for seq, entity, object_id, action in entries:
+            if action == ChangeLogEntry.ACTION_ARCHIVE:
+                # Old readings: kept until the next full load instead of reloading
+                # after every archive batch
+                continue
+            if entity == ChangeLogEntry.ENTITY_SPEED_READING:
+                if action == ChangeLogEntry.ACTION_DELETE:
+                    # The segment's previous reading isn't cached, start over
+                    self._load()
+                    return
+                readings.add(object_id)
+            elif action == ChangeLogEntry.ACTION_DELETE:
+                deleted_segments.add(object_id)
+                segments.discard(object_id)
+            else:
+                segments.add(object_id)
+                deleted_segments.discard(object_id)
+
+        for segment_id, length in RoadSegment.objects.filter(
+            id__in=segments
+        ).values_list("id", "length"):
+            self.length[self._slot(segment_id)] = length
+
+        for segment_id in deleted_segments:
+            slot = self._slots.get(segment_id)
+            if slot is not None:
+                self.length[slot] = 0
+                self.speed[slot] = np.nan
+
+        for segment_id, speed, timestamp in SpeedReading.objects.filter(
+            id__in=readings
+        ).values_list("road_segment_id", "average_speed", "timestamp"):
+            slot = self._slots.get(segment_id)
+            if slot is not None:
+                self._set_reading(slot, speed, timestamp)
+
+        self.last_seq = entries[-1][0]
+        self._summary = None
+
+    def refresh(self, force=False):
+        with self._lock:
+            if not self._loaded:
+                self._load()
+            elif force or time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+                self._apply_changes()
+                self._refreshed_at = time.monotonic()
+
+    def summary(self, percentiles=DEFAULT_PERCENTILES):
+        """Length-weighted breakdown of the network by traffic intensity."""
+        self.refresh()
+        percentiles = tuple(percentiles)
+        with self._lock:
+            # Other percentiles are client-chosen, so they aren't kept
+            if percentiles != DEFAULT_PERCENTILES:
+                return self._summarize(percentiles)
+            if self._summary is None:
+                self._summary = self._summarize(percentiles)
+            return self._summary
+
+    def _summarize(self, percentiles):
+        count = len(self._slots)
+        length = self.length[:count]
+        speed = self.speed[:count]
+
+        total_length = float(length.sum())
+        has_reading = ~np.isnan(speed) & (length > 0)
+
+        # NaN compares False, so segments without readings fall in no class
+        classes = {
+            "elevada": speed <= HIGH_INTENSITY_MAX_SPEED,
+            "média": (speed > HIGH_INTENSITY_MAX_SPEED)
+            & (speed <= MEDIUM_INTENSITY_MAX_SPEED),
+            "baixa": speed > MEDIUM_INTENSITY_MAX_SPEED,
+            "sem_dados": ~has_reading,
+        }
+        intensity = {}
+        for name, mask in classes.items():
+            class_length = float(length[mask].sum())
+            intensity[name] = {
+                "length": round(class_length, 2),
+                "percentage": (
+                    round(100 * class_length / total_length, 2) if total_length else 0.0
+                ),
+            }
+
+        return {
+            "segments": int(np.count_nonzero(length > 0)),
+            "segments_with_readings": int(np.count_nonzero(has_reading)),
+            "total_length": round(total_length, 2),
+            "intensity": intensity,
+            "speed_percentiles": self._weighted_percentiles(
+                speed[has_reading], length[has_reading], percentiles
+            ),
+        }
+
+    @staticmethod
+    def _weighted_percentiles(speed, weight, percentiles):
+        """Speed percentiles where each segment counts proportionally to its length."""
+        if not len(speed):
+            return {f"p{p:g}": None for p in percentiles}
+
+        order = np.argsort(speed)
+        speed, weight = speed[order], weight[order]
+        # Midpoint of each segment's share of the cumulative length
+        cumulative = (np.cumsum(weight) - weight / 2) / weight.sum()
+        values = np.interp(np.asarray(percentiles) / 100, cumulative, speed)
+        return {f"p{p:g}": round(float(v), 2) for p, v in zip(percentiles, values)}
+
+
+_snapshots = {}
+_snapshot_lock = threading.Lock()
+
+
+def get_snapshot(region_id):
+    """Return the process-wide snapshot of a region, created from settings on first use."""
+    snapshot = _snapshots.get(region_id)
+    if snapshot is None:
+        with _snapshot_lock:
+            snapshot = _snapshots.get(region_id)
+            if snapshot is None:
+                snapshot = _snapshots[region_id] = NetworkSnapshot(
+                    region_id,
+                    refresh_seconds=settings.MONITORING_SNAPSHOT_REFRESH_SECONDS,
+                )
+    return snapshot
+
+
+def reset_snapshot():
+    with _snapshot_lock:
+        _snapshots.clear()
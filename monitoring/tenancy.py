@@ -0,0 +1,33 @@
+from django.conf import settings
+from rest_framework.exceptions import NotFound
+
+from .models import Region, default_region
+
+# Where a request names its region (slug); the header wins over the query parameter
+REGION_HEADER = "X-Region"
+REGION_PARAM = "region"
+
+
+def request_region(request):
+    """
+    Id of the region a (DRF) request is for: its X-Region header, else its ?region=
+    parameter, else MONITORING_DEFAULT_REGION. Looked up once per request. Raises
+    NotFound for an unknown region.
+    """
+    region_id = getattr(request, "region_id", None)
+    if region_id is None:
+        slug = (
+            request.headers.get(REGION_HEADER)
+            or request.query_params.get(REGION_PARAM)
+            or settings.MONITORING_DEFAULT_REGION
+        )
+        if slug == settings.MONITORING_DEFAULT_REGION:
+            region_id = default_region()
+        else:
+            region_id = (
+                Region.objects.filter(slug=slug).values_list("id", flat=True).first()
+            )
+            if region_id is None:
+                raise NotFound(f"Unknown region: {slug}")
+        request.region_id = region_id
+    return region_id
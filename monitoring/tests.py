@@ -1,11 +1,70 @@
+import csv
+import gzip
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from io import StringIO
+
+import brotli
+import msgpack
+import numpy as np
+
 from django.contrib.auth.models import User
-from rest_framework.test import APITestCase
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connections, router, transaction
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory,
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase, APITransactionTestCase
 from rest_framework import status
 from django.utils import timezone
 from decimal import Decimal
-from datetime import timedelta
+from datetime import UTC, datetime, timedelta
 
-from .models import RoadSegment, SpeedReading
+from .archive import append_month, read_range, to_epoch_ms
+from .changes import encode_token
+from .coalescing import SingleFlight
+from .compact import CompactSpeedReading, compact_reading_table
+from .detection import (
+    SpeedAnomalyDetector,
+    get_detector,
+    recompute_anomalies,
+    reset_detector,
+)
+from .importer import _insert_new, upsert_readings
+from .management.commands.measure_startup import (
+    CONFIGURATIONS,
+    Command as MeasureStartupCommand,
+)
+from .forecasting import fit_speed_profiles, reset_profiles, unpack_profiles
+from .jobs import JobCancelled, claim_job, run_job, run_worker
+from .middleware import ReadReplicaMiddleware
+from .models import (
+    ChangeLogEntry,
+    Job,
+    Region,
+    RoadSegment,
+    SegmentSpeedProfile,
+    SpeedAnomaly,
+    SpeedReading,
+    default_region,
+)
+from .routing import reset_graph
+from .snapshot import get_snapshot, reset_snapshot
+from .throttling import TokenBucketStore, reset_store
+from .validation import SEGMENT_RULES, Range
+from .views import static_schema
 
 
 class RoadSegmentViewSetTestCase(APITestCase):
@@ -392,3 +451,2078 @@ class PermissionTestCase(APITestCase):
         }
         response = self.client.post(url, data, format="json")
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+
+@override_settings(MONITORING_CHANGE_FEED_SETTLE_SECONDS=0)
+class ChangeFeedTestCase(APITestCase):
+    def setUp(self):
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        self.speed_reading = SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("31.77"),
+            timestamp=timezone.now(),
+        )
+
+    def test_changes_from_start(self):
+        response = self.client.get("/api/changes/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        changes = response.data["changes"]
+        self.assertEqual(len(changes), 2)
+        self.assertEqual(changes[0]["entity"], "road_segment")
+        self.assertEqual(changes[1]["entity"], "speed_reading")
+        self.assertEqual(changes[1]["data"]["average_speed"], "31.77")
+        self.assertFalse(response.data["has_more"])
+
+    def test_changes_since_token(self):
+        token = self.client.get("/api/changes/").data["next_token"]
+        self.speed_reading.average_speed = Decimal("40.00")
+        self.speed_reading.save()
+
+        response = self.client.get(f"/api/changes/?since={token}")
+        self.assertEqual(len(response.data["changes"]), 1)
+        self.assertEqual(response.data["changes"][0]["action"], "upsert")
+        self.assertEqual(response.data["changes"][0]["data"]["average_speed"], "40.00")
+
+    def test_delete_records_tombstones(self):
+        token = self.client.get("/api/changes/").data["next_token"]
+        segment_id, reading_id = self.road_segment.id, self.speed_reading.id
+        self.road_segment.delete()
+
+        response = self.client.get(f"/api/changes/?since={token}")
+        changes = response.data["changes"]
+        self.assertEqual(
+            {(c["entity"], c["id"]) for c in changes},
+            {
+                ("road_segment", segment_id),
+                ("speed_reading", reading_id),
+            },
+        )
+        self.assertTrue(all(c["action"] == "delete" for c in changes))
+        self.assertTrue(all(c["data"] is None for c in changes))
+
+    def test_changes_in_bounded_batches(self):
+        response = self.client.get("/api/changes/?limit=1")
+        self.assertEqual(len(response.data["changes"]), 1)
+        self.assertTrue(response.data["has_more"])
+
+        token = response.data["next_token"]
+        response = self.client.get(f"/api/changes/?since={token}&limit=1")
+        self.assertEqual(response.data["changes"][0]["entity"], "speed_reading")
+        self.assertFalse(response.data["has_more"])
+
+    def test_empty_batch_keeps_token(self):
+        last_seq = ChangeLogEntry.objects.order_by("-id").first().id
+        token = encode_token(last_seq)
+        response = self.client.get(f"/api/changes/?since={token}")
+        self.assertEqual(response.data["changes"], [])
+        self.assertEqual(response.data["next_token"], token)
+
+    def test_invalid_token(self):
+        response = self.client.get("/api/changes/?since=not-a-token")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_anonymous_cannot_post_changes(self):
+        response = self.client.post("/api/changes/", {}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class SpeedAnomalyDetectorTestCase(SimpleTestCase):
+    def setUp(self):
+        self.detector = SpeedAnomalyDetector(alpha=0.2, threshold=3.0, min_samples=4)
+        # Same hour of the week, one week apart
+        self.timestamps = [
+            timezone.now() - timedelta(weeks=weeks) for weeks in range(10, 0, -1)
+        ]
+
+    def test_no_anomaly_without_history(self):
+        detection = self.detector.observe(1, 10, self.timestamps[0])
+        self.assertFalse(detection.is_anomaly)
+        self.assertIsNone(detection.expected_speed)
+
+    def test_flags_deviation_from_usual_speed(self):
+        for speed, timestamp in zip([50, 52, 48, 51, 49], self.timestamps):
+            self.assertFalse(self.detector.observe(1, speed, timestamp).is_anomaly)
+
+        detection = self.detector.observe(1, 10, self.timestamps[5])
+        self.assertTrue(detection.is_anomaly)
+        self.assertAlmostEqual(detection.expected_speed, 50, delta=2)
+
+    def test_other_hours_are_independent(self):
+        for speed, timestamp in zip([50, 52, 48, 51, 49], self.timestamps):
+            self.detector.observe(1, speed, timestamp)
+
+        detection = self.detector.observe(
+            1, 10, self.timestamps[5] + timedelta(hours=3)
+        )
+        self.assertFalse(detection.is_anomaly)
+
+    def test_rolling_percentiles(self):
+        for i in range(50):
+            self.detector.observe(1, 30 + i % 10, self.timestamps[0])
+        self.assertTrue(30 <= self.detector.percentile(1, 50) <= 40)
+        self.assertIsNone(self.detector.percentile(2, 50))
+
+    def test_state_grows_with_segments(self):
+        for segment_id in range(3000):
+            self.detector.observe(segment_id, 40, self.timestamps[0])
+        self.assertLess(self.detector.nbytes / len(self.detector.scale), 600)
+        self.assertIsNotNone(self.detector.percentile(2999, 50))
+
+
+@override_settings(MONITORING_ANOMALY_MIN_SAMPLES=2)
+class SpeedAnomalyViewSetTestCase(APITestCase):
+    def setUp(self):
+        reset_detector()
+        self.addCleanup(reset_detector)
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        for weeks, speed in [(4, "50.00"), (3, "51.00"), (2, "49.00")]:
+            SpeedReading.objects.create(
+                road_segment=self.road_segment,
+                average_speed=Decimal(speed),
+                timestamp=timezone.now() - timedelta(weeks=weeks),
+            )
+
+    def test_usual_reading_is_not_flagged(self):
+        SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("50.50"),
+            timestamp=timezone.now() - timedelta(weeks=1),
+        )
+        self.assertEqual(SpeedAnomaly.objects.count(), 0)
+
+    def test_deviating_reading_is_flagged(self):
+        reading = SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("8.00"),
+            timestamp=timezone.now() - timedelta(weeks=1),
+        )
+
+        response = self.client.get(
+            f"/api/anomalies/?road_segment={self.road_segment.id}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["speed_reading"], reading.id)
+        self.assertEqual(response.data[0]["average_speed"], "8.00")
+
+
+@override_settings(
+    MONITORING_ANOMALY_MIN_SAMPLES=3, MONITORING_PROFILE_SETTLE_SECONDS=0
+)
+class DetectorWarmUpTestCase(APITestCase):
+    def setUp(self):
+        reset_detector()
+        self.addCleanup(reset_detector)
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        # Same hour of the week for every reading
+        self.now = timezone.now()
+
+    def store_history(self, weeks):
+        # Bulk writes skip the signals, as readings stored before a restart
+        SpeedReading.objects.bulk_create(
+            SpeedReading(
+                road_segment=self.road_segment,
+                average_speed=Decimal(50 + week % 2),
+                timestamp=self.now - timedelta(weeks=week),
+            )
+            for week in weeks
+        )
+
+    def create_outlier(self):
+        SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("8.00"),
+            timestamp=self.now,
+        )
+        return SpeedAnomaly.objects.count()
+
+    def test_seeds_from_speed_profiles(self):
+        self.store_history([3, 2, 1])
+        call_command("fit_speed_profiles", stdout=StringIO())
+        # The last recompute job, then the profiles: no readings
+        with self.assertNumQueries(2):
+            get_detector()
+        self.assertEqual(self.create_outlier(), 1)
+
+    def test_readings_not_replayed(self):
+        # Seen once the next fit folds them into the profiles
+        self.store_history([3, 2, 1])
+        self.assertEqual(self.create_outlier(), 0)
+
+    def test_warms_up_again_after_recompute_job(self):
+        detector = get_detector()
+        # Finished by a worker in another process
+        Job.objects.create(
+            kind=Job.KIND_RECOMPUTE_ANOMALIES,
+            status=Job.STATUS_SUCCEEDED,
+            finished_at=timezone.now(),
+        )
+        self.assertIs(get_detector(), detector)
+        with override_settings(MONITORING_ANOMALY_REFRESH_SECONDS=0):
+            refreshed = get_detector()
+            self.assertIsNot(refreshed, detector)
+            self.assertIs(get_detector(), refreshed)
+
+    def test_interrupted_recompute_keeps_replaced_batches(self):
+        self.store_history([3, 2, 1])
+        fit_speed_profiles()
+        self.assertEqual(self.create_outlier(), 1)
+
+        def progress(done, total):
+            raise JobCancelled()
+
+        # Stopped after its first batch, which is kept: the outlier's anomaly is gone
+        with self.assertRaises(JobCancelled):
+            recompute_anomalies(batch_size=4, progress=progress, threshold=1000)
+        self.assertEqual(SpeedAnomaly.objects.count(), 0)
+
+
+@override_settings(
+    MONITORING_SNAPSHOT_REFRESH_SECONDS=0, MONITORING_CHANGE_FEED_SETTLE_SECONDS=0
+)
+class NetworkSnapshotTestCase(APITestCase):
+    def setUp(self):
+        reset_snapshot()
+        self.addCleanup(reset_snapshot)
+        self.segments = []
+        for i, (length, speed) in enumerate(
+            [("1000.00", "15.00"), ("3000.00", "35.00"), ("5000.00", "65.00")]
+        ):
+            segment = RoadSegment.objects.create(
+                start_longitude=Decimal("104.0") + i,
+                start_latitude=Decimal("30.7"),
+                end_longitude=Decimal("104.1") + i,
+                end_latitude=Decimal("30.8"),
+                length=Decimal(length),
+            )
+            SpeedReading.objects.create(
+                road_segment=segment,
+                average_speed=Decimal(speed),
+                timestamp=timezone.now() - timedelta(hours=1),
+            )
+            self.segments.append(segment)
+        self.segments.append(
+            RoadSegment.objects.create(
+                start_longitude=Decimal("110.0"),
+                start_latitude=Decimal("30.7"),
+                end_longitude=Decimal("110.1"),
+                end_latitude=Decimal("30.8"),
+                length=Decimal("1000.00"),
+            )
+        )
+
+    def test_length_weighted_breakdown(self):
+        response = self.client.get("/api/network-snapshot/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["total_length"], 10000.0)
+        self.assertEqual(response.data["segments_with_readings"], 3)
+        intensity = response.data["intensity"]
+        self.assertEqual(intensity["elevada"]["percentage"], 10.0)
+        self.assertEqual(intensity["média"]["percentage"], 30.0)
+        self.assertEqual(intensity["baixa"]["percentage"], 50.0)
+        self.assertEqual(intensity["sem_dados"]["percentage"], 10.0)
+
+    def test_weighted_percentiles(self):
+        response = self.client.get("/api/network-snapshot/?percentiles=50")
+        # Half the covered length is on the 65 km/h segment
+        self.assertEqual(response.data["speed_percentiles"]["p50"], 50.0)
+
+    def test_incremental_refresh(self):
+        self.client.get("/api/network-snapshot/")
+        SpeedReading.objects.create(
+            road_segment=self.segments[2],
+            average_speed=Decimal("10.00"),
+            timestamp=timezone.now(),
+        )
+        self.segments[3].delete()
+
+        response = self.client.get("/api/network-snapshot/")
+        intensity = response.data["intensity"]
+        self.assertEqual(response.data["total_length"], 9000.0)
+        self.assertAlmostEqual(intensity["elevada"]["percentage"], 66.67)
+        self.assertEqual(intensity["sem_dados"]["length"], 0.0)
+
+    @override_settings(MONITORING_CHANGE_FEED_SETTLE_SECONDS=60)
+    def test_unsettled_changes_applied_once_settled(self):
+        self.client.get("/api/network-snapshot/")
+        SpeedReading.objects.create(
+            road_segment=self.segments[3],
+            average_speed=Decimal("10.00"),
+            timestamp=timezone.now(),
+        )
+        response = self.client.get("/api/network-snapshot/")
+        self.assertEqual(response.data["segments_with_readings"], 3)
+
+        # Settled, as a transaction committed late would be by the next refresh
+        ChangeLogEntry.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.client.get("/api/network-snapshot/")
+        self.assertEqual(response.data["segments_with_readings"], 4)
+
+    def test_only_default_percentiles_memoized(self):
+        snapshot = get_snapshot(self.segments[0].region_id)
+        for p in range(1, 50):
+            snapshot.summary((p,))
+        self.assertIs(snapshot.summary(), snapshot.summary())
+        self.assertIsNot(snapshot.summary((50,)), snapshot.summary((50,)))
+
+    def test_invalid_percentiles(self):
+        response = self.client.get("/api/network-snapshot/?percentiles=abc")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(
+    MONITORING_ROUTING_REFRESH_SECONDS=0, MONITORING_CHANGE_FEED_SETTLE_SECONDS=0
+)
+class RouteViewSetTestCase(APITestCase):
+    def setUp(self):
+        reset_graph()
+        self.addCleanup(reset_graph)
+
+        # A -> B -> C, plus a direct but slow A -> C
+        a = (Decimal("104.0000000"), Decimal("30.0000000"))
+        b = (Decimal("104.0100000"), Decimal("30.0000000"))
+        c = (Decimal("104.0200000"), Decimal("30.0000000"))
+        self.a_b = self.create_segment(a, b, "1000.00", "60.00")
+        self.b_c = self.create_segment(b, c, "1000.00", "60.00")
+        self.a_c = self.create_segment(a, c, "1500.00", "10.00")
+
+    def create_segment(self, start, end, length, speed):
+        segment = RoadSegment.objects.create(
+            start_longitude=start[0],
+            start_latitude=start[1],
+            end_longitude=end[0],
+            end_latitude=end[1],
+            length=Decimal(length),
+        )
+        SpeedReading.objects.create(
+            road_segment=segment,
+            average_speed=Decimal(speed),
+            timestamp=timezone.now() - timedelta(hours=1),
+        )
+        return segment
+
+    def get_route(self, start, end):
+        return self.client.get(
+            "/api/routes/",
+            {
+                "start_longitude": start[0],
+                "start_latitude": start[1],
+                "end_longitude": end[0],
+                "end_latitude": end[1],
+            },
+        )
+
+    def test_fastest_route(self):
+        response = self.get_route((104.0, 30.0), (104.02, 30.0))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["segments"], [self.a_b.id, self.b_c.id])
+        self.assertEqual(response.data["total_length"], 2000.0)
+        self.assertEqual(response.data["travel_time"], 120.0)
+
+    def test_route_follows_speed_changes(self):
+        self.get_route((104.0, 30.0), (104.02, 30.0))
+        SpeedReading.objects.create(
+            road_segment=self.a_c,
+            average_speed=Decimal("90.00"),
+            timestamp=timezone.now(),
+        )
+
+        response = self.get_route((104.0, 30.0), (104.02, 30.0))
+        self.assertEqual(response.data["segments"], [self.a_c.id])
+        self.assertEqual(response.data["travel_time"], 60.0)
+
+    @override_settings(MONITORING_CHANGE_FEED_SETTLE_SECONDS=60)
+    def test_unsettled_speed_changes_applied_once_settled(self):
+        self.get_route((104.0, 30.0), (104.02, 30.0))
+        SpeedReading.objects.create(
+            road_segment=self.a_c,
+            average_speed=Decimal("90.00"),
+            timestamp=timezone.now(),
+        )
+        response = self.get_route((104.0, 30.0), (104.02, 30.0))
+        self.assertEqual(response.data["segments"], [self.a_b.id, self.b_c.id])
+
+        ChangeLogEntry.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        response = self.get_route((104.0, 30.0), (104.02, 30.0))
+        self.assertEqual(response.data["segments"], [self.a_c.id])
+
+    def test_points_snap_to_nearest_node(self):
+        response = self.get_route((104.0001, 30.0001), (104.0099, 29.9999))
+        self.assertEqual(response.data["segments"], [self.a_b.id])
+        self.assertGreater(response.data["start"]["distance"], 0)
+
+    def test_no_route(self):
+        response = self.get_route((104.02, 30.0), (104.0, 30.0))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_point(self):
+        response = self.get_route((104.0, 95.0), (104.02, 30.0))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AdminTestCase(APITestCase):
+    def setUp(self):
+        self.superuser = User.objects.create_superuser(
+            username="superuser",
+            password="testpass123",
+        )
+        self.client.force_login(self.superuser)
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        self.speed_reading = SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("18.50"),
+            timestamp=timezone.now(),
+        )
+
+    def test_speed_reading_changelist(self):
+        response = self.client.get("/admin/monitoring/speedreading/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "elevada")
+        self.assertContains(response, 'name="road_segment"')
+
+    def test_speed_reading_changelist_filtered_by_segment(self):
+        response = self.client.get(
+            f"/admin/monitoring/speedreading/?road_segment={self.road_segment.id + 1}"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.context["cl"].result_count, 0)
+
+    def test_speed_reading_change_form(self):
+        response = self.client.get(
+            f"/admin/monitoring/speedreading/{self.speed_reading.id}/change/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "elevada")
+
+    def test_traffic_intensity_annotation_matches_property(self):
+        for speed in ["20.00", "20.01", "50.00", "50.01"]:
+            SpeedReading.objects.create(
+                road_segment=self.road_segment,
+                average_speed=Decimal(speed),
+                timestamp=timezone.now(),
+            )
+        for reading in SpeedReading.objects.with_traffic_intensity():
+            self.assertEqual(reading.intensity, reading.traffic_intensity)
+
+    def test_road_segment_changelist(self):
+        response = self.client.get("/admin/monitoring/roadsegment/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_road_segment_duplicate_coordinates_rejected(self):
+        data = {
+            "region": self.road_segment.region_id,
+            "start_longitude": "103.9460064",
+            "start_latitude": "30.7506605",
+            "end_longitude": "103.9564943",
+            "end_latitude": "30.7450801",
+            "length": "1179.21",
+        }
+        response = self.client.post("/admin/monitoring/roadsegment/add/", data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "already has these coordinates")
+        self.assertEqual(RoadSegment.objects.count(), 1)
+
+        # A duplicate left without a key by the migration can't be saved unmerged
+        duplicate = RoadSegment.objects.create(
+            start_longitude=Decimal("1"),
+            start_latitude=Decimal("1"),
+            end_longitude=Decimal("2"),
+            end_latitude=Decimal("2"),
+            length=Decimal("10"),
+        )
+        RoadSegment.objects.filter(pk=duplicate.pk).update(
+            coordinate_key=None,
+            start_longitude=self.road_segment.start_longitude,
+            start_latitude=self.road_segment.start_latitude,
+            end_longitude=self.road_segment.end_longitude,
+            end_latitude=self.road_segment.end_latitude,
+        )
+        response = self.client.post(
+            f"/admin/monitoring/roadsegment/{duplicate.pk}/change/", data
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertContains(response, "already has these coordinates")
+
+        data["start_longitude"] = "103.9470064"
+        response = self.client.post(
+            f"/admin/monitoring/roadsegment/{duplicate.pk}/change/", data
+        )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+    def test_road_segment_region_read_only_when_editing(self):
+        other = Region.objects.create(slug="porto", name="Porto")
+        data = {
+            "region": other.pk,
+            "start_longitude": "103.9460064",
+            "start_latitude": "30.7506605",
+            "end_longitude": "103.9564943",
+            "end_latitude": "30.7450801",
+            "length": "1179.21",
+        }
+        response = self.client.post(
+            f"/admin/monitoring/roadsegment/{self.road_segment.pk}/change/", data
+        )
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+        self.road_segment.refresh_from_db()
+        self.assertNotEqual(self.road_segment.region_id, other.pk)
+
+        # Still chosen when adding
+        data["start_longitude"] = "103.9470064"
+        self.client.post("/admin/monitoring/roadsegment/add/", data)
+        self.assertEqual(RoadSegment.objects.filter(region=other).count(), 1)
+
+
+@override_settings(MONITORING_READ_REPLICAS=["replica"])
+class ReadReplicaRoutingTestCase(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.read_db = None
+
+        def get_response(request):
+            self.read_db = router.db_for_read(SpeedReading)
+            return HttpResponse()
+
+        self.middleware = ReadReplicaMiddleware(get_response)
+
+    def test_safe_api_request_reads_from_replica(self):
+        self.middleware(self.factory.get("/api/speed-readings/"))
+        self.assertEqual(self.read_db, "replica")
+
+    def test_reads_outside_requests_use_primary(self):
+        self.middleware(self.factory.get("/api/speed-readings/"))
+        self.assertEqual(router.db_for_read(SpeedReading), "default")
+
+    def test_non_api_request_reads_from_primary(self):
+        self.middleware(self.factory.get("/admin/"))
+        self.assertEqual(self.read_db, "default")
+
+    def test_sessions_and_users_read_from_primary(self):
+        def get_response(request):
+            self.read_db = router.db_for_read(User)
+            return HttpResponse()
+
+        ReadReplicaMiddleware(get_response)(self.factory.get("/api/speed-readings/"))
+        self.assertEqual(self.read_db, "default")
+
+    def test_write_pins_client_to_primary(self):
+        response = self.middleware(self.factory.post("/api/speed-readings/"))
+        self.assertEqual(self.read_db, "default")
+        self.assertEqual(router.db_for_write(SpeedReading), "default")
+
+        cookie = response.cookies[ReadReplicaMiddleware.pin_cookie_name]
+        request = self.factory.get("/api/speed-readings/")
+        request.COOKIES[cookie.key] = cookie.value
+        self.middleware(request)
+        self.assertEqual(self.read_db, "default")
+
+    @override_settings(MONITORING_READ_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        response = self.middleware(self.factory.post("/api/speed-readings/"))
+        self.assertNotIn(ReadReplicaMiddleware.pin_cookie_name, response.cookies)
+        self.middleware(self.factory.get("/api/speed-readings/"))
+        self.assertEqual(self.read_db, "default")
+
+    def test_test_replica_not_configured_outside_tests(self):
+        env = {k: v for k, v in os.environ.items() if k != "DB_REPLICA_HOSTS"}
+        script = "from traffic_api import settings; print(sorted(settings.DATABASES))"
+        result = subprocess.run(
+            [sys.executable, "-c", script],
+            env=env,
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            text=True,
+        )
+        self.assertEqual(result.stdout.strip(), "['default']", result.stderr)
+
+
+@override_settings(MONITORING_READ_REPLICAS=["replica"])
+class ReadReplicaDatabaseTestCase(APITransactionTestCase):
+    # "replica" is a test mirror of the primary. Transactions are committed, so the
+    # replica's connection sees them; the default region is restored afterwards
+    databases = {"default", "replica"}
+    serialized_rollback = True
+
+    def setUp(self):
+        self.client.force_authenticate(
+            User.objects.create_superuser(username="admin", password="testpass123")
+        )
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.7506605"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+
+    def test_reads_from_replica_until_client_writes(self):
+        with CaptureQueriesContext(
+            connections["replica"]
+        ) as replica, CaptureQueriesContext(connections["default"]) as primary:
+            response = self.client.get("/api/road-segments/")
+        self.assertEqual([s["id"] for s in response.data], [self.road_segment.id])
+        self.assertTrue(
+            any("monitoring_roadsegment" in q["sql"] for q in replica.captured_queries)
+        )
+        self.assertFalse(
+            any("monitoring_" in q["sql"] for q in primary.captured_queries)
+        )
+
+        response = self.client.post(
+            "/api/speed-readings/",
+            {
+                "road_segment": self.road_segment.id,
+                "average_speed": "50.00",
+                "timestamp": timezone.now().isoformat(),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Pinned to the primary, so it reads its own write
+        with CaptureQueriesContext(connections["replica"]) as replica:
+            response = self.client.get("/api/speed-readings/")
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(replica.captured_queries, [])
+
+
+class BenchDbConnectionsTestCase(TransactionTestCase):
+    # The benchmark's threads read through their own connections, which only see
+    # committed data; the default region is restored afterwards
+    serialized_rollback = True
+
+    def setUp(self):
+        reset_store()
+        self.addCleanup(reset_store)
+        RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.7506605"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+
+    @override_settings(
+        ALLOWED_HOSTS=["localhost"],
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"road-segments": "2/min"},
+        },
+    )
+    def test_benchmark_is_not_throttled(self):
+        out = StringIO()
+        call_command("bench_db_connections", requests=5, concurrency=2, stdout=out)
+        self.assertEqual(out.getvalue().count("throughput"), 2)
+
+
+class CompactSpeedReadingTestCase(TransactionTestCase):
+    # The compact layout's table is created and dropped outside a transaction
+    serialized_rollback = True
+
+    def setUp(self):
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+
+    def test_speed_stored_as_centi_kmh(self):
+        with compact_reading_table():
+            reading = CompactSpeedReading(
+                road_segment=self.road_segment.id, timestamp=timezone.now()
+            )
+            reading.average_speed = Decimal("31.77")
+            reading.save(force_insert=True)
+            reading = CompactSpeedReading.objects.get()
+        self.assertEqual(reading.speed_centi, 3177)
+        self.assertEqual(reading.average_speed, Decimal("31.77"))
+        self.assertEqual(reading.traffic_intensity, "média")
+
+        table = CompactSpeedReading._meta.db_table
+        self.assertNotIn(table, connections["default"].introspection.table_names())
+
+    def test_bench_renderers_compact(self):
+        SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("31.77"),
+            timestamp=timezone.now(),
+        )
+        out = StringIO()
+        call_command("bench_renderers", compact=True, repeat=1, stdout=out)
+        self.assertIn("1 readings", out.getvalue())
+
+
+class ReadingArchiveTestCase(APITestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        override = override_settings(MONITORING_ARCHIVE_DIR=archive_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        self.now = timezone.now().replace(microsecond=0)
+        for days, speed in [(100, "15.00"), (70, "35.00"), (40, "65.00"), (1, "45.00")]:
+            SpeedReading.objects.create(
+                road_segment=self.road_segment,
+                average_speed=Decimal(speed),
+                timestamp=self.now - timedelta(days=days),
+            )
+
+    def test_archive_file_round_trip(self):
+        base = datetime(2024, 1, 10, tzinfo=UTC)
+        epoch_ms = [to_epoch_ms(base + timedelta(hours=h)) for h in (1, 3, 5)]
+        append_month(7, 2024, 1, epoch_ms, [1000, 2550, 8000])
+        # Merging a second batch: new values win for the same timestamp
+        append_month(7, 2024, 1, epoch_ms[1:2], [3000])
+
+        archived_ms, speeds = read_range(
+            7, base + timedelta(hours=2), base + timedelta(days=40)
+        )
+        self.assertEqual(archived_ms.tolist(), epoch_ms[1:])
+        self.assertEqual(speeds.tolist(), [3000, 8000])
+
+    @override_settings(MONITORING_HISTORY_MAX_DAYS=366)
+    def test_archive_moves_old_readings(self):
+        call_command("archive_readings", older_than=30, stdout=StringIO())
+        self.assertEqual(SpeedReading.objects.count(), 1)
+
+        url = f"/api/road-segments/{self.road_segment.id}/history/"
+        response = self.client.get(
+            url, {"start": (self.now - timedelta(days=365)).isoformat()}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        readings = response.data["readings"]
+        self.assertEqual(
+            [r["average_speed"] for r in readings], ["15.00", "35.00", "65.00", "45.00"]
+        )
+        self.assertEqual([r["archived"] for r in readings], [True, True, True, False])
+        self.assertEqual(readings[0]["traffic_intensity"], "elevada")
+
+    def test_default_start_before_earliest_datetime(self):
+        for action in ["history", "aggregate"]:
+            url = f"/api/road-segments/{self.road_segment.id}/{action}/"
+            response = self.client.get(url, {"end": "0001-01-03T00:00:00Z"})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_aggregate_includes_archived_readings(self):
+        call_command("archive_readings", older_than=30, stdout=StringIO())
+
+        url = f"/api/road-segments/{self.road_segment.id}/aggregate/"
+        response = self.client.get(
+            url,
+            {
+                "start": (self.now - timedelta(days=80)).isoformat(),
+                "end": self.now.isoformat(),
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["count"], 3)
+        self.assertEqual(response.data["archived_count"], 2)
+        self.assertEqual(response.data["average_speed"], "48.33")
+        self.assertEqual(
+            response.data["traffic_intensity"],
+            {"elevada": 0, "média": 2, "baixa": 1},
+        )
+
+    def test_archive_records_archive_changes(self):
+        archived_ids = set(
+            SpeedReading.objects.filter(
+                timestamp__lt=self.now - timedelta(days=30)
+            ).values_list("id", flat=True)
+        )
+        call_command("archive_readings", older_than=30, stdout=StringIO())
+        entries = ChangeLogEntry.objects.filter(
+            entity=ChangeLogEntry.ENTITY_SPEED_READING
+        ).exclude(action=ChangeLogEntry.ACTION_UPSERT)
+        self.assertEqual(
+            set(entries.values_list("action", "object_id")),
+            {(ChangeLogEntry.ACTION_ARCHIVE, i) for i in archived_ids},
+        )
+
+    def test_history_defaults_to_last_week(self):
+        url = f"/api/road-segments/{self.road_segment.id}/history/"
+        response = self.client.get(url)
+        self.assertEqual(len(response.data["readings"]), 1)
+
+    @override_settings(MONITORING_HISTORY_MAX_DAYS=31)
+    def test_history_range_is_capped(self):
+        url = f"/api/road-segments/{self.road_segment.id}/history/"
+        start = (self.now - timedelta(days=32)).isoformat()
+        response = self.client.get(url, {"start": start})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Aggregates are a fixed size, so they aren't capped
+        url = f"/api/road-segments/{self.road_segment.id}/aggregate/"
+        response = self.client.get(url, {"start": start})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_invalid_range(self):
+        url = f"/api/road-segments/{self.road_segment.id}/aggregate/"
+        response = self.client.get(
+            url,
+            {"start": self.now.isoformat(), "end": self.now.isoformat()},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+IMPORT_CSV = (
+    "Long_start,Lat_start,Long_end,Lat_end,Length,Speed\n"
+    "103.9460064,30.75066046,103.9564943,30.7450801,1179.21,21.5\n"
+    "103.9460064,30.75066046,103.9564943,30.7450801,1179.21,55.0\n"
+    "104.0,30.7,104.1,30.8,500.00,not-a-speed\n"
+)
+
+
+@override_settings(MONITORING_JOB_PROGRESS_SECONDS=0, MONITORING_ANOMALY_MIN_SAMPLES=2)
+class JobQueueTestCase(APITestCase):
+    def setUp(self):
+        upload_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(upload_dir.cleanup)
+        quarantine_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(quarantine_dir.cleanup)
+        override = override_settings(
+            MONITORING_JOB_UPLOAD_DIR=upload_dir.name,
+            MONITORING_QUARANTINE_DIR=quarantine_dir.name,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.upload_dir = upload_dir.name
+
+        self.admin_user = User.objects.create_user(
+            username="admin", password="testpass123", is_staff=True
+        )
+        self.client.force_authenticate(user=self.admin_user)
+
+    def enqueue_import(self):
+        upload = SimpleUploadedFile("traffic.csv", IMPORT_CSV.encode())
+        return self.client.post(
+            "/api/jobs/",
+            {
+                "kind": Job.KIND_IMPORT,
+                "params": '{"start_date": "2024-01-01"}',
+                "file": upload,
+            },
+            format="multipart",
+        )
+
+    def test_import_job(self):
+        response = self.enqueue_import()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["status"], Job.STATUS_QUEUED)
+        self.assertEqual(response.data["params"]["start_date"], "2024-01-01")
+        self.assertEqual(response.data["params"]["hours_apart"], 1)
+
+        self.assertEqual(run_worker(burst=True), 1)
+
+        response = self.client.get(f"/api/jobs/{response.data['id']}/")
+        self.assertEqual(response.data["status"], Job.STATUS_SUCCEEDED)
+        self.assertEqual(response.data["progress_done"], 3)
+        self.assertEqual(response.data["progress_total"], 3)
+        self.assertIsNotNone(response.data["items_per_second"])
+        self.assertEqual(response.data["result"]["readings_created"], 2)
+        self.assertEqual(response.data["result"]["errors"], 1)
+        self.assertEqual(
+            response.data["result"]["rejections"],
+            {"average_speed: A valid number is required.": 1},
+        )
+        self.assertTrue(os.path.exists(response.data["result"]["quarantine_file"]))
+        self.assertEqual(SpeedReading.objects.count(), 2)
+        # The upload is removed once imported
+        self.assertEqual(os.listdir(self.upload_dir), [])
+
+    def test_jobs_are_admin_only(self):
+        self.client.force_authenticate(user=None)
+        response = self.client.get("/api/jobs/")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_invalid_params(self):
+        response = self.client.post(
+            "/api/jobs/", {"kind": Job.KIND_ARCHIVE, "params": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("older_than", response.data["params"])
+
+        response = self.client.post(
+            "/api/jobs/", {"kind": Job.KIND_IMPORT, "params": {}}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("file", response.data)
+
+    def test_cancel_queued_job(self):
+        job_id = self.enqueue_import().data["id"]
+
+        response = self.client.post(f"/api/jobs/{job_id}/cancel/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], Job.STATUS_CANCELLED)
+        self.assertEqual(run_worker(burst=True), 0)
+
+        response = self.client.post(f"/api/jobs/{job_id}/cancel/")
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+    def test_cancel_running_job(self):
+        segment = RoadSegment.objects.create(
+            start_longitude=Decimal("0"),
+            start_latitude=Decimal("0"),
+            end_longitude=Decimal("0.01"),
+            end_latitude=Decimal("0"),
+            length=Decimal("1000.00"),
+        )
+        for days in range(10):
+            SpeedReading.objects.create(
+                road_segment=segment,
+                average_speed=Decimal("40.00"),
+                timestamp=timezone.now() - timedelta(days=days + 1),
+            )
+        job = Job.objects.create(
+            kind=Job.KIND_ARCHIVE, params={"older_than": 0, "batch_size": 2}
+        )
+
+        claimed = claim_job("test-worker")
+        response = self.client.post(f"/api/jobs/{job.id}/cancel/")
+        self.assertEqual(response.data["status"], Job.STATUS_RUNNING)
+        self.assertTrue(response.data["cancel_requested"])
+
+        with tempfile.TemporaryDirectory() as archive_dir:
+            with override_settings(MONITORING_ARCHIVE_DIR=archive_dir):
+                job = run_job(claimed)
+        self.assertEqual(job.status, Job.STATUS_CANCELLED)
+        # Stopped after the first batch
+        self.assertEqual(job.progress_done, 2)
+        self.assertEqual(SpeedReading.objects.count(), 8)
+
+    def test_claim_is_exclusive(self):
+        job = Job.objects.create(kind=Job.KIND_ARCHIVE, params={"older_than": 30})
+        self.assertEqual(claim_job("worker-1").id, job.id)
+        self.assertIsNone(claim_job("worker-2"))
+
+        # A worker that stops sending heartbeats loses its job
+        Job.objects.filter(id=job.id).update(
+            heartbeat_at=timezone.now() - timedelta(hours=1)
+        )
+        reclaimed = claim_job("worker-2")
+        self.assertEqual(reclaimed.id, job.id)
+        self.assertEqual(reclaimed.worker, "worker-2")
+
+    def test_recompute_anomalies_job(self):
+        reset_detector()
+        self.addCleanup(reset_detector)
+        segment = RoadSegment.objects.create(
+            start_longitude=Decimal("0"),
+            start_latitude=Decimal("0"),
+            end_longitude=Decimal("0.01"),
+            end_latitude=Decimal("0"),
+            length=Decimal("1000.00"),
+        )
+        for weeks, speed in [(4, "50.00"), (3, "51.00"), (2, "49.00"), (1, "8.00")]:
+            SpeedReading.objects.create(
+                road_segment=segment,
+                average_speed=Decimal(speed),
+                timestamp=timezone.now() - timedelta(weeks=weeks),
+            )
+        self.assertEqual(SpeedAnomaly.objects.count(), 1)
+
+        # A threshold no reading exceeds clears the anomaly
+        response = self.client.post(
+            "/api/jobs/",
+            {"kind": Job.KIND_RECOMPUTE_ANOMALIES, "params": {"threshold": 1000}},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        run_worker(burst=True)
+
+        job = Job.objects.get(id=response.data["id"])
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result, {"readings_replayed": 4, "anomalies": 0})
+        self.assertEqual(SpeedAnomaly.objects.count(), 0)
+
+        stats = self.client.get("/api/jobs/stats/").data
+        self.assertEqual(
+            stats[Job.KIND_RECOMPUTE_ANOMALIES]["jobs"], {Job.STATUS_SUCCEEDED: 1}
+        )
+        self.assertEqual(stats[Job.KIND_RECOMPUTE_ANOMALIES]["items"], 4)
+
+
+class ReadingUpsertTestCase(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_user(
+            username="admin", password="testpass123", is_staff=True
+        )
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.7506605"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        self.timestamp = timezone.now().replace(microsecond=0) - timedelta(days=1)
+
+    def import_file(self, speeds, *args):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("Long_start,Lat_start,Long_end,Lat_end,Length,Speed\n")
+            for speed in speeds:
+                # More decimal places than stored, as in the real data
+                f.write(
+                    f"103.9460064,30.75066046,103.9564943,30.7450801,1179.2,{speed}\n"
+                )
+        self.addCleanup(os.remove, f.name)
+        out = StringIO()
+        call_command(
+            "import_traffic_data",
+            f.name,
+            *args,
+            quarantine=f"{f.name}.rejected",
+            stdout=out,
+        )
+        if os.path.exists(f"{f.name}.rejected"):
+            os.remove(f"{f.name}.rejected")
+        return out.getvalue()
+
+    def test_reimport_keeps_speeds_without_upsert(self):
+        self.import_file(["31.769", "49.45"])
+        output = self.import_file(["35.00", "49.45"])
+        self.assertIn("Readings created: 0", output)
+        self.assertIn("Readings unchanged: 2", output)
+        self.assertIn("Segments created: 0", output)
+        self.assertEqual(
+            sorted(SpeedReading.objects.values_list("average_speed", flat=True)),
+            [Decimal("31.77"), Decimal("49.45")],
+        )
+
+    def test_insert_keeps_concurrently_inserted_readings(self):
+        # Inserted by another writer after upsert_readings looked the batch up
+        concurrent = SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("20.00"),
+            timestamp=self.timestamp,
+        )
+        new = SpeedReading(
+            road_segment=self.road_segment,
+            average_speed=Decimal("40.00"),
+            timestamp=self.timestamp + timedelta(hours=1),
+        )
+        written = _insert_new(
+            [
+                SpeedReading(
+                    road_segment=self.road_segment,
+                    average_speed=Decimal("60.00"),
+                    timestamp=self.timestamp,
+                ),
+                new,
+            ]
+        )
+        self.assertEqual(written, [new])
+        self.assertIsNotNone(new.pk)
+        concurrent.refresh_from_db()
+        self.assertEqual(concurrent.average_speed, Decimal("20.00"))
+
+    @override_settings(
+        MONITORING_ANOMALY_MIN_SAMPLES=1, MONITORING_PROFILE_SETTLE_SECONDS=0
+    )
+    def test_anomalies_detected_after_commit(self):
+        reset_detector()
+        self.addCleanup(reset_detector)
+        readings = [
+            (self.road_segment.id, self.timestamp - timedelta(weeks=weeks), speed)
+            for weeks, speed in [(2, Decimal("50.00")), (1, Decimal("51.00"))]
+        ]
+        upsert_readings(readings)
+        fit_speed_profiles()
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                upsert_readings([(self.road_segment.id, self.timestamp, Decimal("5"))])
+                # Not flagged until the transaction commits
+                self.assertFalse(SpeedAnomaly.objects.exists())
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(SpeedAnomaly.objects.count(), 1)
+
+    def test_reimport_with_upsert_updates_changed_speeds(self):
+        self.import_file(["31.769", "49.45", "bad"])
+        last_seq = ChangeLogEntry.objects.order_by("-id").first().id
+
+        output = self.import_file(["35.00", "49.45", "20.00"], "--upsert")
+        self.assertIn("Readings created: 1", output)
+        self.assertIn("Readings updated: 1", output)
+        self.assertIn("Readings unchanged: 1", output)
+        self.assertEqual(SpeedReading.objects.count(), 3)
+        self.assertEqual(
+            ChangeLogEntry.objects.filter(
+                id__gt=last_seq, entity=ChangeLogEntry.ENTITY_SPEED_READING
+            ).count(),
+            2,
+        )
+
+    def test_batch_upsert(self):
+        existing = SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("40.00"),
+            timestamp=self.timestamp,
+        )
+        unchanged = SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("42.00"),
+            timestamp=self.timestamp - timedelta(hours=1),
+        )
+        readings = [
+            {
+                "road_segment": self.road_segment.id,
+                "average_speed": "12.50",
+                "timestamp": self.timestamp.isoformat(),
+            },
+            {
+                "road_segment": self.road_segment.id,
+                "average_speed": "42.00",
+                "timestamp": unchanged.timestamp.isoformat(),
+            },
+            {
+                "road_segment": self.road_segment.id,
+                "average_speed": "60.00",
+                "timestamp": (self.timestamp + timedelta(hours=1)).isoformat(),
+            },
+        ]
+
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            "/api/speed-readings/batch/", {"readings": readings}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"inserted": 1, "updated": 1, "unchanged": 1})
+        existing.refresh_from_db()
+        self.assertEqual(existing.average_speed, Decimal("12.50"))
+        self.assertEqual(SpeedReading.objects.count(), 3)
+
+        response = self.client.post(
+            "/api/speed-readings/batch/",
+            {"readings": readings[:1], "upsert": False},
+            format="json",
+        )
+        self.assertEqual(response.data, {"inserted": 0, "updated": 0, "unchanged": 1})
+
+    def test_batch_rejects_unknown_segments(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            "/api/speed-readings/batch/",
+            {
+                "readings": [
+                    {
+                        "road_segment": 999,
+                        "average_speed": "12.50",
+                        "timestamp": self.timestamp.isoformat(),
+                    }
+                ]
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(SpeedReading.objects.count(), 0)
+
+    def test_batch_requires_admin(self):
+        response = self.client.post(
+            "/api/speed-readings/batch/", {"readings": []}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_duplicate_reading_is_rejected(self):
+        SpeedReading.objects.create(
+            road_segment=self.road_segment,
+            average_speed=Decimal("40.00"),
+            timestamp=self.timestamp,
+        )
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            "/api/speed-readings/",
+            {
+                "road_segment": self.road_segment.id,
+                "average_speed": "41.00",
+                "timestamp": self.timestamp.isoformat(),
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class SingleFlightTestCase(SimpleTestCase):
+    def test_concurrent_calls_share_one_execution(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls = []
+
+        def query():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return ["segment"]
+
+        results = []
+
+        def request():
+            results.append(flight.do("key", query))
+
+        threads = [threading.Thread(target=request) for _ in range(5)]
+        threads[0].start()
+        started.wait()
+        for thread in threads[1:]:
+            thread.start()
+        # Let the followers reach the wait before the leader finishes
+        time.sleep(0.1)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([result for result, _ in results], [["segment"]] * 5)
+        self.assertEqual(sorted(shared for _, shared in results), [False] + [True] * 4)
+
+        # Nothing is cached once the call is done
+        flight.do("key", query)
+        self.assertEqual(len(calls), 2)
+
+    def test_errors_are_shared(self):
+        flight = SingleFlight()
+
+        def query():
+            raise ValueError("boom")
+
+        with self.assertRaises(ValueError):
+            flight.do("key", query)
+        self.assertEqual(flight._calls, {})
+
+
+class TokenBucketTestCase(APITestCase):
+    def setUp(self):
+        reset_store()
+        self.addCleanup(reset_store)
+
+    def test_bucket_refills_over_time(self):
+        store = TokenBucketStore()
+        self.assertEqual(
+            [store.take("client", 2, 1.0, now=0) for _ in range(3)], [0, 0, 1.0]
+        )
+        self.assertEqual(store.take("client", 2, 1.0, now=0.5), 0.5)
+        self.assertEqual(store.take("client", 2, 1.0, now=1.0), 0)
+        self.assertEqual(store.take("other", 2, 1.0, now=1.0), 0)
+
+    def test_least_recently_used_clients_are_dropped(self):
+        store = TokenBucketStore(max_keys=2)
+        for key in ["a", "b", "c"]:
+            store.take(key, 1, 1.0, now=0)
+        self.assertEqual(list(store._buckets), ["b", "c"])
+
+    @override_settings(
+        REST_FRAMEWORK={
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"network-snapshot": "2/min"},
+        }
+    )
+    def test_endpoint_is_throttled_per_client(self):
+        for _ in range(2):
+            response = self.client.get("/api/network-snapshot/")
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get("/api/network-snapshot/")
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response["Retry-After"], "30")
+
+        # Other clients and unlisted scopes have their own limits
+        user = User.objects.create_user(username="user", password="testpass123")
+        self.client.force_authenticate(user=user)
+        response = self.client.get("/api/network-snapshot/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.force_authenticate(user=None)
+        response = self.client.get("/api/road-segments/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class ServingConfigurationTestCase(SimpleTestCase):
+    def test_static_schema_is_served_from_file(self):
+        schema_file = tempfile.NamedTemporaryFile(suffix=".yml")
+        self.addCleanup(schema_file.close)
+        schema_file.write(b"openapi: 3.0.3\n")
+        schema_file.flush()
+
+        with override_settings(MONITORING_SCHEMA_FILE=schema_file.name):
+            response = static_schema(RequestFactory().get("/api/schema/"))
+            content = b"".join(response.streaming_content)
+            response.close()
+        self.assertEqual(response["Content-Type"], "application/vnd.oai.openapi")
+        self.assertEqual(content, b"openapi: 3.0.3\n")
+
+    def test_measure_startup_reports_both_configurations(self):
+        out = StringIO()
+        call_command("measure_startup", repeat=1, top=3, stdout=out)
+        output = out.getvalue()
+        self.assertIn("full (as configured)", output)
+        self.assertIn("api-only (MONITORING_ENABLE_ADMIN=0", output)
+        self.assertEqual(output.count("peak RSS"), 2)
+
+    def test_schema_generates_without_errors(self):
+        # Errors (e.g. a view whose serializer can't be guessed) fail the command
+        call_command("spectacular", validate=True, fail_on_warn=True, stdout=StringIO())
+
+    def test_api_only_workers_skip_drf_spectacular(self):
+        env = MeasureStartupCommand().environment(CONFIGURATIONS["api-only"])
+        script = (
+            "import sys, django; django.setup()\n"
+            "from django.urls import get_resolver; get_resolver().url_patterns\n"
+            "print(any(m.startswith('drf_spectacular') for m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", script], env=env, capture_output=True, text=True
+        )
+        self.assertEqual(result.stdout.strip(), "False", result.stderr)
+
+
+class ResponseFormatTestCase(APITestCase):
+    def setUp(self):
+        road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        start = datetime(2024, 1, 1, tzinfo=UTC)
+        SpeedReading.objects.bulk_create(
+            SpeedReading(
+                road_segment=road_segment,
+                average_speed=Decimal("40.00") + i,
+                timestamp=start + timedelta(hours=i),
+            )
+            for i in range(20)
+        )
+        self.json = json.loads(self.client.get("/api/speed-readings/").content)
+
+    def test_msgpack(self):
+        response = self.client.get(
+            "/api/speed-readings/", HTTP_ACCEPT="application/msgpack"
+        )
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), self.json)
+
+        response = self.client.get("/api/speed-readings/?format=msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), self.json)
+
+    def test_columnar_json(self):
+        response = self.client.get(
+            "/api/speed-readings/", HTTP_ACCEPT="application/vnd.columnar+json"
+        )
+        columns = json.loads(response.content)
+        self.assertEqual(list(columns), list(self.json[0]))
+        self.assertEqual(
+            columns["average_speed"], [row["average_speed"] for row in self.json]
+        )
+
+        # Single objects render as plain JSON
+        reading_id = self.json[0]["id"]
+        response = self.client.get(f"/api/speed-readings/{reading_id}/?format=columnar")
+        self.assertEqual(json.loads(response.content), self.json[0])
+
+    def test_compression(self):
+        response = self.client.get("/api/speed-readings/", HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), self.json)
+
+        response = self.client.get(
+            "/api/speed-readings/", HTTP_ACCEPT_ENCODING="gzip, deflate, br"
+        )
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(response["Vary"], "Accept, Cookie, Accept-Encoding")
+        self.assertEqual(json.loads(brotli.decompress(response.content)), self.json)
+
+        # HTML pages carry the CSRF token, so they get gzip's BREACH mitigation
+        response = self.client.get(
+            "/api/speed-readings/", HTTP_ACCEPT="text/html", HTTP_ACCEPT_ENCODING="br"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+        response = self.client.get(
+            "/api/speed-readings/",
+            HTTP_ACCEPT="text/html",
+            HTTP_ACCEPT_ENCODING="gzip, br",
+        )
+        self.assertEqual(response["Content-Encoding"], "gzip")
+
+        # Small responses aren't compressed
+        reading_id = self.json[0]["id"]
+        response = self.client.get(
+            f"/api/speed-readings/{reading_id}/", HTTP_ACCEPT_ENCODING="br"
+        )
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_bench_renderers(self):
+        out = StringIO()
+        call_command("bench_renderers", repeat=1, stdout=out)
+        self.assertIn("20 readings", out.getvalue())
+        self.assertIn("msgpack        br", out.getvalue())
+
+
+@override_settings(
+    MONITORING_PROFILE_SETTLE_SECONDS=0, MONITORING_FORECAST_REFRESH_SECONDS=0
+)
+class SpeedForecastTestCase(APITestCase):
+    def setUp(self):
+        reset_profiles()
+        self.addCleanup(reset_profiles)
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        # Mondays 08:00 UTC, hour of the week 8
+        self.monday = datetime(2024, 1, 1, 8, tzinfo=UTC)
+
+    def add_readings(self, speeds, first_week=0):
+        SpeedReading.objects.bulk_create(
+            SpeedReading(
+                road_segment=self.road_segment,
+                average_speed=speed,
+                timestamp=self.monday + timedelta(weeks=first_week + i),
+            )
+            for i, speed in enumerate(speeds)
+        )
+
+    def profile(self):
+        profile = SegmentSpeedProfile.objects.get(road_segment=self.road_segment)
+        counts, means, stds = unpack_profiles(
+            [(profile.counts, profile.means, profile.stds)]
+        )
+        return counts[0], means[0], stds[0]
+
+    def test_incremental_fit_matches_full_fit(self):
+        speeds = [Decimal("30.50"), Decimal("42.00"), Decimal("35.25")]
+        more_speeds = [Decimal("60.00"), Decimal("28.75")]
+        self.add_readings(speeds)
+        call_command("fit_speed_profiles", stdout=StringIO())
+        self.add_readings(more_speeds, first_week=len(speeds))
+
+        out = StringIO()
+        call_command("fit_speed_profiles", stdout=out)
+        self.assertIn("Readings folded: 2", out.getvalue())
+
+        expected = np.array([float(s) for s in speeds + more_speeds])
+        counts, means, stds = self.profile()
+        self.assertEqual(counts[8], 5)
+        self.assertEqual(counts.sum(), 5)
+        self.assertAlmostEqual(means[8], expected.mean(), places=4)
+        self.assertAlmostEqual(stds[8], expected.std(), places=4)
+
+        incremental = self.profile()
+        call_command("fit_speed_profiles", full=True, batch_size=2, stdout=out)
+        for fitted, refitted in zip(incremental, self.profile()):
+            np.testing.assert_allclose(fitted, refitted, rtol=1e-6)
+
+    def test_interrupted_full_fit_keeps_profiles(self):
+        self.add_readings([Decimal("30.00"), Decimal("40.00")])
+        fit_speed_profiles()
+        fitted = self.profile()
+        SpeedReading.objects.update(average_speed=Decimal("90.00"))
+
+        def progress(done, total):
+            # Nothing is replaced while the rebuild runs
+            np.testing.assert_array_equal(self.profile()[1], fitted[1])
+            if done < total:
+                raise JobCancelled()
+
+        with self.assertRaises(JobCancelled):
+            fit_speed_profiles(full=True, batch_size=1, progress=progress)
+        np.testing.assert_array_equal(self.profile()[1], fitted[1])
+
+        fit_speed_profiles(full=True, batch_size=1)
+        self.assertAlmostEqual(self.profile()[1][8], 90.0, places=4)
+
+    def test_fit_job(self):
+        self.add_readings([Decimal("30.00")])
+        job = Job.objects.create(
+            kind=Job.KIND_FIT_SPEED_PROFILES,
+            params={"full": False, "batch_size": 1000},
+        )
+        run_worker(burst=True)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(job.result["readings_folded"], 1)
+
+    def test_forecast(self):
+        self.add_readings([Decimal("15.00"), Decimal("25.00")])
+        call_command("fit_speed_profiles", stdout=StringIO())
+
+        response = self.client.get(
+            f"/api/road-segments/{self.road_segment.id}/forecast/",
+            {"start": "2025-06-02T08:00:00Z", "hours": 2},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        first, second = response.data["forecast"]
+        self.assertEqual(first["hour_of_week"], 8)
+        self.assertEqual(first["expected_speed"], "20.00")
+        self.assertEqual(first["speed_stddev"], "5.00")
+        self.assertEqual(first["samples"], 2)
+        self.assertEqual(first["traffic_intensity"], "elevada")
+        self.assertEqual(second["start"], "2025-06-02T09:00:00Z")
+        self.assertIsNone(second["expected_speed"])
+
+        response = self.client.get(
+            "/api/road-segments/forecast/", {"start": "2025-06-02T08:30:00Z"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["hour_of_week"], 8)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "road_segment": self.road_segment.id,
+                    "expected_speed": "20.00",
+                    "speed_stddev": "5.00",
+                    "samples": 2,
+                    "traffic_intensity": "elevada",
+                }
+            ],
+        )
+
+        response = self.client.get(
+            f"/api/road-segments/{self.road_segment.id}/forecast/", {"hours": 0}
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # The last hour would be past year 9999
+        response = self.client.get(
+            f"/api/road-segments/{self.road_segment.id}/forecast/",
+            {"start": "9999-12-31T23:00:00Z", "hours": 5},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(
+            f"/api/road-segments/{self.road_segment.id}/forecast/",
+            {"start": "9999-12-31T23:00:00Z", "hours": 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class DataQualityGateTestCase(APITestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.csv_file = os.path.join(directory.name, "traffic.csv")
+        with open(self.csv_file, "w") as f:
+            f.write(
+                "Long_start,Lat_start,Long_end,Lat_end,Length,Speed\n"
+                "103.9460064,30.75066046,103.9564943,30.7450801,1179.21,21.5\n"
+                "103.9460064,30.75066046,103.9564943,30.7450801,1179.21,-3\n"
+                "103.9,95.0,103.95,30.74,500,40\n"
+                "103.9,30.7,103.95,30.74,n/a,1234.5\n"
+                "104.0,30.7,104.1,30.8,500.00,60\n"
+            )
+
+    def test_rejected_rows_are_quarantined_and_summarized(self):
+        out = StringIO()
+        call_command("import_traffic_data", self.csv_file, stdout=out)
+        output = out.getvalue()
+        self.assertIn("Readings created: 2", output)
+        self.assertIn("Errors: 3", output)
+        self.assertIn("1  start_latitude: Latitude must be between -90 and 90", output)
+        self.assertNotIn("Error on row", output)
+        self.assertEqual(SpeedReading.objects.count(), 2)
+
+        quarantine = os.path.join(
+            os.path.dirname(self.csv_file), "traffic.rejected.csv"
+        )
+        with open(quarantine) as f:
+            rejected = list(csv.DictReader(f))
+        self.assertEqual([row["row"] for row in rejected], ["3", "4", "5"])
+        self.assertEqual(rejected[0]["Speed"], "-3")
+        self.assertEqual(
+            rejected[0]["reasons"], "average_speed: Average speed must be positive"
+        )
+        self.assertEqual(
+            rejected[2]["reasons"],
+            "length: A valid number is required.; average_speed: Ensure that there "
+            "are no more than 3 digits before the decimal point.",
+        )
+
+    def test_future_readings_are_rejected(self):
+        out = StringIO()
+        tomorrow = timezone.now() + timedelta(days=1)
+        call_command(
+            "import_traffic_data",
+            self.csv_file,
+            start_date=tomorrow.strftime("%Y-%m-%d"),
+            stdout=out,
+        )
+        self.assertIn("5  timestamp: Timestamp cannot be in the future", out.getvalue())
+        self.assertEqual(SpeedReading.objects.count(), 0)
+
+    def test_api_shares_the_rules(self):
+        admin_user = User.objects.create_user(
+            username="admin", password="testpass123", is_staff=True
+        )
+        self.client.force_authenticate(user=admin_user)
+        response = self.client.post(
+            "/api/road-segments/",
+            {
+                "start_longitude": "103.9",
+                "start_latitude": "95.0",
+                "end_longitude": "103.95",
+                "end_latitude": "30.74",
+                "length": "500",
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["start_latitude"],
+            [SEGMENT_RULES["start_latitude"][0].message],
+        )
+
+        rule = Range("positive", minimum=0, exclusive_minimum=True)
+        self.assertEqual(
+            rule.rejects(np.array([-1.0, 0.0, 0.5, np.nan])).tolist(),
+            [True, True, False, False],
+        )
+        self.assertTrue(rule.accepts(Decimal("0.01")))
+
+
+@override_settings(MONITORING_PROFILE_SETTLE_SECONDS=0)
+class SegmentDeduplicationTestCase(APITestCase):
+    def setUp(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        override = override_settings(MONITORING_ARCHIVE_DIR=archive_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.coordinates = {
+            "start_longitude": Decimal("103.9460064"),
+            "start_latitude": Decimal("30.7506605"),
+            "end_longitude": Decimal("103.9564943"),
+            "end_latitude": Decimal("30.7450801"),
+        }
+        self.road_segment = RoadSegment.objects.create(
+            **self.coordinates, length=Decimal("1179.21")
+        )
+        self.monday = datetime(2024, 1, 1, 8, tzinfo=UTC)
+
+    def test_near_duplicate_rows_resolve_to_one_segment(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        csv_file = os.path.join(directory.name, "traffic.csv")
+        with open(csv_file, "w") as f:
+            # Both round to the same coordinate key (6 decimal places)
+            f.write(
+                "Long_start,Lat_start,Long_end,Lat_end,Length,Speed\n"
+                "103.9460064,30.7506605,103.9564943,30.7450801,1179.21,21.5\n"
+                "103.9460064,30.75066041,103.9564943,30.7450801,1179.21,30\n"
+                "104.0,30.7,104.1,30.8,500.00,60\n"
+            )
+        out = StringIO()
+        call_command("import_traffic_data", csv_file, stdout=out)
+        self.assertIn("Segments created: 1", out.getvalue())
+        self.assertEqual(self.road_segment.speedreadings.count(), 2)
+        self.assertEqual(RoadSegment.objects.filter(coordinate_key=None).count(), 0)
+
+    def test_api_rejects_and_finds_segments_by_coordinates(self):
+        admin_user = User.objects.create_user(
+            username="admin", password="testpass123", is_staff=True
+        )
+        self.client.force_authenticate(user=admin_user)
+        response = self.client.post(
+            "/api/road-segments/",
+            {**self.coordinates, "start_latitude": "30.7506604", "length": "1179"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn(str(self.road_segment.id), str(response.data))
+
+        # Updating a segment doesn't conflict with itself
+        response = self.client.patch(
+            f"/api/road-segments/{self.road_segment.id}/", {"length": "1180.00"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response = self.client.get(
+            "/api/road-segments/",
+            {"coordinates": "103.9460064,30.75066046,103.9564943,30.7450801"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [segment["id"] for segment in response.data], [self.road_segment.id]
+        )
+
+        response = self.client.get("/api/road-segments/", {"coordinates": "1,2,3"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_merge_duplicate_segments(self):
+        # As left by the migration: a duplicate without a coordinate key
+        (duplicate,) = RoadSegment.objects.bulk_create(
+            [
+                RoadSegment(
+                    **self.coordinates | {"start_latitude": Decimal("30.7506604")},
+                    length=Decimal("1179.00"),
+                )
+            ]
+        )
+        SpeedReading.objects.bulk_create(
+            [
+                SpeedReading(
+                    road_segment=self.road_segment,
+                    average_speed=Decimal("40.00"),
+                    timestamp=self.monday,
+                ),
+                SpeedReading(
+                    road_segment=duplicate,
+                    average_speed=Decimal("20.00"),
+                    timestamp=self.monday,
+                ),
+                SpeedReading(
+                    road_segment=duplicate,
+                    average_speed=Decimal("30.00"),
+                    timestamp=self.monday + timedelta(weeks=1),
+                ),
+            ]
+        )
+        call_command("fit_speed_profiles", stdout=StringIO())
+        archived_at = datetime(2023, 6, 1, tzinfo=UTC)
+        append_month(duplicate.id, 2023, 6, [to_epoch_ms(archived_at)], [5000])
+
+        out = StringIO()
+        call_command("merge_duplicate_segments", dry_run=True, stdout=out)
+        self.assertIn(f"Segment {self.road_segment.id}: {duplicate.id}", out.getvalue())
+        self.assertTrue(RoadSegment.objects.filter(id=duplicate.id).exists())
+
+        out = StringIO()
+        call_command("merge_duplicate_segments", stdout=out)
+        self.assertIn("Segments merged: 1", out.getvalue())
+        self.assertIn("Readings moved: 1", out.getvalue())
+        self.assertIn("Readings dropped (same timestamp): 1", out.getvalue())
+
+        self.assertFalse(RoadSegment.objects.filter(id=duplicate.id).exists())
+        self.assertEqual(
+            sorted(
+                self.road_segment.speedreadings.values_list("average_speed", flat=True)
+            ),
+            [Decimal("30.00"), Decimal("40.00")],
+        )
+        self.assertTrue(
+            ChangeLogEntry.objects.filter(
+                entity=ChangeLogEntry.ENTITY_ROAD_SEGMENT,
+                object_id=duplicate.id,
+                action=ChangeLogEntry.ACTION_DELETE,
+            ).exists()
+        )
+
+        profile = SegmentSpeedProfile.objects.get(road_segment=self.road_segment)
+        counts, means, _ = unpack_profiles(
+            [(profile.counts, profile.means, profile.stds)]
+        )
+        self.assertEqual(counts[0][8], 3)
+        self.assertAlmostEqual(means[0][8], 30.0, places=4)
+
+        archived_ms, speeds = read_range(
+            self.road_segment.id, archived_at, archived_at + timedelta(days=1)
+        )
+        self.assertEqual(speeds.tolist(), [5000])
+
+        # Nothing left to merge
+        out = StringIO()
+        call_command("merge_duplicate_segments", dry_run=True, stdout=out)
+        self.assertIn("0 duplicate groups", out.getvalue())
+
+
+@override_settings(MONITORING_DELETE_BATCH_SIZE=2)
+class ReadingPurgeTestCase(APITestCase):
+    def setUp(self):
+        self.admin_user = User.objects.create_superuser(
+            username="admin", password="testpass123"
+        )
+        self.road_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("103.9460064"),
+            start_latitude=Decimal("30.75066046"),
+            end_longitude=Decimal("103.9564943"),
+            end_latitude=Decimal("30.7450801"),
+            length=Decimal("1179.21"),
+        )
+        self.other_segment = RoadSegment.objects.create(
+            start_longitude=Decimal("104.0"),
+            start_latitude=Decimal("30.7"),
+            end_longitude=Decimal("104.1"),
+            end_latitude=Decimal("30.8"),
+            length=Decimal("500.00"),
+        )
+        self.start = datetime(2024, 1, 1, tzinfo=UTC)
+        for segment in (self.road_segment, self.other_segment):
+            SpeedReading.objects.bulk_create(
+                SpeedReading(
+                    road_segment=segment,
+                    average_speed=Decimal("50.00"),
+                    timestamp=self.start + timedelta(days=day),
+                )
+                for day in range(5)
+            )
+        self.anomaly = SpeedAnomaly.objects.create(
+            speed_reading=self.road_segment.speedreadings.first(),
+            expected_speed=Decimal("20.00"),
+            score=4.2,
+        )
+
+    def test_destroy_deletes_readings_in_batches(self):
+        reading_ids = set(self.road_segment.speedreadings.values_list("id", flat=True))
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.delete(f"/api/road-segments/{self.road_segment.id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+        self.assertFalse(RoadSegment.objects.filter(id=self.road_segment.id).exists())
+        self.assertEqual(SpeedReading.objects.count(), 5)
+        self.assertFalse(SpeedAnomaly.objects.exists())
+        tombstones = ChangeLogEntry.objects.filter(
+            entity=ChangeLogEntry.ENTITY_SPEED_READING,
+            action=ChangeLogEntry.ACTION_DELETE,
+        )
+        self.assertEqual(
+            set(tombstones.values_list("object_id", flat=True)), reading_ids
+        )
+
+    def test_destroy_deletes_archived_readings_after_commit(self):
+        archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(archive_dir.cleanup)
+        override = override_settings(MONITORING_ARCHIVE_DIR=archive_dir.name)
+        override.enable()
+        self.addCleanup(override.disable)
+        for segment in (self.road_segment, self.other_segment):
+            append_month(segment.id, 2024, 1, [to_epoch_ms(self.start)], [5000])
+        segment_dir = os.path.join(archive_dir.name, str(self.road_segment.id))
+
+        self.client.force_authenticate(user=self.admin_user)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.delete(f"/api/road-segments/{self.road_segment.id}/")
+        # Kept until the delete commits
+        self.assertTrue(os.path.isdir(segment_dir))
+        for callback in callbacks:
+            callback()
+        self.assertFalse(os.path.isdir(segment_dir))
+        _, speeds = read_range(
+            self.other_segment.id, self.start, self.start + timedelta(days=1)
+        )
+        self.assertEqual(speeds.tolist(), [5000])
+
+    def test_admin_delete_confirmation_counts_readings(self):
+        self.client.force_login(self.admin_user)
+        url = f"/admin/monitoring/roadsegment/{self.road_segment.id}/delete/"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(dict(response.context["model_count"])["speed readings"], 5)
+
+        self.client.post(url, {"post": "yes"})
+        self.assertFalse(RoadSegment.objects.filter(id=self.road_segment.id).exists())
+        self.assertEqual(SpeedReading.objects.count(), 5)
+
+    def test_purge_readings_command(self):
+        out = StringIO()
+        call_command(
+            "purge_readings",
+            segment=self.road_segment.id,
+            start="2024-01-02",
+            end="2024-01-04",
+            stdout=out,
+        )
+        self.assertIn("Readings deleted: 2", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertEqual(
+            sorted(
+                t.day
+                for t in self.road_segment.speedreadings.values_list(
+                    "timestamp", flat=True
+                )
+            ),
+            [1, 4, 5],
+        )
+        self.assertEqual(self.other_segment.speedreadings.count(), 5)
+
+        with self.assertRaises(CommandError):
+            call_command("purge_readings", stdout=StringIO())
+
+
+@override_settings(MONITORING_CHANGE_FEED_SETTLE_SECONDS=0)
+class RegionTenancyTestCase(APITestCase):
+    def setUp(self):
+        reset_snapshot()
+        self.addCleanup(reset_snapshot)
+        self.admin_user = User.objects.create_superuser(
+            username="admin", password="testpass123"
+        )
+        self.lisbon = Region.objects.create(slug="lisbon", name="Lisbon")
+        self.porto = Region.objects.create(slug="porto", name="Porto")
+        # The same road coordinates in both regions are two segments
+        self.segments = {}
+        for region, speed in ((self.lisbon, "20.00"), (self.porto, "70.00")):
+            segment = RoadSegment.objects.create(
+                region=region,
+                start_longitude=Decimal("103.9460064"),
+                start_latitude=Decimal("30.7506605"),
+                end_longitude=Decimal("103.9564943"),
+                end_latitude=Decimal("30.7450801"),
+                length=Decimal("1179.21"),
+            )
+            SpeedReading.objects.create(
+                road_segment=segment,
+                average_speed=Decimal(speed),
+                timestamp=timezone.now() - timedelta(hours=1),
+            )
+            self.segments[region.slug] = segment
+
+    def test_requests_only_see_their_region(self):
+        response = self.client.get("/api/road-segments/", HTTP_X_REGION="lisbon")
+        self.assertEqual([s["id"] for s in response.data], [self.segments["lisbon"].id])
+        response = self.client.get("/api/speed-readings/?region=porto")
+        self.assertEqual(
+            [r["road_segment"] for r in response.data],
+            [self.segments["porto"].id],
+        )
+        self.assertEqual(self.client.get("/api/road-segments/").data, [])
+
+        response = self.client.get(
+            f"/api/road-segments/{self.segments['porto'].id}/",
+            HTTP_X_REGION="lisbon",
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/api/road-segments/", HTTP_X_REGION="faro")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_writes_go_to_the_request_region(self):
+        self.client.force_authenticate(user=self.admin_user)
+        response = self.client.post(
+            "/api/speed-readings/",
+            {
+                "road_segment": self.segments["porto"].id,
+                "average_speed": "50.00",
+                "timestamp": timezone.now().isoformat(),
+            },
+            HTTP_X_REGION="lisbon",
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(
+            "/api/road-segments/",
+            {
+                "start_longitude": "104.0",
+                "start_latitude": "30.7",
+                "end_longitude": "104.1",
+                "end_latitude": "30.8",
+                "length": "500.00",
+            },
+            HTTP_X_REGION="porto",
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        segment = RoadSegment.objects.get(id=response.data["id"])
+        self.assertEqual(segment.region, self.porto)
+
+    def test_change_feed_and_snapshot_are_per_region(self):
+        response = self.client.get("/api/changes/", HTTP_X_REGION="lisbon")
+        self.assertEqual(
+            {(c["entity"], c["id"]) for c in response.data["changes"]},
+            {
+                ("road_segment", self.segments["lisbon"].id),
+                ("speed_reading", self.segments["lisbon"].speedreadings.get().id),
+            },
+        )
+
+        lisbon = self.client.get("/api/network-snapshot/", HTTP_X_REGION="lisbon")
+        porto = self.client.get("/api/network-snapshot/", HTTP_X_REGION="porto")
+        self.assertEqual(lisbon.data["intensity"]["elevada"]["percentage"], 100.0)
+        self.assertEqual(porto.data["intensity"]["baixa"]["percentage"], 100.0)
+
+    def test_import_into_region(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        csv_file = os.path.join(directory.name, "traffic.csv")
+        with open(csv_file, "w") as f:
+            f.write(
+                "Long_start,Lat_start,Long_end,Lat_end,Length,Speed\n"
+                "103.9460064,30.7506605,103.9564943,30.7450801,1179.21,21.5\n"
+            )
+        out = StringIO()
+        call_command("import_traffic_data", csv_file, region="porto", stdout=out)
+        self.assertIn("Segments created: 0", out.getvalue())
+        self.assertEqual(self.segments["porto"].speedreadings.count(), 2)
+        self.assertEqual(self.segments["lisbon"].speedreadings.count(), 1)
+
+        # A typo doesn't create a region
+        with self.assertRaises(CommandError):
+            call_command("import_traffic_data", csv_file, region="brga", stdout=out)
+        self.assertFalse(Region.objects.filter(slug="brga").exists())
+
+        call_command(
+            "import_traffic_data",
+            csv_file,
+            region="braga",
+            create_region=True,
+            stdout=out,
+        )
+        braga = Region.objects.get(slug="braga")
+        self.assertEqual(SpeedReading.objects.filter(region=braga).count(), 1)
+
+    def test_default_region_looked_up_once(self):
+        region_id = default_region()
+        with self.assertNumQueries(0):
+            self.assertEqual(default_region(), region_id)
+            RoadSegment(
+                start_longitude=Decimal("1"),
+                start_latitude=Decimal("1"),
+                end_longitude=Decimal("2"),
+                end_latitude=Decimal("2"),
+                length=Decimal("10"),
+            )
+
+    @override_settings(MONITORING_PROFILE_SETTLE_SECONDS=0)
+    def test_jobs_only_touch_their_region(self):
+        job = Job.objects.create(
+            kind=Job.KIND_FIT_SPEED_PROFILES,
+            region=self.porto,
+            params={"full": False, "batch_size": 1000},
+        )
+        self.assertEqual(run_job(job).status, Job.STATUS_SUCCEEDED)
+        self.assertEqual(
+            list(SegmentSpeedProfile.objects.values_list("road_segment", flat=True)),
+            [self.segments["porto"].id],
+        )
+        # Lisbon's reading is older than Porto's fitted one, but still gets folded
+        self.assertEqual(fit_speed_profiles()["readings_folded"], 1)
+        self.assertEqual(SegmentSpeedProfile.objects.count(), 2)
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        job = Job.objects.create(
+            kind=Job.KIND_ARCHIVE,
+            region=self.lisbon,
+            params={"older_than": 0, "batch_size": 1000},
+        )
+        with override_settings(MONITORING_ARCHIVE_DIR=directory.name):
+            self.assertEqual(run_job(job).result["readings_archived"], 1)
+        self.assertEqual(
+            list(SpeedReading.objects.values_list("road_segment", flat=True)),
+            [self.segments["porto"].id],
+        )
@@ -0,0 +1,105 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+PERIOD_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_rate(rate):
+    """Parse a DRF rate string like "600/min" into (requests, seconds)."""
+    requests, period = rate.split("/")
+    return int(requests), PERIOD_SECONDS[period[0]]
+
+
+class TokenBucketStore:
+    """
+    In-memory token buckets, one per key, shared by the threads of a process.
+
+    Least recently used buckets are dropped beyond `max_keys`; a dropped client
+    starts again with a full bucket.
+    """
+
+    def __init__(self, max_keys=100_000):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, capacity, refill_rate, now=None):
+        """
+        Take a token from a bucket holding up to `capacity` tokens and refilling at
+        `refill_rate` tokens per second. Returns 0 if a token was taken, otherwise
+        the seconds until one is available.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, updated_at = self._buckets.pop(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / refill_rate
+            self._buckets[key] = (tokens, now)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store():
+    """Return the process-wide token bucket store, created from settings on first use."""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = TokenBucketStore(
+                    max_keys=settings.MONITORING_THROTTLE_MAX_CLIENTS
+                )
+    return _store
+
+
+def reset_store():
+    global _store
+    with _store_lock:
+        _store = None
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Per-client token bucket throttle, scoped per endpoint like ScopedRateThrottle.
+
+    The view's `throttle_scope` selects a rate from DEFAULT_THROTTLE_RATES, e.g.
+    "600/min": clients can burst up to 600 requests, refilled at 10 per second.
+    Views without a scope, or scopes without a rate, are not throttled. Clients are
+    identified by user id when authenticated, otherwise by IP address.
+    """
+
+    def __init__(self):
+        self.wait_seconds = 0
+
+    def allow_request(self, request, view):
+        scope = getattr(view, "throttle_scope", None)
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(scope) if scope else None
+        if rate is None:
+            return True
+
+        capacity, period = parse_rate(rate)
+        if request.user and request.user.is_authenticated:
+            ident = f"user:{request.user.pk}"
+        else:
+            ident = f"ip:{self.get_ident(request)}"
+
+        self.wait_seconds = get_store().take(
+            f"{scope}:{ident}", capacity, capacity / period
+        )
+        return self.wait_seconds == 0
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,11 +1,26 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import RoadSegmentViewSet, SpeedReadingViewSet
+from .views import (
+    ChangeFeedViewSet,
+    JobViewSet,
+    NetworkSnapshotViewSet,
+    RoadSegmentViewSet,
+    RouteViewSet,
+    SpeedAnomalyViewSet,
+    SpeedReadingViewSet,
+)
 
 # Create a router and register our viewsets
 router = DefaultRouter()
 router.register(r"road-segments", RoadSegmentViewSet, basename="road-segment")
 router.register(r"speed-readings", SpeedReadingViewSet, basename="speed-reading")
+router.register(r"anomalies", SpeedAnomalyViewSet, basename="anomaly")
+router.register(r"changes", ChangeFeedViewSet, basename="change")
+router.register(
+    r"network-snapshot", NetworkSnapshotViewSet, basename="network-snapshot"
+)
+router.register(r"routes", RouteViewSet, basename="route")
+router.register(r"jobs", JobViewSet, basename="job")
 
 # The API URLs are now determined automatically by the router
 urlpatterns = [
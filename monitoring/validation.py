@@ -0,0 +1,127 @@
+import numpy as np
+from django.utils import timezone
+
+NOT_A_NUMBER = "A valid number is required."
+
+
+class Rule:
+    """
+    A validation rule, checked a value at a time by the API serializers and a
+    column at a time (NumPy arrays) by the importer, so both accept the same data.
+    """
+
+    message = ""
+
+    def accepts(self, value):
+        raise NotImplementedError
+
+    def rejects(self, values):
+        """Boolean mask of rejected values. NaN (not a number) is not rejected."""
+        raise NotImplementedError
+
+
+class Range(Rule):
+    def __init__(self, message, minimum=None, maximum=None, exclusive_minimum=False):
+        self.message = message
+        self.minimum = minimum
+        self.maximum = maximum
+        self.exclusive_minimum = exclusive_minimum
+
+    def accepts(self, value):
+        return not self.rejects(np.float64(value))
+
+    def rejects(self, values):
+        rejected = np.zeros(np.shape(values), dtype=bool)
+        if self.minimum is not None:
+            if self.exclusive_minimum:
+                rejected |= values <= self.minimum
+            else:
+                rejected |= values < self.minimum
+        if self.maximum is not None:
+            rejected |= values > self.maximum
+        return rejected
+
+
+class MaxWholeDigits(Rule):
+    """Fits a DecimalField once rounded to its decimal places, as the database stores it."""
+
+    def __init__(self, field):
+        self.decimal_places = field.decimal_places
+        self.whole_digits = field.max_digits - field.decimal_places
+        self.message = (
+            f"Ensure that there are no more than {self.whole_digits} digits before "
+            f"the decimal point."
+        )
+
+    def accepts(self, value):
+        return not self.rejects(np.float64(value))
+
+    def rejects(self, values):
+        return np.abs(np.round(values, self.decimal_places)) >= 10**self.whole_digits
+
+
+class NotInFuture(Rule):
+    """Timestamps, as datetimes or epoch seconds."""
+
+    message = "Timestamp cannot be in the future"
+
+    def accepts(self, value):
+        return value <= timezone.now()
+
+    def rejects(self, values):
+        return values > timezone.now().timestamp()
+
+
+LATITUDE = Range("Latitude must be between -90 and 90", -90, 90)
+LONGITUDE = Range("Longitude must be between -180 and 180", -180, 180)
+
+SEGMENT_RULES = {
+    "start_longitude": [LONGITUDE],
+    "start_latitude": [LATITUDE],
+    "end_longitude": [LONGITUDE],
+    "end_latitude": [LATITUDE],
+    "length": [Range("Length must be positive", minimum=0, exclusive_minimum=True)],
+}
+
+READING_RULES = {
+    "average_speed": [
+        Range("Average speed must be positive", minimum=0, exclusive_minimum=True)
+    ],
+    "timestamp": [NotInFuture()],
+}
+
+
+def parse_numbers(values):
+    """Parse strings as a float64 array, NaN where a value isn't a finite number."""
+    try:
+        numbers = np.asarray(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        numbers = np.array([_parse_number(value) for value in values], dtype=np.float64)
+    numbers[~np.isfinite(numbers)] = np.nan
+    return numbers
+
+
+def _parse_number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def validate_columns(columns, rules):
+    """
+    Check columns of numbers (as parsed by parse_numbers) against each field's rules.
+    Returns {row index: [reasons]} for the rejected rows; reasons read
+    "<field>: <message>".
+    """
+    failures = []
+    for field, values in columns.items():
+        failures.append((np.isnan(values), f"{field}: {NOT_A_NUMBER}"))
+        for rule in rules.get(field, ()):
+            failures.append((rule.rejects(values), f"{field}: {rule.message}"))
+
+    reasons = {}
+    for mask, reason in failures:
+        for index in np.flatnonzero(mask).tolist():
+            reasons.setdefault(index, []).append(reason)
+    return reasons
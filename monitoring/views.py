@@ -1,10 +1,84 @@
-from django.db.models import OuterRef, Subquery, Q
-from rest_framework import viewsets
-from drf_spectacular.utils import extend_schema, OpenApiParameter
-from drf_spectacular.types import OpenApiTypes
-from .models import RoadSegment, SpeedReading
-from .serializers import RoadSegmentSerializer, SpeedReadingSerializer
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.db.models import Count, DurationField, ExpressionWrapper, F, Q, Sum
+from django.http import FileResponse
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from .archive import from_epoch_ms, reading_history
+from .changes import (
+    ENTITY_MODELS,
+    InvalidToken,
+    decode_token,
+    encode_token,
+    settled_changes,
+)
+from .coalescing import SingleFlight
+from .importer import upsert_readings
+from .db_router import current_replica
+from .forecasting import get_profiles
+from .jobs import cancel_job, save_upload
+from .models import (
+    COORDINATE_KEY_DECIMAL_PLACES,
+    HIGH_INTENSITY_MAX_SPEED,
+    MEDIUM_INTENSITY_MAX_SPEED,
+    ChangeLogEntry,
+    Job,
+    RoadSegment,
+    SpeedAnomaly,
+    SpeedReading,
+    coordinate_key,
+    intensity_for_speed,
+)
+from .serializers import (
+    ForecastQuerySerializer,
+    HistoryRangeSerializer,
+    JobSerializer,
+    ReadingRangeSerializer,
+    RoadSegmentSerializer,
+    RouteQuerySerializer,
+    SegmentForecastQuerySerializer,
+    SpeedAnomalySerializer,
+    SpeedReadingBatchSerializer,
+    SpeedReadingSerializer,
+)
 from .permissions import IsAdminOrReadOnly
+from .purging import delete_segment
+from .routing import get_graph
+from .schema import OpenApiParameter, OpenApiTypes, extend_schema
+from .snapshot import DEFAULT_PERCENTILES, get_snapshot
+from .tenancy import REGION_HEADER, REGION_PARAM, request_region
+
+
+# In-flight road segment list requests, shared by identical concurrent requests
+road_segment_lists = SingleFlight()
+
+# Every region-scoped operation takes the region as a header or query parameter
+REGION_PARAMETERS = [
+    OpenApiParameter(
+        name=REGION_HEADER,
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.HEADER,
+        description="Region (city) slug. Default: MONITORING_DEFAULT_REGION",
+    ),
+    OpenApiParameter(
+        name=REGION_PARAM,
+        type=OpenApiTypes.STR,
+        location=OpenApiParameter.QUERY,
+        description=f"Region (city) slug, if there is no {REGION_HEADER} header",
+    ),
+]
+
+
+class RegionScopedMixin:
+    """Scopes a view's queries to the request's region (see request_region)."""
+
+    @property
+    def region_id(self):
+        return request_region(self.request)
 
 
 @extend_schema(
@@ -15,50 +89,90 @@ from .permissions import IsAdminOrReadOnly
     **Permissions:**
     - Anonymous users: Read-only (GET, HEAD, OPTIONS)
     - Admin users: Full access (GET, POST, PUT, PATCH, DELETE)
+
+    **Regions:**
+    - Every endpoint only sees the segments of the region named by the X-Region
+      header (or ?region=), by default MONITORING_DEFAULT_REGION
     
     **Filtering:**
     - Use ?traffic_intensity={elevada|média|baixa} to filter by latest reading's traffic intensity
+    - Use ?coordinates=start_lon,start_lat,end_lon,end_lat to find a segment by its coordinates
+
+    **History:**
+    - /road-segments/{id}/history/ and /road-segments/{id}/aggregate/ cover a
+      ?start=..&end=.. range, reading archived readings transparently
+
+    **Forecasts:**
+    - /road-segments/{id}/forecast/?hours=N gives the expected speed and traffic
+      intensity for the next N hours, and /road-segments/forecast/ for every segment
+      for the current (or ?start=..) hour, from hour-of-week speed profiles
+      refreshed by `manage.py fit_speed_profiles`
     """,
+    parameters=REGION_PARAMETERS,
 )
-class RoadSegmentViewSet(viewsets.ModelViewSet):
+class RoadSegmentViewSet(RegionScopedMixin, viewsets.ModelViewSet):
     """ViewSet for RoadSegment CRUD operations with admin/read-only permissions."""
 
     queryset = RoadSegment.objects.all()
     serializer_class = RoadSegmentSerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = "road-segments"
 
     def get_queryset(self):
-        queryset = RoadSegment.objects.all()
+        queryset = RoadSegment.objects.filter(region_id=self.region_id)
         traffic_intensity = self.request.query_params.get("traffic_intensity", None)
 
         if traffic_intensity is not None:
             # Get the latest reading's speed for each segment
-            latest_reading = SpeedReading.objects.filter(
-                road_segment=OuterRef("pk")
-            ).order_by("-timestamp")[:1]
-
-            queryset = queryset.annotate(
-                latest_speed=Subquery(latest_reading.values("average_speed")[:1])
-            )
+            queryset = queryset.with_latest_reading()
 
             # Filter based on traffic intensity thresholds
             if traffic_intensity == "elevada":
                 queryset = queryset.filter(
-                    Q(latest_speed__isnull=False) & Q(latest_speed__lte=20)
+                    Q(latest_speed__isnull=False)
+                    & Q(latest_speed__lte=HIGH_INTENSITY_MAX_SPEED)
                 )
             elif traffic_intensity == "média":
                 queryset = queryset.filter(
                     Q(latest_speed__isnull=False)
-                    & Q(latest_speed__gt=20)
-                    & Q(latest_speed__lte=50)
+                    & Q(latest_speed__gt=HIGH_INTENSITY_MAX_SPEED)
+                    & Q(latest_speed__lte=MEDIUM_INTENSITY_MAX_SPEED)
                 )
             elif traffic_intensity == "baixa":
                 queryset = queryset.filter(
-                    Q(latest_speed__isnull=False) & Q(latest_speed__gt=50)
+                    Q(latest_speed__isnull=False)
+                    & Q(latest_speed__gt=MEDIUM_INTENSITY_MAX_SPEED)
                 )
 
+        coordinates = self.get_coordinates()
+        if coordinates is not None:
+            queryset = queryset.filter(coordinate_key=coordinate_key(*coordinates))
+
         return queryset
 
+    def perform_create(self, serializer):
+        serializer.save(region_id=self.region_id)
+
+    def perform_destroy(self, instance):
+        delete_segment(instance)
+
+    def get_coordinates(self):
+        value = self.request.query_params.get("coordinates", None)
+        if value is None:
+            return None
+        try:
+            coordinates = [Decimal(c) for c in value.split(",")]
+        except InvalidOperation:
+            raise ValidationError({"coordinates": "Must be comma-separated numbers"})
+        if len(coordinates) != 4 or not all(c.is_finite() for c in coordinates):
+            raise ValidationError(
+                {
+                    "coordinates": "Must be start_longitude,start_latitude,"
+                    "end_longitude,end_latitude"
+                }
+            )
+        return coordinates
+
     @extend_schema(
         parameters=[
             OpenApiParameter(
@@ -68,14 +182,141 @@ class RoadSegmentViewSet(viewsets.ModelViewSet):
                 description="Filter by traffic intensity of latest reading",
                 enum=["elevada", "média", "baixa"],
             ),
+            OpenApiParameter(
+                name="coordinates",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description=(
+                    "Find the segment with these coordinates: start_longitude,"
+                    "start_latitude,end_longitude,end_latitude (matched to "
+                    f"{COORDINATE_KEY_DECIMAL_PLACES} decimal places)"
+                ),
+            ),
         ]
     )
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        if not settings.MONITORING_COALESCE_REQUESTS:
+            return super().list(request, *args, **kwargs)
+
+        # Concurrent identical requests (e.g. a dashboard loading on many clients)
+        # share one query. Requests pinned to the primary don't share with replica reads.
+        list_segments = super().list
+        data, shared = road_segment_lists.do(
+            (request.get_full_path(), self.region_id, current_replica() is None),
+            lambda: list_segments(request, *args, **kwargs).data,
+        )
+        return Response(data)
 
     def get_serializer_context(self):
         return {"request": self.request}
 
+    def get_reading_history(self, range_serializer_class=ReadingRangeSerializer):
+        segment = self.get_object()
+        query = range_serializer_class(data=self.request.query_params)
+        query.is_valid(raise_exception=True)
+        start, end = query.validated_data["start"], query.validated_data["end"]
+        return segment, start, end, reading_history(segment.id, start, end)
+
+    @extend_schema(parameters=[HistoryRangeSerializer])
+    @action(detail=True)
+    def history(self, request, pk=None):
+        """
+        Readings of a segment in a time range of up to MONITORING_HISTORY_MAX_DAYS,
+        including archived readings.
+        """
+        segment, start, end, (epoch_ms, speeds, archived) = self.get_reading_history(
+            HistoryRangeSerializer
+        )
+        timestamp_field = serializers.DateTimeField()
+
+        readings = [
+            {
+                "timestamp": timestamp_field.to_representation(from_epoch_ms(t)),
+                "average_speed": f"{s / 100:.2f}",
+                "traffic_intensity": intensity_for_speed(s / 100),
+                "archived": bool(a),
+            }
+            for t, s, a in zip(epoch_ms.tolist(), speeds.tolist(), archived.tolist())
+        ]
+        return Response(
+            {
+                "road_segment": segment.id,
+                "start": timestamp_field.to_representation(start),
+                "end": timestamp_field.to_representation(end),
+                "readings": readings,
+            }
+        )
+
+    @extend_schema(parameters=[ReadingRangeSerializer])
+    @action(detail=True)
+    def aggregate(self, request, pk=None):
+        """Speed statistics of a segment over a time range, including archived readings."""
+        segment, start, end, (epoch_ms, speeds, archived) = self.get_reading_history()
+        timestamp_field = serializers.DateTimeField()
+        speeds = speeds / 100
+
+        summary = {
+            "road_segment": segment.id,
+            "start": timestamp_field.to_representation(start),
+            "end": timestamp_field.to_representation(end),
+            "count": len(speeds),
+            "archived_count": int(archived.sum()),
+            "min_speed": None,
+            "max_speed": None,
+            "average_speed": None,
+            "traffic_intensity": {
+                "elevada": int((speeds <= HIGH_INTENSITY_MAX_SPEED).sum()),
+                "média": int(
+                    (
+                        (speeds > HIGH_INTENSITY_MAX_SPEED)
+                        & (speeds <= MEDIUM_INTENSITY_MAX_SPEED)
+                    ).sum()
+                ),
+                "baixa": int((speeds > MEDIUM_INTENSITY_MAX_SPEED).sum()),
+            },
+        }
+        if len(speeds):
+            summary["min_speed"] = f"{speeds.min():.2f}"
+            summary["max_speed"] = f"{speeds.max():.2f}"
+            summary["average_speed"] = f"{speeds.mean():.2f}"
+        return Response(summary)
+
+    @extend_schema(parameters=[SegmentForecastQuerySerializer])
+    @action(detail=True)
+    def forecast(self, request, pk=None):
+        """Expected speed of a segment for the next hours, from its speed profile."""
+        segment = self.get_object()
+        query = SegmentForecastQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        timestamp_field = serializers.DateTimeField()
+
+        steps = get_profiles(self.region_id).forecast(
+            segment.id, query.validated_data["start"], query.validated_data["hours"]
+        )
+        for step in steps:
+            step["start"] = timestamp_field.to_representation(step["start"])
+        return Response({"road_segment": segment.id, "forecast": steps})
+
+    @extend_schema(
+        operation_id="road_segments_forecast_all",
+        parameters=[ForecastQuerySerializer],
+    )
+    @action(detail=False, url_path="forecast")
+    def bulk_forecast(self, request):
+        """Expected speed of every segment with a speed profile for one hour."""
+        query = ForecastQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        start = query.validated_data["start"]
+
+        hour_of_week, results = get_profiles(self.region_id).forecast_all(start)
+        return Response(
+            {
+                "start": serializers.DateTimeField().to_representation(start),
+                "hour_of_week": hour_of_week,
+                "results": results,
+            }
+        )
+
 
 @extend_schema(
     tags=["Speed Readings"],
@@ -88,17 +329,26 @@ class RoadSegmentViewSet(viewsets.ModelViewSet):
     
     **Filtering:**
     - Use ?road_segment={id} query parameter to filter readings by road segment
+
+    **Batch upserts:**
+    - POST /speed-readings/batch/ writes many readings in one statement, updating
+      existing readings (same segment and timestamp), and reports how many were
+      inserted, updated and unchanged
     """,
+    parameters=REGION_PARAMETERS,
 )
-class SpeedReadingViewSet(viewsets.ModelViewSet):
+class SpeedReadingViewSet(RegionScopedMixin, viewsets.ModelViewSet):
     """ViewSet for SpeedReading CRUD operations with optional filtering by road segment."""
 
     queryset = SpeedReading.objects.select_related("road_segment").all()
     serializer_class = SpeedReadingSerializer
     permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = "speed-readings"
 
     def get_queryset(self):
-        queryset = SpeedReading.objects.select_related("road_segment").all()
+        queryset = SpeedReading.objects.select_related("road_segment").filter(
+            region_id=self.region_id
+        )
         road_segment_id = self.request.query_params.get("road_segment", None)
         if road_segment_id is not None:
             queryset = queryset.filter(road_segment_id=road_segment_id)
@@ -106,3 +356,358 @@ class SpeedReadingViewSet(viewsets.ModelViewSet):
 
     def get_serializer_context(self):
         return {"request": self.request}
+
+    @extend_schema(request=SpeedReadingBatchSerializer, responses=OpenApiTypes.OBJECT)
+    @action(detail=False, methods=["post"])
+    def batch(self, request):
+        """Insert or update a batch of readings in one statement."""
+        batch = SpeedReadingBatchSerializer(
+            data=request.data, context=self.get_serializer_context()
+        )
+        batch.is_valid(raise_exception=True)
+        result = upsert_readings(
+            [
+                (
+                    reading["road_segment"],
+                    reading["timestamp"],
+                    reading["average_speed"],
+                )
+                for reading in batch.validated_data["readings"]
+            ],
+            update=batch.validated_data["upsert"],
+        )
+        return Response(result)
+
+
+@extend_schema(
+    tags=["Anomalies"],
+    description="""
+    Speed readings flagged as anomalous when they arrived, because they deviate from
+    the segment's usual speed for that hour of the week.
+
+    **Filtering:**
+    - Use ?road_segment={id} query parameter to filter anomalies by road segment
+    """,
+    parameters=REGION_PARAMETERS,
+)
+class SpeedAnomalyViewSet(RegionScopedMixin, viewsets.ReadOnlyModelViewSet):
+    """Read-only ViewSet for detected speed anomalies."""
+
+    queryset = SpeedAnomaly.objects.select_related("speed_reading").all()
+    serializer_class = SpeedAnomalySerializer
+    permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = "anomalies"
+
+    def get_queryset(self):
+        queryset = (
+            SpeedAnomaly.objects.select_related("speed_reading")
+            .filter(speed_reading__region_id=self.region_id)
+            .order_by("-speed_reading__timestamp")
+        )
+        road_segment_id = self.request.query_params.get("road_segment", None)
+        if road_segment_id is not None:
+            queryset = queryset.filter(speed_reading__road_segment_id=road_segment_id)
+        return queryset
+
+
+@extend_schema(
+    tags=["Change Feed"],
+    description="""
+    Incremental change feed for keeping downstream replicas in sync.
+
+    Every create/update of a road segment or speed reading is recorded as an
+    `upsert`, and every delete as a `delete` tombstone, in one monotonic sequence.
+
+    **Usage:**
+    - Start with no token to replay from the beginning
+    - Pass the returned `next_token` as ?since={token} to get the next batch
+    - Keep polling while `has_more` is true
+
+    Each region has its own feed (sequence numbers are shared, with gaps).
+    """,
+    parameters=REGION_PARAMETERS,
+)
+class ChangeFeedViewSet(RegionScopedMixin, viewsets.ViewSet):
+    """Read-only change feed returning changes since an opaque token in bounded batches."""
+
+    permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = "changes"
+
+    serializer_classes = {
+        ChangeLogEntry.ENTITY_ROAD_SEGMENT: RoadSegmentSerializer,
+        ChangeLogEntry.ENTITY_SPEED_READING: SpeedReadingSerializer,
+    }
+
+    def get_limit(self):
+        max_limit = settings.MONITORING_CHANGE_FEED_MAX_LIMIT
+        limit = self.request.query_params.get("limit", None)
+        if limit is None:
+            return max_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({"limit": "Must be an integer"})
+        if limit <= 0:
+            raise ValidationError({"limit": "Must be positive"})
+        return min(limit, max_limit)
+
+    def get_entries(self, since, limit):
+        queryset = settled_changes(self.region_id, since)
+
+        # Fetch one extra entry to know whether there are more
+        entries = list(queryset.order_by("id")[: limit + 1])
+        return entries[:limit], len(entries) > limit
+
+    def get_current_data(self, entries):
+        # One query per entity type for the objects that still exist
+        ids_by_entity = {}
+        for entry in entries:
+            if entry.action == ChangeLogEntry.ACTION_UPSERT:
+                ids_by_entity.setdefault(entry.entity, set()).add(entry.object_id)
+
+        data = {}
+        for entity, ids in ids_by_entity.items():
+            objects = ENTITY_MODELS[entity].objects.filter(pk__in=ids)
+            serializer = self.serializer_classes[entity](
+                objects, many=True, context={"request": self.request}
+            )
+            for item in serializer.data:
+                data[(entity, item["id"])] = item
+        return data
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="since",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Opaque token returned as next_token by a previous call",
+            ),
+            OpenApiParameter(
+                name="limit",
+                type=OpenApiTypes.INT,
+                location=OpenApiParameter.QUERY,
+                description="Maximum number of changes to return",
+            ),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def list(self, request):
+        try:
+            since = decode_token(request.query_params.get("since", ""))
+        except InvalidToken as e:
+            raise ValidationError({"since": str(e)})
+
+        entries, has_more = self.get_entries(since, self.get_limit())
+        data = self.get_current_data(entries)
+
+        changes = [
+            {
+                "seq": entry.id,
+                "entity": entry.entity,
+                "id": entry.object_id,
+                "action": entry.action,
+                # None for tombstones, or if the object was deleted after this change
+                "data": data.get((entry.entity, entry.object_id)),
+            }
+            for entry in entries
+        ]
+
+        return Response(
+            {
+                "changes": changes,
+                "next_token": encode_token(entries[-1].id if entries else since),
+                "has_more": has_more,
+            }
+        )
+
+
+@extend_schema(
+    tags=["Network Snapshot"],
+    description="""
+    Current congestion of the whole road network.
+
+    Classifies every segment by the traffic intensity of its latest reading and
+    reports the share of total network length in each class (`sem_dados` for
+    segments without readings), plus length-weighted speed percentiles.
+
+    Served from an in-memory columnar cache refreshed incrementally from the
+    change feed, so it never scans the readings table per request. Each region has
+    its own snapshot.
+    """,
+    parameters=REGION_PARAMETERS,
+)
+class NetworkSnapshotViewSet(RegionScopedMixin, viewsets.ViewSet):
+    """Read-only, length-weighted congestion snapshot of the road network."""
+
+    permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = "network-snapshot"
+
+    def get_percentiles(self):
+        value = self.request.query_params.get("percentiles", None)
+        if value is None:
+            return DEFAULT_PERCENTILES
+        try:
+            percentiles = tuple(float(p) for p in value.split(","))
+        except ValueError:
+            raise ValidationError({"percentiles": "Must be comma-separated numbers"})
+        if not all(0 <= p <= 100 for p in percentiles):
+            raise ValidationError({"percentiles": "Must be between 0 and 100"})
+        return percentiles
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                name="percentiles",
+                type=OpenApiTypes.STR,
+                location=OpenApiParameter.QUERY,
+                description="Comma-separated speed percentiles, e.g. 10,50,90",
+            ),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def list(self, request):
+        return Response(get_snapshot(self.region_id).summary(self.get_percentiles()))
+
+
+@extend_schema(
+    tags=["Routes"],
+    description="""
+    Fastest route between two points over the road graph.
+
+    Segments sharing endpoint coordinates form a directed graph. Each segment is
+    weighted by its travel time (length / latest speed); segments without readings
+    use `MONITORING_ROUTING_DEFAULT_SPEED`. Both points are snapped to the nearest
+    segment endpoint. Routes only use the request's region's segments.
+    """,
+    parameters=REGION_PARAMETERS,
+)
+class RouteViewSet(RegionScopedMixin, viewsets.ViewSet):
+    """Read-only route travel-time estimation over the segment graph."""
+
+    permission_classes = [IsAdminOrReadOnly]
+    throttle_scope = "routes"
+
+    @extend_schema(parameters=[RouteQuerySerializer], responses=OpenApiTypes.OBJECT)
+    def list(self, request):
+        query = RouteQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+
+        route = get_graph(self.region_id).route(**query.validated_data)
+        if route is None:
+            raise NotFound("No route found between these points")
+        return Response(route)
+
+
+@extend_schema(
+    tags=["Jobs"],
+    description="""
+    Background jobs, run by `manage.py run_jobs` worker processes.
+
+    **Kinds:**
+    - `import`: import a traffic speed CSV, uploaded as `file` (multipart)
+    - `archive`: move readings older than `params.older_than` days to the archive
+    - `recompute_anomalies`: recompute anomalies in a time range, optionally with
+      different detector settings
+    - `fit_speed_profiles`: fold new readings into the forecast speed profiles, or
+      rebuild them with `params.full`
+
+    Jobs report progress (`progress_done` / `progress_total`) and throughput while
+    running. POST /jobs/{id}/cancel/ stops a job; /jobs/stats/ summarizes throughput
+    per kind. Admin only. Jobs are listed per region, and only work on the data of
+    the region they were created in.
+    """,
+    parameters=REGION_PARAMETERS,
+)
+class JobViewSet(
+    RegionScopedMixin,
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """Enqueue, monitor and cancel background jobs."""
+
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        queryset = Job.objects.filter(region_id=self.region_id)
+        for field in ("kind", "status"):
+            value = self.request.query_params.get(field, None)
+            if value is not None:
+                queryset = queryset.filter(**{field: value})
+        return queryset
+
+    def perform_create(self, serializer):
+        params = serializer.validated_data["params"]
+        uploaded_file = serializer.validated_data.pop("file", None)
+        if uploaded_file is not None:
+            params["path"] = save_upload(uploaded_file)
+        serializer.save(
+            created_by=self.request.user, params=params, region_id=self.region_id
+        )
+
+    @extend_schema(request=None)
+    @action(detail=True, methods=["post"])
+    def cancel(self, request, pk=None):
+        """Cancel a queued job, or ask a running job to stop."""
+        job = self.get_object()
+        if not cancel_job(job):
+            return Response(
+                {"detail": f"Job already {job.status}"},
+                status=status.HTTP_409_CONFLICT,
+            )
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    @action(detail=False)
+    def stats(self, request):
+        """Job counts by status and throughput of succeeded jobs, per kind."""
+        stats = {
+            kind: {"jobs": {}, "items": 0, "seconds": 0.0, "items_per_second": None}
+            for kind, _ in Job.KIND_CHOICES
+        }
+        for kind, job_status, count in (
+            self.get_queryset()
+            .values_list("kind", "status")
+            .annotate(count=Count("id"))
+            .order_by()
+        ):
+            stats[kind]["jobs"][job_status] = count
+
+        succeeded = (
+            self.get_queryset()
+            .filter(status=Job.STATUS_SUCCEEDED, started_at__isnull=False)
+            .values_list("kind")
+            .annotate(
+                items=Sum("progress_done"),
+                duration=Sum(
+                    ExpressionWrapper(
+                        F("finished_at") - F("started_at"),
+                        output_field=DurationField(),
+                    )
+                ),
+            )
+            .order_by()
+        )
+        for kind, items, duration in succeeded:
+            seconds = duration.total_seconds()
+            stats[kind].update(
+                items=items,
+                seconds=round(seconds, 3),
+                items_per_second=round(items / seconds, 1) if seconds else None,
+            )
+        return Response(stats)
+
+
+def static_schema(request):
+    """Serve the OpenAPI schema pre-generated into MONITORING_SCHEMA_FILE."""
+    schema_file = settings.MONITORING_SCHEMA_FILE
+    if schema_file.endswith(".json"):
+        content_type = "application/vnd.oai.openapi+json"
+    else:
+        content_type = "application/vnd.oai.openapi"
+    return FileResponse(open(schema_file, "rb"), content_type=content_type)
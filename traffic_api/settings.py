@@ -10,12 +10,18 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 
+def env_bool(name, default):
+    return os.environ.get(name, str(default)).lower() in ("1", "true", "yes", "on")
+
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/6.0/howto/deployment/checklist/
 
@@ -28,10 +34,19 @@ DEBUG = True
 ALLOWED_HOSTS = []
 
 
+# Serving configuration: API-only pods can leave out the admin and the API docs
+# (Swagger UI and on-demand schema generation) to start faster and use less memory
+MONITORING_ENABLE_ADMIN = env_bool("MONITORING_ENABLE_ADMIN", True)
+MONITORING_ENABLE_DOCS = env_bool("MONITORING_ENABLE_DOCS", True)
+# Schema pre-generated at build time (manage.py spectacular --file schema.yml),
+# served as-is at /api/schema/ instead of being generated on demand
+MONITORING_SCHEMA_FILE = os.environ.get("MONITORING_SCHEMA_FILE", "")
+
+
 # Application definition
 
 INSTALLED_APPS = [
-    "django.contrib.admin",
+    *(["django.contrib.admin"] if MONITORING_ENABLE_ADMIN else []),
     "django.contrib.auth",
     "django.contrib.contenttypes",
     "django.contrib.sessions",
@@ -39,17 +54,19 @@ INSTALLED_APPS = [
     "django.contrib.staticfiles",
     # Third-party apps
     "rest_framework",
-    "drf_spectacular",
+    *(["drf_spectacular"] if MONITORING_ENABLE_DOCS else []),
     # Local apps
     "monitoring",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "monitoring.middleware.CompressionMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "monitoring.middleware.ReadReplicaMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -80,14 +97,60 @@ WSGI_APPLICATION = "traffic_api.wsgi.application"
 DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.postgresql",
-        "NAME": "traffic_api",
-        "USER": "postgres",
-        "PASSWORD": "your_password",
-        "HOST": "localhost",
-        "PORT": "5432",
+        "NAME": os.environ.get("POSTGRES_DB", "traffic_api"),
+        "USER": os.environ.get("POSTGRES_USER", "postgres"),
+        "PASSWORD": os.environ.get("POSTGRES_PASSWORD", "your_password"),
+        "HOST": os.environ.get("POSTGRES_HOST", "localhost"),
+        "PORT": os.environ.get("POSTGRES_PORT", "5432"),
+        # Persistent connections: keep each worker's connection open for this many
+        # seconds instead of reconnecting on every request (0 disables)
+        "CONN_MAX_AGE": int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+        # Check a persistent connection is still usable before reusing it
+        "CONN_HEALTH_CHECKS": env_bool("DB_CONN_HEALTH_CHECKS", True),
     }
 }
 
+# Connection pooling (psycopg 3 pool), as an alternative to persistent connections,
+# e.g. for threaded/ASGI servers. Django requires CONN_MAX_AGE = 0 with a pool.
+if env_bool("DB_POOL", False):
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        }
+    }
+
+
+# Read replicas: one database alias per host in DB_REPLICA_HOSTS (comma-separated),
+# same credentials as the primary. Safe-method API requests read from them.
+MONITORING_READ_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.environ.get("DB_REPLICA_HOSTS", "").split(","))
+):
+    alias = f"replica_{index + 1}"
+    DATABASES[alias] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        # Tests read through the replica alias but use the primary's test database
+        "TEST": {"MIRROR": "default"},
+    }
+    MONITORING_READ_REPLICAS.append(alias)
+
+# For tests of replica routing: a replica that is the primary's test database, only
+# defined when running `manage.py test`. Not in MONITORING_READ_REPLICAS, so nothing
+# reads from it unless a test lists it
+if sys.argv[1:2] == ["test"]:
+    DATABASES["replica"] = {**DATABASES["default"], "TEST": {"MIRROR": "default"}}
+
+DATABASE_ROUTERS = ["monitoring.db_router.ReadReplicaRouter"]
+
+# Path prefixes whose safe-method requests are served from replicas
+MONITORING_REPLICA_PATHS = ["/api/"]
+# Seconds a client's reads stay on the primary after it writes (read-your-writes)
+MONITORING_READ_YOUR_WRITES_SECONDS = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -133,7 +196,33 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.SessionAuthentication",
     ],
-    "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # Default JSON first; clients can ask for columnar JSON or MessagePack with the
+    # Accept header or ?format=columnar / ?format=msgpack
+    "DEFAULT_RENDERER_CLASSES": [
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "monitoring.renderers.ColumnarJSONRenderer",
+        "monitoring.renderers.MessagePackRenderer",
+    ],
+    # Without the docs, skip importing drf-spectacular's schema generator
+    "DEFAULT_SCHEMA_CLASS": (
+        "drf_spectacular.openapi.AutoSchema"
+        if MONITORING_ENABLE_DOCS
+        else "rest_framework.schemas.openapi.AutoSchema"
+    ),
+    # Token bucket per client and endpoint (the view's throttle_scope): each rate is
+    # the burst size, refilled evenly over the period. Unlisted scopes are unlimited.
+    "DEFAULT_THROTTLE_CLASSES": [
+        "monitoring.throttling.TokenBucketThrottle",
+    ],
+    "DEFAULT_THROTTLE_RATES": {
+        "road-segments": "600/min",
+        "speed-readings": "600/min",
+        "anomalies": "600/min",
+        "changes": "600/min",
+        "network-snapshot": "600/min",
+        "routes": "60/min",
+    },
 }
 
 # drf-spectacular (Swagger/OpenAPI) config
@@ -144,3 +233,85 @@ SPECTACULAR_SETTINGS = {
     "SERVE_INCLUDE_SCHEMA": False,
     "COMPONENT_SPLIT_REQUEST": True,
 }
+
+# Change feed (/api/changes/) config
+# Maximum (and default) number of changes returned per batch
+MONITORING_CHANGE_FEED_MAX_LIMIT = 1000
+# Delay before a change is served, so concurrent transactions can't commit
+# sequence numbers behind a consumer's token
+MONITORING_CHANGE_FEED_SETTLE_SECONDS = 2
+
+# Maximum readings per /api/speed-readings/batch/ request
+MONITORING_BATCH_MAX_READINGS = 5000
+
+# Response compression (gzip, or brotli when accepted): responses smaller than this
+# aren't worth compressing
+MONITORING_COMPRESS_MIN_BYTES = 1024
+# Brotli quality, 0-11; higher levels compress a little better but are much slower
+# for responses built per request
+MONITORING_BROTLI_QUALITY = 5
+
+# Share one query between concurrent identical /api/road-segments/ list requests
+MONITORING_COALESCE_REQUESTS = env_bool("MONITORING_COALESCE_REQUESTS", True)
+# Clients tracked by the in-memory throttle (least recently seen are forgotten)
+MONITORING_THROTTLE_MAX_CLIENTS = 100_000
+
+# Anomaly detection config
+# EWMA smoothing factor for per-segment hour-of-week speed statistics
+MONITORING_ANOMALY_ALPHA = 0.1
+# Flag readings deviating more than this many typical deviations from the usual speed
+MONITORING_ANOMALY_THRESHOLD = 3.0
+# Readings needed in an hour-of-week bucket before it can flag anomalies
+MONITORING_ANOMALY_MIN_SAMPLES = 4
+# Seconds between checks for a finished anomaly recompute job, after which each
+# process warms its detector up again
+MONITORING_ANOMALY_REFRESH_SECONDS = 30
+
+# Network snapshot (/api/network-snapshot/) config
+# Minimum seconds between incremental refreshes of the in-memory snapshot
+MONITORING_SNAPSHOT_REFRESH_SECONDS = 1.0
+
+# Routing (/api/routes/) config
+# Speed (km/h) assumed for segments without readings
+MONITORING_ROUTING_DEFAULT_SPEED = 50.0
+# Minimum seconds between incremental refreshes of the in-memory road graph
+MONITORING_ROUTING_REFRESH_SECONDS = 1.0
+
+# Speed forecasts (/api/road-segments/{id}/forecast/) config
+# Only readings created at least this long ago are folded into speed profiles, so
+# readings from transactions still committing aren't skipped
+MONITORING_PROFILE_SETTLE_SECONDS = 2
+# Minimum seconds between checks for refitted profiles by the in-memory forecast cache
+MONITORING_FORECAST_REFRESH_SECONDS = 30.0
+
+# Region (city) of requests that don't name one with an X-Region header or
+# ?region=, and of imports without --region. Created by the migrations, or on
+# first use if changed since.
+MONITORING_DEFAULT_REGION = os.environ.get("MONITORING_DEFAULT_REGION", "default")
+
+# Cold-storage archive of old readings (manage.py archive_readings)
+MONITORING_ARCHIVE_DIR = os.environ.get("MONITORING_ARCHIVE_DIR", BASE_DIR / "archive")
+# Longest time range /api/road-segments/{id}/history/ returns readings for
+MONITORING_HISTORY_MAX_DAYS = 31
+
+# Readings deleted per statement (and transaction) when deleting a road segment or
+# purging readings (manage.py purge_readings)
+MONITORING_DELETE_BATCH_SIZE = 10000
+
+# Background jobs (/api/jobs/, manage.py run_jobs)
+# Where uploaded import files are kept until their job has run. Written by the API
+# process and read by a worker, so with workers on other hosts it must be a volume
+# shared by all of them
+MONITORING_JOB_UPLOAD_DIR = os.environ.get(
+    "MONITORING_JOB_UPLOAD_DIR", BASE_DIR / "uploads"
+)
+# Where import jobs write the rows they rejected, with the reasons
+MONITORING_QUARANTINE_DIR = os.environ.get(
+    "MONITORING_QUARANTINE_DIR", BASE_DIR / "quarantine"
+)
+# Seconds an idle worker waits before polling the queue again
+MONITORING_JOB_POLL_SECONDS = 1.0
+# Minimum seconds between progress saves (and cancellation checks) of a running job
+MONITORING_JOB_PROGRESS_SECONDS = 1.0
+# A running job without a heartbeat for this long is taken over by another worker
+MONITORING_JOB_STALE_SECONDS = 300
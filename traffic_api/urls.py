@@ -15,20 +15,39 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
+from monitoring.views import static_schema
 
 urlpatterns = [
-    path("admin/", admin.site.urls),
     # API routes
     path("api/", include("monitoring.urls")),
+]
+
+# The admin and docs are only imported where enabled, see MONITORING_ENABLE_ADMIN
+# and MONITORING_ENABLE_DOCS
+if settings.MONITORING_ENABLE_ADMIN:
+    from django.contrib import admin
+
+    urlpatterns.append(path("admin/", admin.site.urls))
+
+if settings.MONITORING_SCHEMA_FILE:
+    # API Schema (OpenAPI), pre-generated
+    urlpatterns.append(path("api/schema/", static_schema, name="schema"))
+elif settings.MONITORING_ENABLE_DOCS:
+    from drf_spectacular.views import SpectacularAPIView
+
     # API Schema (OpenAPI JSON)
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    urlpatterns.append(path("api/schema/", SpectacularAPIView.as_view(), name="schema"))
+
+if settings.MONITORING_ENABLE_DOCS:
+    from drf_spectacular.views import SpectacularSwaggerView
+
     # Swagger UI Documentation
-    path(
-        "api/docs/",
-        SpectacularSwaggerView.as_view(url_name="schema"),
-        name="swagger-ui",
-    ),
-]
+    urlpatterns.append(
+        path(
+            "api/docs/",
+            SpectacularSwaggerView.as_view(url_name="schema"),
+            name="swagger-ui",
+        )
+    )